@@ -1,3 +1,12 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import TranslationMemory
+
+
+@admin.register(TranslationMemory)
+class TranslationMemoryAdmin(admin.ModelAdmin):
+    """Admin interface for TranslationMemory model."""
+    list_display = ('source_language', 'target_language', 'model', 'source_text', 'hits', 'last_used_at')
+    list_filter = ('source_language', 'target_language', 'model')
+    search_fields = ('source_text', 'translated_text')
+    readonly_fields = ('source_hash', 'created_at', 'last_used_at')
@@ -0,0 +1,38 @@
+# Generated by Django 5.0.11 on 2026-10-18 23:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TranslationMemory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source_hash', models.CharField(max_length=64, verbose_name='Source Text Hash')),
+                ('source_language', models.CharField(max_length=10, verbose_name='Source Language')),
+                ('target_language', models.CharField(max_length=10, verbose_name='Target Language')),
+                ('model', models.CharField(max_length=50, verbose_name='Model')),
+                ('source_text', models.TextField(verbose_name='Source Text')),
+                ('translated_text', models.TextField(verbose_name='Translated Text')),
+                ('hits', models.PositiveIntegerField(default=0, verbose_name='Hits')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Translation Memory',
+                'verbose_name_plural': 'Translation Memory',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='translationmemory',
+            constraint=models.UniqueConstraint(fields=('source_hash', 'source_language', 'target_language', 'model'), name='translationmemory_unique_key'),
+        ),
+    ]
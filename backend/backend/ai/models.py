@@ -1,3 +1,34 @@
 from django.db import models
+from django.utils.translation import gettext_lazy as _
 
-# Create your models here.
+
+class TranslationMemory(models.Model):
+    """Translations already returned by the LLM, reused for the same text.
+
+    Keyed by the SHA-256 of the source text, the language pair and the
+    model, so re-translating a script only sends the texts that changed.
+    """
+
+    source_hash = models.CharField(_("Source Text Hash"), max_length=64)
+    source_language = models.CharField(_("Source Language"), max_length=10)
+    target_language = models.CharField(_("Target Language"), max_length=10)
+    model = models.CharField(_("Model"), max_length=50)
+    source_text = models.TextField(_("Source Text"))
+    translated_text = models.TextField(_("Translated Text"))
+    hits = models.PositiveIntegerField(_("Hits"), default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        verbose_name = _("Translation Memory")
+        verbose_name_plural = _("Translation Memory")
+        constraints = [
+            models.UniqueConstraint(
+                fields=["source_hash", "source_language", "target_language", "model"],
+                name="translationmemory_unique_key",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.source_language}->{self.target_language}: {self.source_text[:50]}"
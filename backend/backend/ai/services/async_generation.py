@@ -0,0 +1,226 @@
+"""
+Async provider calls for generating many media files at once.
+
+``AsyncMediaGenerator`` runs image and voice generation on one event loop
+with AsyncOpenAI and the async ElevenLabs client, so a single worker slot
+keeps dozens of provider calls in flight instead of blocking on each. A
+semaphore bounds how many run at once, and files are streamed to disk as
+they arrive.
+
+Quotas are shared with the sync services through ``rate_limiter``. A call
+without a token available sleeps on the event loop until the bucket
+refills (or a 429 backoff ends), so waiting doesn't block the other calls.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from django.conf import settings
+
+from backend.ai.services import client_registry, rate_limiter
+from backend.ai.services.image_service import IMAGE_MODEL, ImageService
+from backend.utils.downloads import CHUNK_SIZE, awrite_stream
+from backend.video.services.render_planner import probe_duration
+
+logger = logging.getLogger(__name__)
+
+# Longest a single call waits on provider rate limits before it fails
+RATE_LIMIT_MAX_WAIT = 15 * 60
+
+
+class AsyncMediaGenerator:
+    """Generates images and voices concurrently, streaming them to files.
+
+    Used as an async context manager, which opens the provider clients and
+    closes their connection pools on exit::
+
+        async with AsyncMediaGenerator(openai_key, elevenlabs_key) as generator:
+            await asyncio.gather(
+                generator.generate_image(prompt, image_path),
+                generator.generate_voice(text, voice_path),
+            )
+    """
+
+    def __init__(
+        self,
+        openai_api_key: Optional[str] = None,
+        elevenlabs_api_key: Optional[str] = None,
+        concurrency: Optional[int] = None,
+    ):
+        """Initialize the generator with API keys and a concurrency limit."""
+        self.openai_api_key = openai_api_key or settings.OPENAI_API_KEY
+        self.elevenlabs_api_key = elevenlabs_api_key or settings.ELEVENLABS_API_KEY
+        self.concurrency = concurrency or settings.ASYNC_GENERATION_CONCURRENCY
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._http_clients = []
+        self.openai = None
+        self.elevenlabs = None
+        self.http = None
+
+    async def __aenter__(self) -> "AsyncMediaGenerator":
+        from elevenlabs.client import AsyncElevenLabs
+        from openai import AsyncOpenAI
+
+        openai_http = client_registry.async_openai_http_client(self.concurrency)
+        elevenlabs_http = client_registry.async_http_client(
+            self.concurrency, retries=settings.AI_CLIENT_MAX_RETRIES, follow_redirects=True
+        )
+        self.http = client_registry.async_http_client(
+            self.concurrency, retries=settings.AI_CLIENT_MAX_RETRIES, follow_redirects=True
+        )
+        self._http_clients = [openai_http, elevenlabs_http, self.http]
+
+        self.openai = AsyncOpenAI(
+            api_key=self.openai_api_key,
+            max_retries=settings.AI_CLIENT_MAX_RETRIES,
+            http_client=openai_http,
+        )
+        self.elevenlabs = AsyncElevenLabs(
+            api_key=self.elevenlabs_api_key,
+            timeout=settings.AI_CLIENT_TIMEOUT,
+            httpx_client=elevenlabs_http,
+        )
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await asyncio.gather(
+            *(http_client.aclose() for http_client in self._http_clients),
+            return_exceptions=True,
+        )
+
+    async def generate_image(
+        self,
+        prompt: str,
+        path: str,
+        size: str = "1024x1024",
+        quality: str = "standard",
+        style: str = "vivid",
+        script_context: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """Generate an image with DALL-E and stream it to a file.
+
+        Args:
+            prompt: The visual description to generate the image from
+            path: File to write the image to
+            size: Image size (1024x1024, 1024x1792, 1792x1024)
+            quality: Image quality (standard, hd)
+            style: Image style (vivid, natural)
+            script_context: Optional dictionary with additional script context
+
+        Returns:
+            Metadata of the generated image
+
+        Raises:
+            RateLimitExceeded: If the provider stays rate limited for too long
+        """
+        enhanced_prompt = ImageService.build_prompt(prompt, script_context)
+
+        async def request():
+            response = await self.openai.images.generate(
+                model=IMAGE_MODEL,
+                prompt=enhanced_prompt,
+                size=size,
+                quality=quality,
+                style=style,
+                n=1,
+            )
+            image = response.data[0]
+            async with self.http.stream("GET", image.url) as download:
+                download.raise_for_status()
+                image_file = await awrite_stream(download.aiter_bytes(CHUNK_SIZE), path)
+            return image.revised_prompt, image_file
+
+        revised_prompt, image_file = await self._call("openai_images", self.openai_api_key, request)
+        return {
+            "model": IMAGE_MODEL,
+            "size": size,
+            "quality": quality,
+            "style": style,
+            "revised_prompt": revised_prompt,
+            "file_size": image_file.size,
+            "sha256": image_file.sha256,
+        }
+
+    async def generate_voice(
+        self,
+        text: str,
+        path: str,
+        voice_id: str = "nPczCjzI2devNBz1zQrb",
+        model_id: str = "eleven_multilingual_v2",
+    ) -> Dict[str, Any]:
+        """Synthesize speech with ElevenLabs and stream it to a file.
+
+        Args:
+            text: The text to convert to speech
+            path: File to write the audio to
+            voice_id: The ID of the voice to use
+            model_id: The ID of the model to use
+
+        Returns:
+            Metadata of the generated audio, with its probed duration (None
+            if ffprobe couldn't read it)
+
+        Raises:
+            RateLimitExceeded: If the provider stays rate limited for too long
+        """
+
+        async def request():
+            audio = self.elevenlabs.text_to_speech.convert(
+                voice_id=voice_id, text=text, model_id=model_id
+            )
+            return await awrite_stream(audio, path)
+
+        audio_file = await self._call("elevenlabs", self.elevenlabs_api_key, request, tokens=len(text))
+        # Probed as soon as the stream closes, outside the concurrency limit
+        duration = await asyncio.to_thread(probe_duration, path)
+        return {
+            "voice_id": voice_id,
+            "model_id": model_id,
+            "character_count": len(text),
+            "duration": duration,
+            "file_size": audio_file.size,
+            "sha256": audio_file.sha256,
+        }
+
+    async def _call(
+        self,
+        provider: str,
+        api_key: Optional[str],
+        request: Callable[[], Awaitable[Any]],
+        tokens: int = 0,
+    ) -> Any:
+        """
+        Make a provider call once its quota and the concurrency limit allow.
+
+        Args:
+            provider: Provider name, a key of ``AI_RATE_LIMITS``
+            api_key: API key the call is made with
+            request: Coroutine function making the call
+            tokens: Estimated usage tokens (or characters) of the call
+
+        Returns:
+            What ``request`` returned
+        """
+        deadline = time.monotonic() + RATE_LIMIT_MAX_WAIT
+        while True:
+            try:
+                async with self._semaphore:
+                    # Never blocks: a wait raises, and is slept out below
+                    # without holding a slot
+                    await asyncio.to_thread(rate_limiter.acquire, provider, api_key, tokens, 0)
+                    return await request()
+            except rate_limiter.RateLimitExceeded as e:
+                retry_after = e.retry_after
+            except Exception as e:
+                if not rate_limiter.is_rate_limit_error(e):
+                    raise
+                retry_after = rate_limiter.get_retry_after(e)
+                await asyncio.to_thread(rate_limiter.penalize, provider, api_key, retry_after)
+
+            if time.monotonic() + retry_after > deadline:
+                raise rate_limiter.RateLimitExceeded(provider, retry_after)
+            logger.debug(f"Waiting {retry_after}s for a {provider} token")
+            await asyncio.sleep(retry_after)
+
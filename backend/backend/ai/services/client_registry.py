@@ -0,0 +1,248 @@
+"""
+Process-wide provider clients, shared per API key.
+
+Constructing an SDK client creates a new HTTP connection pool, so a service
+built per screen paid a TCP and TLS handshake on its first request. The
+registry keeps one client per provider and API key for the life of the
+process, configured with keep-alive pools, timeouts and retries from
+settings, so every task and request using a key reuses warm connections.
+
+A rotated key gets a new client on first use. The old key's client is
+evicted when the user's key changes in this process (see
+``backend.users.signals``), and in every process once it falls out of the
+``AI_CLIENT_CACHE_SIZE`` least recently used keys. Image downloads share a
+single ``requests`` session the same way.
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# (provider, api key) -> (SDK client, underlying httpx client)
+_clients: "OrderedDict[Tuple[str, str], Tuple[Any, Any]]" = OrderedDict()
+_session = None
+_lock = threading.Lock()
+
+
+def _http_client(retries: int = 0, follow_redirects: bool = False, event_hooks=None):
+    """Build an httpx client with the shared pool, timeout and retry settings."""
+    import httpx
+
+    return httpx.Client(
+        timeout=_http_timeout(),
+        transport=httpx.HTTPTransport(limits=_http_limits(), retries=retries),
+        follow_redirects=follow_redirects,
+        event_hooks=event_hooks,
+    )
+
+
+def _skip_rate_limit_retry(response) -> None:
+    """
+    Stop the OpenAI SDK from retrying a 429 on its own.
+
+    The SDK obeys an ``x-should-retry`` response header before its own
+    retry rules, so marking 429s leaves connection errors and 5xx to its
+    retries while every 429 reaches the caller, which backs off through
+    the shared rate limiter.
+    """
+    if response.status_code == 429:
+        response.headers["x-should-retry"] = "false"
+
+
+async def _async_skip_rate_limit_retry(response) -> None:
+    _skip_rate_limit_retry(response)
+
+
+def async_openai_http_client(max_connections: Optional[int] = None):
+    """Build an async httpx client for the OpenAI SDK that leaves 429s to the rate limiter."""
+    return async_http_client(
+        max_connections, event_hooks={"response": [_async_skip_rate_limit_retry]}
+    )
+
+
+def async_http_client(
+    max_connections: Optional[int] = None,
+    retries: int = 0,
+    follow_redirects: bool = False,
+    event_hooks=None,
+):
+    """
+    Build an async httpx client with the registry's timeout and retry settings.
+
+    Async clients are bound to the event loop that uses them, so they are
+    created per run rather than kept in the registry.
+
+    Args:
+        max_connections: Size of the connection pool, defaults to ``AI_CLIENT_MAX_CONNECTIONS``
+        retries: Times a failed connection is retried
+        follow_redirects: Whether to follow redirects
+        event_hooks: httpx request and response hooks
+
+    Returns:
+        An httpx.AsyncClient
+    """
+    import httpx
+
+    return httpx.AsyncClient(
+        timeout=_http_timeout(),
+        transport=httpx.AsyncHTTPTransport(limits=_http_limits(max_connections), retries=retries),
+        follow_redirects=follow_redirects,
+        event_hooks=event_hooks,
+    )
+
+
+def _http_timeout():
+    import httpx
+
+    return httpx.Timeout(settings.AI_CLIENT_TIMEOUT, connect=settings.AI_CLIENT_CONNECT_TIMEOUT)
+
+
+def _http_limits(max_connections: Optional[int] = None):
+    import httpx
+
+    max_connections = max_connections or settings.AI_CLIENT_MAX_CONNECTIONS
+    return httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_connections,
+        keepalive_expiry=settings.AI_CLIENT_KEEPALIVE_SECONDS,
+    )
+
+
+def _build_openai(api_key: str) -> Tuple[Any, Any]:
+    from openai import OpenAI
+
+    # The SDK retries connection errors and 5xx itself; 429s go to the rate limiter
+    http_client = _http_client(event_hooks={"response": [_skip_rate_limit_retry]})
+    client = OpenAI(
+        api_key=api_key,
+        max_retries=settings.AI_CLIENT_MAX_RETRIES,
+        http_client=http_client,
+    )
+    return client, http_client
+
+
+def _build_elevenlabs(api_key: str) -> Tuple[Any, Any]:
+    from elevenlabs.client import ElevenLabs
+
+    # Only failed connections are retried; 429s go to the rate limiter
+    http_client = _http_client(retries=settings.AI_CLIENT_MAX_RETRIES, follow_redirects=True)
+    client = ElevenLabs(
+        api_key=api_key,
+        timeout=settings.AI_CLIENT_TIMEOUT,
+        httpx_client=http_client,
+    )
+    return client, http_client
+
+
+_BUILDERS = {
+    "openai": _build_openai,
+    "elevenlabs": _build_elevenlabs,
+}
+
+
+def get_client(provider: str, api_key: Optional[str]):
+    """
+    Get the shared client of a provider for an API key, creating it on first use.
+
+    Args:
+        provider: Provider name ('openai' or 'elevenlabs')
+        api_key: API key the client authenticates with
+
+    Returns:
+        The provider's SDK client
+    """
+    key = (provider, api_key or "")
+    with _lock:
+        entry = _clients.get(key)
+        if entry is None:
+            entry = _BUILDERS[provider](api_key)
+            _clients[key] = entry
+            logger.debug(f"Created {provider} client ({len(_clients)} cached)")
+            # Dropped rather than closed: another thread may still be using it
+            while len(_clients) > settings.AI_CLIENT_CACHE_SIZE:
+                _clients.popitem(last=False)
+        else:
+            _clients.move_to_end(key)
+        return entry[0]
+
+
+def get_openai_client(api_key: Optional[str]):
+    """Get the shared OpenAI client for an API key."""
+    return get_client("openai", api_key)
+
+
+def get_elevenlabs_client(api_key: Optional[str]):
+    """Get the shared ElevenLabs client for an API key."""
+    return get_client("elevenlabs", api_key)
+
+
+def get_http_session():
+    """
+    Get the shared session for plain HTTP downloads.
+
+    Idempotent requests are retried on connection errors and 5xx responses.
+
+    Returns:
+        A requests.Session with a keep-alive pool
+    """
+    global _session
+    with _lock:
+        if _session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            from urllib3.util.retry import Retry
+
+            retry = Retry(
+                total=settings.AI_CLIENT_MAX_RETRIES,
+                backoff_factor=0.5,
+                status_forcelist=(500, 502, 503, 504),
+                allowed_methods=frozenset({"GET", "HEAD"}),
+            )
+            adapter = HTTPAdapter(
+                pool_maxsize=settings.AI_CLIENT_MAX_CONNECTIONS, max_retries=retry
+            )
+            _session = requests.Session()
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+
+def evict(api_key: Optional[str]) -> int:
+    """
+    Drop every provider client of an API key, e.g. when it is rotated.
+
+    Like clients dropped from the LRU, they aren't closed, as another thread
+    may still be mid-request on them; their connections are released once
+    the last user lets go of them.
+
+    Args:
+        api_key: The API key being replaced
+
+    Returns:
+        Number of clients evicted
+    """
+    if not api_key:
+        return 0
+    with _lock:
+        keys = [key for key in _clients if key[1] == api_key]
+        for key in keys:
+            del _clients[key]
+    return len(keys)
+
+
+def reset() -> None:
+    """
+    Forget every client without closing it.
+
+    Called in forked worker children, whose inherited connections belong to
+    the parent process.
+    """
+    global _session
+    with _lock:
+        _clients.clear()
+        _session = None
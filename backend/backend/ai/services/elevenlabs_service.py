@@ -7,8 +7,9 @@ import os
 import uuid
 import json
 from typing import Dict, List, Any, Optional, Tuple, BinaryIO
-from elevenlabs.client import ElevenLabs
 from django.conf import settings
+from backend.ai.services import client_registry, media_cache, rate_limiter
+from backend.utils.downloads import StreamedFile, write_stream
 from backend.users.models import User, APIUsage
 from backend.workspaces.models import Media, Workspace
 
@@ -43,16 +44,7 @@ class ElevenLabsService:
     def __init__(self, api_key=None):
         """Initialize the ElevenLabs service with an API key."""
         self.api_key = api_key or settings.ELEVENLABS_API_KEY
-        
-        try:
-            # Initialize the client
-            self.client = ElevenLabs(api_key=self.api_key)
-        except Exception as e:
-            logger.error(
-                f"Error initializing ElevenLabs client: {str(e)}"
-            )
-            # Fallback to a basic initialization if there's an error
-            self.client = ElevenLabs(api_key=self.api_key)
+        self.client = client_registry.get_elevenlabs_client(self.api_key)
     
     def set_api_key(self, api_key: str) -> None:
         """Set the API key for the service.
@@ -61,7 +53,7 @@ class ElevenLabsService:
             api_key: The ElevenLabs API key to use
         """
         self.api_key = api_key
-        self.client = ElevenLabs(api_key=api_key)
+        self.client = client_registry.get_elevenlabs_client(api_key)
     
     def get_available_voices(self) -> List[Dict[str, str]]:
         """Get a list of available voices from ElevenLabs.
@@ -88,6 +80,75 @@ class ElevenLabsService:
             # Return default voices if API call fails
             return self.DEFAULT_VOICES
     
+    @staticmethod
+    def record_usage(
+        user: Optional[User],
+        text: str,
+        voice_id: str,
+        model_id: str,
+        cached_media: Optional[Media] = None
+    ) -> Dict[str, Any]:
+        """Record the API usage of generated voice audio.
+        
+        Audio reused from the synthesis cache is recorded at no cost, with
+        the cost it saved, so the cache's hit rate and savings can be read
+        from the ``cache_hit`` and ``saved_cost`` metadata of the usage. It
+        doesn't count towards the user's voice generation quota.
+        
+        Args:
+            user: The user the audio was generated for (nothing is recorded without one)
+            text: The text that was converted to speech
+            voice_id: The ID of the voice used
+            model_id: The ID of the model used
+            cached_media: The cached audio that was reused, if any
+            
+        Returns:
+            Metadata with the character count and approximate cost
+        """
+        # Calculate approximate cost (may need to be updated based on current ElevenLabs pricing)
+        # Pricing: ~$0.003 per 1000 characters
+        character_count = len(text)
+        estimated_cost = (character_count / 1000) * 0.003
+        cache_hit = cached_media is not None
+
+        # Log and track API usage if user is provided
+        if user:
+            usage_metadata = {
+                "model": model_id,
+                "voice_id": voice_id,
+                "character_count": character_count,
+                "action": "voice_generation",
+                "cache_hit": cache_hit,
+                "saved_cost": estimated_cost if cache_hit else 0,
+            }
+            if cache_hit:
+                usage_metadata["cached_media_id"] = str(cached_media.id)
+
+            # Record API usage
+            APIUsage.objects.create(
+                user=user,
+                api_name="ElevenLabs",
+                endpoint="text-to-speech",
+                tokens_used=0 if cache_hit else character_count,
+                cost=0 if cache_hit else estimated_cost,
+                metadata=usage_metadata
+            )
+
+            # Reused audio involved no synthesis, so it doesn't count
+            # against the user's voice quota
+            if not cache_hit:
+                user.update_usage('voice_generation')
+
+        metadata = {
+            "model": model_id,
+            "voice_id": voice_id,
+            "character_count": character_count,
+            "cost": 0 if cache_hit else estimated_cost,
+            "cache_hit": cache_hit
+        }
+        
+        return metadata
+    
     def generate_voice(
         self,
         text: str,
@@ -110,48 +171,27 @@ class ElevenLabsService:
             # Log the request
             logger.info(f"Generating voice for text: {text[:50]}...")
             
-            # Generate audio
-            audio_stream = self.client.generate(
-                text=text,
-                voice=voice_id,
-                model=model_id
-            )
-            
-            # Convert generator to bytes
-            audio_bytes = b"".join(chunk for chunk in audio_stream)
-            
-            # Calculate approximate cost (may need to be updated based on current ElevenLabs pricing)
-            # Pricing: ~$0.003 per 1000 characters
-            character_count = len(text)
-            estimated_cost = (character_count / 1000) * 0.003
-            
-            # Log and track API usage if user is provided
-            if user:
-                # Record API usage
-                APIUsage.objects.create(
-                    user=user,
-                    api_name="ElevenLabs",
-                    endpoint="text-to-speech",
-                    tokens_used=character_count,
-                    cost=estimated_cost,
-                    metadata={
-                        "model": model_id,
-                        "voice_id": voice_id,
-                        "character_count": character_count,
-                        "action": "voice_generation"
-                    }
+            # Wait for a slot in the shared quota of this API key
+            rate_limiter.acquire("elevenlabs", self.api_key, tokens=len(text))
+
+            try:
+                # Generate audio
+                audio_stream = self.client.generate(
+                    text=text,
+                    voice=voice_id,
+                    model=model_id
                 )
                 
-                # Update user's feature usage
-                user.update_usage('voice_generation')
+                # Convert generator to bytes
+                audio_bytes = b"".join(chunk for chunk in audio_stream)
+            except Exception as e:
+                if rate_limiter.is_rate_limit_error(e):
+                    retry_after = rate_limiter.get_retry_after(e)
+                    rate_limiter.penalize("elevenlabs", self.api_key, retry_after)
+                    raise rate_limiter.RateLimitExceeded("elevenlabs", retry_after, str(e))
+                raise
             
-            # Return the audio bytes and metadata
-            metadata = {
-                "model": model_id,
-                "voice_id": voice_id,
-                "character_count": character_count,
-                "cost": estimated_cost
-            }
+            metadata = self.record_usage(user, text, voice_id, model_id)
             
             return audio_bytes, metadata
             
@@ -159,6 +199,92 @@ class ElevenLabsService:
             logger.error(f"Error generating voice: {str(e)}")
             raise
     
+    def generate_voice_file(
+        self,
+        text: str,
+        workspace: Workspace,
+        voice_id: str = "nPczCjzI2devNBz1zQrb",  # Rachel voice
+        model_id: str = "eleven_multilingual_v2",
+        user: Optional[User] = None,
+        filename: Optional[str] = None,
+        voice_settings: Optional[Dict[str, Any]] = None
+    ) -> Tuple[StreamedFile, str, Dict[str, Any]]:
+        """Generate voice audio and stream it straight to a file.
+        
+        The audio is written chunk by chunk as ElevenLabs sends it and hashed
+        on the way, so it is never held in memory, and its duration is
+        probed as soon as the stream closes. Audio already synthesized for
+        the same inputs is copied instead of calling the API again; the
+        returned ``cache_key`` should be stored on the Media created for it.
+        
+        Args:
+            text: The text to convert to speech
+            workspace: The workspace to associate the audio with
+            voice_id: The ID of the voice to use
+            model_id: The ID of the model to use
+            user: Optional user object for tracking API usage
+            filename: Optional filename to use, otherwise a UUID is generated
+            voice_settings: Optional voice settings for the synthesis
+            
+        Returns:
+            Tuple containing the saved file (local path, size and SHA-256),
+            the relative path for the Media model and metadata including
+            the audio duration and cache key
+        """
+        from backend.video.services.render_planner import probe_duration
+
+        try:
+            key = media_cache.voice_key(text, voice_id, model_id, voice_settings)
+            cached = media_cache.find(key, workspace, user)
+            if cached:
+                audio_file, relative_path = media_cache.copy_to(cached, workspace, filename)
+                metadata = self.record_usage(user, text, voice_id, model_id, cached_media=cached)
+                metadata["duration"] = cached.duration or probe_duration(audio_file.path)
+                metadata["cache_key"] = key
+                return audio_file, relative_path, metadata
+            
+            logger.info(f"Generating voice for text: {text[:50]}...")
+            
+            if not filename:
+                filename = f"{uuid.uuid4()}.mp3"
+            temp_media = Media(workspace=workspace, file=filename)
+            relative_path = temp_media.file.field.upload_to(temp_media, filename)
+            filepath = os.path.join(settings.MEDIA_ROOT, relative_path)
+            
+            # Wait for a slot in the shared quota of this API key
+            rate_limiter.acquire("elevenlabs", self.api_key, tokens=len(text))
+
+            try:
+                # The request is made as the stream is consumed
+                options = {"voice_settings": voice_settings} if voice_settings else {}
+                audio_stream = self.client.text_to_speech.convert(
+                    voice_id=voice_id,
+                    text=text,
+                    model_id=model_id,
+                    **options
+                )
+                audio_file = write_stream(audio_stream, filepath)
+            except Exception as e:
+                if rate_limiter.is_rate_limit_error(e):
+                    retry_after = rate_limiter.get_retry_after(e)
+                    rate_limiter.penalize("elevenlabs", self.api_key, retry_after)
+                    raise rate_limiter.RateLimitExceeded("elevenlabs", retry_after, str(e))
+                raise
+            
+            metadata = self.record_usage(user, text, voice_id, model_id)
+            metadata["duration"] = (
+                probe_duration(filepath)
+                or self._estimate_audio_duration(metadata["character_count"])
+            )
+            metadata["cache_key"] = key
+            
+            logger.info(f"Audio streamed to {filepath} ({audio_file.size} bytes)")
+            return audio_file, relative_path, metadata
+            
+        except Exception as e:
+            logger.error(f"Error generating voice: {str(e)}")
+            raise
+    
     def save_audio_file(
         self, 
         audio_bytes: bytes, 
@@ -227,39 +353,31 @@ class ElevenLabsService:
             The created Media object
         """
         try:
-            # Generate the voice
-            audio_bytes, metadata = self.generate_voice(
+            # Generate the voice straight to a file
+            audio_file, relative_path, metadata = self.generate_voice_file(
                 text=text,
+                workspace=workspace,
                 voice_id=voice_id,
                 model_id=model_id,
                 user=user
             )
             
-            # Generate a filename
-            filename = f"{uuid.uuid4()}.mp3"
-            
-            # Save the audio
-            local_path, relative_path = self.save_audio_file(
-                audio_bytes, workspace, filename
-            )
-            
-            # Get file size
-            file_size = os.path.getsize(local_path)
-            
             # Create the Media object
             media = Media.objects.create(
                 workspace=workspace,
                 name=name,
                 file_type='audio',
                 file=relative_path,
-                file_size=file_size,
-                duration=self._estimate_audio_duration(metadata["character_count"]),
+                file_size=audio_file.size,
+                duration=metadata["duration"],
+                cache_key=metadata["cache_key"],
                 metadata={
                     "text": text,
                     "voice_id": voice_id,
                     "voice_name": self._get_voice_name(voice_id),
                     "model": model_id,
-                    "character_count": metadata["character_count"]
+                    "character_count": metadata["character_count"],
+                    "sha256": audio_file.sha256
                 },
                 uploaded_by=user
             )
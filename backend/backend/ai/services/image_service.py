@@ -6,16 +6,19 @@ import logging
 import os
 import uuid
 import json
-import requests
 from typing import Dict, List, Any, Optional, Tuple
-from openai import OpenAI
 from django.conf import settings
+from backend.ai.services import client_registry, media_cache, rate_limiter
+from backend.utils.downloads import CHUNK_SIZE, StreamedFile, write_stream
 from backend.users.models import User, APIUsage
 from backend.workspaces.models import Media, Workspace
 
 
 logger = logging.getLogger(__name__)
 
+# The image generation model
+IMAGE_MODEL = "dall-e-3"
+
 
 class ImageService:
     """Service for generating images using OpenAI's DALL-E API."""
@@ -23,16 +26,7 @@ class ImageService:
     def __init__(self, api_key=None):
         """Initialize the Image service with an API key."""
         self.api_key = api_key or settings.OPENAI_API_KEY
-        
-        try:
-            # Initialize the client
-            self.client = OpenAI(api_key=self.api_key)
-        except Exception as e:
-            logger.error(
-                f"Error initializing OpenAI client for image generation: {str(e)}"
-            )
-            # Fallback to a basic initialization if there's an error
-            self.client = OpenAI(api_key=self.api_key)
+        self.client = client_registry.get_openai_client(self.api_key)
     
     def set_api_key(self, api_key: str) -> None:
         """Set the API key for the service.
@@ -41,7 +35,119 @@ class ImageService:
             api_key: The OpenAI API key to use
         """
         self.api_key = api_key
-        self.client = OpenAI(api_key=api_key)
+        self.client = client_registry.get_openai_client(api_key)
+    
+    @staticmethod
+    def build_prompt(prompt: str, script_context: Optional[Dict[str, Any]] = None) -> str:
+        """Build the DALL-E prompt for a visual description.
+        
+        Args:
+            prompt: The visual description
+            script_context: Optional dictionary with additional script context
+            
+        Returns:
+            The prompt with the script context and the no-text instruction
+        """
+        # Enhance prompt with script context if provided
+        enhanced_prompt = prompt
+        if script_context:
+            # Extract relevant context information
+            title = script_context.get('title', '')
+            theme = script_context.get('theme', '')
+            style_context = script_context.get('style', '')
+            audience = script_context.get('audience', '')
+
+            # Add context to the system message part of the prompt
+            context_parts = []
+            if title:
+                context_parts.append(
+                    f"This image is for a video titled '{title}'"
+                )
+            if theme:
+                context_parts.append(f"with theme '{theme}'")
+            if style_context:
+                context_parts.append(f"in style '{style_context}'")
+            if audience:
+                context_parts.append(f"for audience '{audience}'")
+
+            if context_parts:
+                context_prefix = " ".join(context_parts) + ". "
+                enhanced_prompt = context_prefix + enhanced_prompt
+
+        # Add instruction to not include any text in the image
+        no_text_instruction = (
+            "IMPORTANT: Do not include any text, words, letters, numbers, "
+            "or captions in the image. The image should be completely free "
+            "of any textual elements. This image will be used for video creation."
+        )
+        enhanced_prompt = enhanced_prompt + " " + no_text_instruction
+        return enhanced_prompt
+    
+    @staticmethod
+    def record_usage(
+        user: Optional[User],
+        size: str,
+        quality: str,
+        style: str,
+        has_script_context: bool = False,
+        cached_media: Optional[Media] = None
+    ) -> float:
+        """Record the API usage of a generated image.
+        
+        Images reused from the cache, including translated screens' copies
+        of their original's image, are recorded at no cost, with the cost
+        they saved in the ``cache_hit`` and ``saved_cost`` metadata. They
+        don't count towards the user's image generation quota.
+        
+        Args:
+            user: The user the image was generated for (nothing is recorded without one)
+            size: Image size
+            quality: Image quality
+            style: Image style
+            has_script_context: Whether the prompt included script context
+            cached_media: The cached image that was reused, if any
+            
+        Returns:
+            The approximate cost of the image
+        """
+        # Calculate approximate cost (may need to be updated based on current OpenAI pricing)
+        # DALL-E 3 pricing: $0.040 / image (1024x1024 standard)
+        # $0.080 / image (1024x1024 HD)
+        base_cost = 0.04 if quality == "standard" else 0.08
+        cache_hit = cached_media is not None
+        cost = 0 if cache_hit else base_cost
+
+        # Log and track API usage if user is provided
+        if user:
+            usage_metadata = {
+                "model": IMAGE_MODEL,
+                "size": size,
+                "quality": quality,
+                "style": style,
+                "action": "image_generation",
+                "has_script_context": has_script_context,
+                "cache_hit": cache_hit,
+                "saved_cost": base_cost if cache_hit else 0
+            }
+            if cache_hit:
+                usage_metadata["cached_media_id"] = str(cached_media.id)
+
+            # Record API usage
+            APIUsage.objects.create(
+                user=user,
+                api_name="OpenAI",
+                endpoint="images/generations",
+                tokens_used=0,  # DALL-E doesn't use tokens
+                cost=cost,
+                metadata=usage_metadata
+            )
+
+            # Reused images involved no generation, so they don't count
+            # against the user's image quota
+            if not cache_hit:
+                user.update_usage('image_generation')
+        
+        return cost
     
     def generate_image(
         self, 
@@ -74,44 +180,15 @@ class ImageService:
             # Log the request
             logger.info(f"Generating image with prompt: {prompt[:50]}...")
             
-            # Enhance prompt with script context if provided
-            enhanced_prompt = prompt
-            if script_context:
-                # Extract relevant context information
-                title = script_context.get('title', '')
-                theme = script_context.get('theme', '')
-                style_context = script_context.get('style', '')
-                audience = script_context.get('audience', '')
-                
-                # Add context to the system message part of the prompt
-                context_parts = []
-                if title:
-                    context_parts.append(
-                        f"This image is for a video titled '{title}'"
-                    )
-                if theme:
-                    context_parts.append(f"with theme '{theme}'")
-                if style_context:
-                    context_parts.append(f"in style '{style_context}'")
-                if audience:
-                    context_parts.append(f"for audience '{audience}'")
-                
-                if context_parts:
-                    context_prefix = " ".join(context_parts) + ". "
-                    enhanced_prompt = context_prefix + enhanced_prompt
-            
-            # Add instruction to not include any text in the image
-            no_text_instruction = (
-                "IMPORTANT: Do not include any text, words, letters, numbers, "
-                "or captions in the image. The image should be completely free "
-                "of any textual elements. This image will be used for video creation."
-            )
-            enhanced_prompt = enhanced_prompt + " " + no_text_instruction
+            enhanced_prompt = self.build_prompt(prompt, script_context)
             
+            # Wait for a slot in the shared quota of this API key
+            rate_limiter.acquire("openai_images", self.api_key)
+
             # Make the API call
             try:
                 response = self.client.images.generate(
-                    model="dall-e-3",
+                    model=IMAGE_MODEL,
                     prompt=enhanced_prompt,
                     size=size,
                     quality=quality,
@@ -121,21 +198,23 @@ class ImageService:
             except Exception as e:
                 error_message = str(e)
                 # Check for rate limit error
-                if "rate_limit_exceeded" in error_message or "429" in error_message:
+                if rate_limiter.is_rate_limit_error(e):
                     logger.warning(f"Rate limit exceeded: {error_message}")
+                    retry_after = rate_limiter.get_retry_after(e)
+                    rate_limiter.penalize("openai_images", self.api_key, retry_after)
                     
                     # Include more details in the error
                     rate_limit_error = {
                         "error_type": "rate_limit",
                         "message": error_message,
-                        "retry_after": 60,  # Suggest retry after 60 seconds
-                        "advice": "The OpenAI rate limit has been exceeded. Wait a minute before trying again."
+                        "retry_after": retry_after,
+                        "advice": "The OpenAI rate limit has been exceeded. The request will be retried automatically."
                     }
                     
                     # Create metadata for the error
                     metadata = {
                         "error": rate_limit_error,
-                        "model": "dall-e-3",
+                        "model": IMAGE_MODEL,
                         "size": size,
                         "quality": quality,
                         "style": style,
@@ -152,36 +231,11 @@ class ImageService:
             image_url = response.data[0].url
             revised_prompt = response.data[0].revised_prompt
             
-            # Calculate approximate cost (may need to be updated based on current OpenAI pricing)
-            # DALL-E 3 pricing: $0.040 / image (1024x1024 standard)
-            # $0.080 / image (1024x1024 HD)
-            base_cost = 0.04 if quality == "standard" else 0.08
-            
-            # Log and track API usage if user is provided
-            if user:
-                # Record API usage
-                APIUsage.objects.create(
-                    user=user,
-                    api_name="OpenAI",
-                    endpoint="images/generations",
-                    tokens_used=0,  # DALL-E doesn't use tokens
-                    cost=base_cost,
-                    metadata={
-                        "model": "dall-e-3",
-                        "size": size,
-                        "quality": quality,
-                        "style": style,
-                        "action": "image_generation",
-                        "has_script_context": script_context is not None
-                    }
-                )
-                
-                # Update user's feature usage
-                user.update_usage('image_generation')
+            base_cost = self.record_usage(user, size, quality, style, script_context is not None)
             
             # Return the image URL and metadata
             metadata = {
-                "model": "dall-e-3",
+                "model": IMAGE_MODEL,
                 "size": size,
                 "quality": quality,
                 "style": style,
@@ -211,16 +265,20 @@ class ImageService:
         url: str, 
         workspace: Workspace, 
         filename: Optional[str] = None
-    ) -> Tuple[str, str]:
+    ) -> Tuple[StreamedFile, str]:
         """Download an image from a URL and save it locally.
         
+        The image is streamed to disk through the shared HTTP session, so it
+        is never held in memory, and hashed while it is written.
+        
         Args:
             url: The URL of the image to download
             workspace: The workspace to associate the image with
             filename: Optional filename to use, otherwise a UUID is generated
             
         Returns:
-            Tuple containing the local path and relative path for the Media model
+            Tuple containing the saved file (local path, size and SHA-256)
+            and the relative path for the Media model
         """
         try:
             # Generate a filename if not provided
@@ -232,31 +290,60 @@ class ImageService:
             relative_path = temp_media.file.field.upload_to(
                 temp_media, filename
             )
-            
-            # Create the full directory path if it doesn't exist
-            full_dir = os.path.dirname(
-                os.path.join(settings.MEDIA_ROOT, relative_path)
-            )
-            os.makedirs(full_dir, exist_ok=True)
-            
-            # Full path to save the image
             filepath = os.path.join(settings.MEDIA_ROOT, relative_path)
             
-            # Download the image
-            response = requests.get(url)
-            response.raise_for_status()
-            
-            # Save the image
-            with open(filepath, 'wb') as f:
-                f.write(response.content)
+            # Stream the image to disk
+            with client_registry.get_http_session().get(
+                url,
+                stream=True,
+                timeout=(settings.AI_CLIENT_CONNECT_TIMEOUT, settings.AI_CLIENT_TIMEOUT)
+            ) as response:
+                response.raise_for_status()
+                image_file = write_stream(response.iter_content(CHUNK_SIZE), filepath)
             
-            logger.info(f"Image downloaded and saved to {filepath}")
-            return filepath, relative_path
+            logger.info(f"Image downloaded and saved to {filepath} ({image_file.size} bytes)")
+            return image_file, relative_path
             
         except Exception as e:
             logger.error(f"Error downloading image: {str(e)}")
             raise
     
+    @staticmethod
+    def find_cached_image(
+        prompt: str,
+        workspace: Workspace,
+        user: Optional[User],
+        size: str = "1024x1024",
+        quality: str = "standard",
+        style: str = "vivid",
+        script_context: Optional[Dict[str, Any]] = None
+    ) -> Tuple[Optional[Media], str, str]:
+        """Find an image already generated for the same inputs.
+        
+        Args:
+            prompt: The visual description
+            workspace: The workspace the image is needed in
+            user: The user the image is generated for
+            size: Image size
+            quality: Image quality
+            style: Image style
+            script_context: Optional dictionary with additional script context
+            
+        Returns:
+            Tuple containing the cached image (None on a miss), the cache
+            key and the near-duplicate prompt key to store on a new image
+        """
+        enhanced_prompt = ImageService.build_prompt(prompt, script_context)
+        key = media_cache.image_key(enhanced_prompt, size, quality, style, IMAGE_MODEL)
+        prompt_key = media_cache.image_prompt_key(enhanced_prompt, size, quality, style, IMAGE_MODEL)
+        
+        cached = media_cache.find(key, workspace, user, file_type="image")
+        if cached is None and settings.IMAGE_CACHE_NEAR_DUPLICATES:
+            cached = media_cache.find(
+                prompt_key, workspace, user, file_type="image", near_duplicate=True
+            )
+        return cached, key, prompt_key
+    
     def generate_and_save_image(
         self,
         prompt: str,
@@ -270,6 +357,10 @@ class ImageService:
     ) -> Media:
         """Generate an image and save it as a Media object.
         
+        An image the user already generated from the same prompt and
+        settings is copied instead of calling DALL-E again (see
+        ``media_cache``).
+        
         Args:
             prompt: The text prompt to generate an image from
             workspace: The workspace to associate the image with
@@ -284,6 +375,19 @@ class ImageService:
             The created Media object
         """
         try:
+            cached, key, prompt_key = self.find_cached_image(
+                prompt, workspace, user, size, quality, style, script_context
+            )
+            if cached:
+                self.record_usage(
+                    user, size, quality, style,
+                    has_script_context=bool(script_context), cached_media=cached
+                )
+                return media_cache.clone(
+                    cached, workspace, name, user,
+                    metadata={"prompt": prompt, "script_context": script_context}
+                )
+            
             # Generate the image
             image_url, metadata = self.generate_image(
                 prompt=prompt,
@@ -298,22 +402,22 @@ class ImageService:
             filename = f"{uuid.uuid4()}.png"
             
             # Download the image
-            local_path, relative_path = self.download_image(
+            image_file, relative_path = self.download_image(
                 image_url, workspace, filename
             )
             
-            # Get file size
-            file_size = os.path.getsize(local_path)
-            
             # Create the Media object
             media = Media.objects.create(
                 workspace=workspace,
                 name=name,
                 file_type='image',
                 file=relative_path,
-                file_size=file_size,
+                file_size=image_file.size,
+                cache_key=key,
                 metadata={
                     "prompt": prompt,
+                    "prompt_key": prompt_key,
+                    "sha256": image_file.sha256,
                     "revised_prompt": metadata.get("revised_prompt", ""),
                     "generation_params": {
                         "size": size,
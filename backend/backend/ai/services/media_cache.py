@@ -0,0 +1,213 @@
+"""
+Reuse of previously generated media.
+
+Regenerating previews, re-finalizing a script (which recreates its
+screens), translating and duplicating screens all ask for narration and
+images that were already generated. Generated media is stored with a
+``cache_key`` hashing its generation inputs, and a request for the same
+inputs gets a copy of that media instead of a provider call:
+
+- voices are keyed by normalized text, voice, model and voice settings
+- images are keyed by enhanced prompt, size, quality, style and model.
+  Their ``prompt_key`` metadata also hashes a looser normalization of the
+  prompt, matched when ``IMAGE_CACHE_NEAR_DUPLICATES`` is enabled
+
+The copy is a hard link where the filesystem allows it, so it costs no
+space, while every Media row still owns its own file and deleting one
+never breaks another.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import unicodedata
+import uuid
+from typing import Any, Dict, Optional, Tuple
+
+from django.conf import settings
+
+from backend.utils.downloads import StreamedFile
+from backend.workspaces.models import Media
+
+logger = logging.getLogger(__name__)
+
+# Candidates checked for a file that still exists
+MAX_CANDIDATES = 5
+
+
+def normalize_text(text: str) -> str:
+    """Normalize narration text so formatting-only edits hit the cache."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Loosely normalize an image prompt, ignoring case, punctuation and spacing."""
+    prompt = unicodedata.normalize("NFKC", prompt).casefold()
+    return " ".join(re.sub(r"[^\w\s]", " ", prompt).split())
+
+
+def _hash(*parts: Any) -> str:
+    payload = json.dumps(parts, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def voice_key(
+    text: str,
+    voice_id: str,
+    model_id: str,
+    voice_settings: Optional[Dict[str, Any]] = None,
+) -> str:
+    """
+    Get the cache key of a voice synthesis.
+
+    Args:
+        text: The text to convert to speech
+        voice_id: The ID of the voice
+        model_id: The ID of the model
+        voice_settings: Optional voice settings of the request
+
+    Returns:
+        Hex SHA-256 of the synthesis inputs
+    """
+    return _hash("voice", normalize_text(text), voice_id, model_id, voice_settings or {})
+
+
+def image_key(prompt: str, size: str, quality: str, style: str, model: str) -> str:
+    """
+    Get the cache key of an image generation.
+
+    Args:
+        prompt: The enhanced prompt sent to the model
+        size: Image size
+        quality: Image quality
+        style: Image style
+        model: The image model
+
+    Returns:
+        Hex SHA-256 of the generation inputs
+    """
+    return _hash("image", prompt, size, quality, style, model)
+
+
+def image_prompt_key(prompt: str, size: str, quality: str, style: str, model: str) -> str:
+    """Get the near-duplicate key of an image generation, see ``image_key``."""
+    return _hash("image", normalize_prompt(prompt), size, quality, style, model)
+
+
+def find(
+    key: str,
+    workspace,
+    user=None,
+    file_type: str = "audio",
+    near_duplicate: bool = False,
+) -> Optional[Media]:
+    """
+    Find generated media for a cache key.
+
+    Media from the user's other workspaces is reused too, preferring the
+    given workspace. Other users' media never is.
+
+    Args:
+        key: The cache key of the generation
+        workspace: The workspace the media is needed in
+        user: The user the media is generated for
+        file_type: The media type ('audio' or 'image')
+        near_duplicate: Whether ``key`` is an image ``prompt_key``
+
+    Returns:
+        The most recent matching Media whose file still exists, if any
+    """
+    queryset = Media.objects.filter(file_type=file_type)
+    if near_duplicate:
+        queryset = queryset.filter(metadata__prompt_key=key)
+    else:
+        queryset = queryset.filter(cache_key=key)
+    queryset = queryset.filter(uploaded_by=user) if user else queryset.filter(workspace=workspace)
+
+    # The workspace's own media first, then the newest
+    candidates = sorted(
+        queryset.order_by("-created_at")[:MAX_CANDIDATES],
+        key=lambda media: media.workspace_id != workspace.id,
+    )
+    for media in candidates:
+        if os.path.exists(os.path.join(settings.MEDIA_ROOT, media.file.name)):
+            return media
+    return None
+
+
+def copy_to(source: Media, workspace, filename: Optional[str] = None) -> Tuple[StreamedFile, str]:
+    """
+    Copy cached media into a new file of a workspace.
+
+    Args:
+        source: The cached media
+        workspace: The workspace to copy it to
+        filename: Optional filename to use, otherwise a UUID is generated
+
+    Returns:
+        Tuple containing the new file (local path, size and SHA-256) and the
+        relative path for the Media model
+    """
+    if not filename:
+        filename = f"{uuid.uuid4()}{os.path.splitext(source.file.name)[1]}"
+    temp_media = Media(workspace=workspace, file=filename)
+    relative_path = temp_media.file.field.upload_to(temp_media, filename)
+    source_path = os.path.join(settings.MEDIA_ROOT, source.file.name)
+    filepath = os.path.join(settings.MEDIA_ROOT, relative_path)
+
+    os.makedirs(os.path.dirname(filepath), exist_ok=True)
+    try:
+        os.link(source_path, filepath)
+    except OSError:
+        shutil.copyfile(source_path, filepath)
+
+    sha256 = source.metadata.get("sha256")
+    if not sha256:
+        with open(filepath, "rb") as f:
+            sha256 = hashlib.file_digest(f, "sha256").hexdigest()
+    size = os.path.getsize(filepath)
+
+    logger.info(f"Reused cached {source.file_type} {source.id} as {filepath}")
+    return StreamedFile(filepath, size, sha256), relative_path
+
+
+def clone(
+    source: Media,
+    workspace,
+    name: str,
+    user=None,
+    metadata: Optional[Dict[str, Any]] = None,
+) -> Media:
+    """
+    Create a Media with a copy of cached media.
+
+    Args:
+        source: The cached media
+        workspace: The workspace to create the media in
+        name: The name for the media object
+        user: The user the media is for
+        metadata: Metadata to set over the source's
+
+    Returns:
+        The created Media object
+    """
+    media_file, relative_path = copy_to(source, workspace)
+    return Media.objects.create(
+        workspace=workspace,
+        name=name,
+        file_type=source.file_type,
+        file=relative_path,
+        file_size=media_file.size,
+        duration=source.duration,
+        cache_key=source.cache_key,
+        metadata={
+            **source.metadata,
+            **(metadata or {}),
+            "sha256": media_file.sha256,
+            "cached_from": str(source.id),
+        },
+        uploaded_by=user,
+    )
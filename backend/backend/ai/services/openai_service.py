@@ -5,8 +5,8 @@ Provides functionality for generating video scripts and content.
 
 import logging
 from typing import Dict, List, Any, Optional, Tuple
-from openai import OpenAI
 from django.conf import settings
+from backend.ai.services import client_registry, rate_limiter
 from backend.users.models import User, APIUsage
 
 logger = logging.getLogger(__name__)
@@ -19,16 +19,7 @@ class OpenAIService:
     def __init__(self, api_key=None):
         """Initialize the OpenAI service with an API key."""
         self.api_key = api_key or settings.OPENAI_API_KEY
-
-        # In newer versions of OpenAI API, proxy settings should be in http_client
-        # and not directly passed to the OpenAI constructor
-        try:
-            # Initialize the client without any proxy settings
-            self.client = OpenAI(api_key=self.api_key)
-        except Exception as e:
-            logger.error(f"Error initializing OpenAI client: {str(e)}")
-            # Fallback to a basic initialization if there's an error
-            self.client = OpenAI(api_key=self.api_key)
+        self.client = client_registry.get_openai_client(self.api_key)
 
     def set_api_key(self, api_key: str) -> None:
         """Set the API key for the service.
@@ -37,7 +28,7 @@ class OpenAIService:
             api_key: The OpenAI API key to use
         """
         self.api_key = api_key
-        self.client = OpenAI(api_key=api_key)
+        self.client = client_registry.get_openai_client(api_key)
 
     def generate_script(
         self,
@@ -100,7 +91,9 @@ class OpenAIService:
         print("OpenAI prompt", prompt)
         try:
             # Call OpenAI API with new client syntax
-            response = self.client.chat.completions.create(
+            response = rate_limiter.create_chat_completion(
+                self.client,
+                self.api_key,
                 model="gpt-4o",  # or any other appropriate model
                 messages=[
                     {
@@ -167,7 +160,9 @@ Maintain the same format with [INTRO], [BODY], [CONCLUSION], [VISUAL] and [TRANS
 """
 
         try:
-            response = self.client.chat.completions.create(
+            response = rate_limiter.create_chat_completion(
+                self.client,
+                self.api_key,
                 model="gpt-4o",
                 messages=[
                     {
@@ -260,7 +255,9 @@ Be detailed in your visual descriptions so an AI image generator could create ap
 """
 
         try:
-            response = self.client.chat.completions.create(
+            response = rate_limiter.create_chat_completion(
+                self.client,
+                self.api_key,
                 model="gpt-4",
                 messages=[
                     {
@@ -0,0 +1,304 @@
+"""
+Distributed token-bucket rate limiter for AI provider calls.
+
+Every provider and API key pair has a bucket in Redis that refills at the
+provider's requests-per-minute and tokens-per-minute quota, so all workers
+sharing a key stay under the quota together. Callers take a token before
+each request and wait for one when the bucket is empty; if the wait would
+be too long, ``RateLimitExceeded`` tells them how long to back off so a
+Celery task can be rescheduled instead of failing.
+
+When a provider answers 429 anyway, ``penalize`` blocks the bucket for the
+provider's retry-after, so every worker backs off at once.
+"""
+
+import math
+import time
+import hashlib
+import logging
+from typing import Any, Dict, Optional
+
+from django.conf import settings
+
+from backend.utils.redis_client import get_redis, register_script
+
+logger = logging.getLogger(__name__)
+
+# Retry-after used when a 429 doesn't say how long to wait
+DEFAULT_RETRY_AFTER = 60
+# Completion length assumed for chat requests without max_tokens
+DEFAULT_COMPLETION_TOKENS = 1000
+
+# KEYS: bucket  ARGV: now, rpm, tpm (0 = unlimited), requests, tokens, force
+# Refills both buckets for the elapsed time, then takes the requested
+# amounts if available (or unconditionally when forced). Returns the
+# seconds to wait before the request can be made, as a string.
+_TAKE = register_script("""
+local now = tonumber(ARGV[1])
+local rpm = tonumber(ARGV[2])
+local tpm = tonumber(ARGV[3])
+local want_requests = tonumber(ARGV[4])
+local want_tokens = tonumber(ARGV[5])
+local force = ARGV[6] == '1'
+local state = redis.call('HMGET', KEYS[1], 'requests', 'tokens', 'ts', 'blocked_until')
+local requests = tonumber(state[1]) or rpm
+local tokens = tonumber(state[2]) or tpm
+local elapsed = math.max(0, now - (tonumber(state[3]) or now))
+local blocked_until = tonumber(state[4]) or 0
+
+requests = math.min(rpm, requests + elapsed * rpm / 60)
+if tpm > 0 then
+    tokens = math.min(tpm, tokens + elapsed * tpm / 60)
+end
+
+local wait = math.max(0, blocked_until - now)
+if requests < want_requests then
+    wait = math.max(wait, (want_requests - requests) * 60 / rpm)
+end
+if tpm > 0 and tokens < want_tokens then
+    wait = math.max(wait, (want_tokens - tokens) * 60 / tpm)
+end
+
+if wait == 0 or force then
+    requests = requests - want_requests
+    if tpm > 0 then
+        tokens = tokens - want_tokens
+    end
+end
+
+redis.call('HSET', KEYS[1], 'requests', requests, 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(math.max(120, blocked_until - now)))
+if force then
+    return '0'
+end
+return tostring(wait)
+""")
+
+
+class RateLimitExceeded(ValueError):
+    """Raised when a provider token isn't available within the allowed wait.
+
+    Carries the same ``(message, {"error": {...}})`` arguments the AI
+    services already use for provider rate-limit errors, so existing
+    handlers mark the screen as rate limited.
+    """
+
+    def __init__(self, provider: str, retry_after: float, message: Optional[str] = None):
+        self.provider = provider
+        self.retry_after = max(1, int(math.ceil(retry_after)))
+        message = message or f"{provider} rate limit reached, retry in {self.retry_after} seconds"
+        super().__init__(
+            f"Rate limit error: {message}",
+            {
+                "error": {
+                    "error_type": "rate_limit",
+                    "message": message,
+                    "retry_after": self.retry_after,
+                    "advice": "The provider's rate limit has been reached. The request will be retried automatically.",
+                }
+            },
+        )
+
+
+def get_limits(provider: str) -> Dict[str, int]:
+    """Get the requests and tokens per minute quota of a provider."""
+    limits = settings.AI_RATE_LIMITS[provider]
+    return {"rpm": int(limits["rpm"]), "tpm": int(limits.get("tpm") or 0)}
+
+
+def _bucket_key(provider: str, api_key: Optional[str]) -> str:
+    """Build the bucket key; API keys are hashed so they never reach Redis."""
+    key_hash = hashlib.sha256((api_key or "").encode()).hexdigest()[:16]
+    return f"ratelimit:{provider}:{key_hash}"
+
+
+def _take(provider: str, api_key: Optional[str], requests: int, tokens: int, force: bool) -> float:
+    """Run the bucket script and return the seconds to wait."""
+    limits = get_limits(provider)
+    if limits["tpm"] and not force:
+        # A request larger than the whole bucket could never be admitted
+        tokens = min(tokens, limits["tpm"])
+    wait = _TAKE(
+        keys=[_bucket_key(provider, api_key)],
+        args=[time.time(), limits["rpm"], limits["tpm"], requests, tokens, "1" if force else "0"],
+    )
+    return float(wait)
+
+
+def acquire(
+    provider: str,
+    api_key: Optional[str],
+    tokens: int = 0,
+    max_wait: Optional[float] = None,
+) -> None:
+    """
+    Take a request token (and optionally usage tokens) from a bucket.
+
+    Blocks until the tokens are available. If that would take longer than
+    ``max_wait`` seconds, raises ``RateLimitExceeded`` with the time to
+    back off instead. If Redis is unavailable the call is let through.
+
+    Args:
+        provider: Provider name, a key of ``AI_RATE_LIMITS``
+        api_key: API key the request is made with
+        tokens: Estimated usage tokens (or characters) of the request
+        max_wait: Longest time to block, defaults to ``AI_RATE_LIMIT_MAX_WAIT``
+
+    Raises:
+        RateLimitExceeded: If no token is available within ``max_wait``
+    """
+    if max_wait is None:
+        max_wait = settings.AI_RATE_LIMIT_MAX_WAIT
+    deadline = time.monotonic() + max_wait
+
+    while True:
+        try:
+            wait = _take(provider, api_key, 1, tokens, force=False)
+        except Exception as e:
+            logger.warning(f"Rate limiter unavailable, allowing {provider} request: {str(e)}")
+            return
+
+        if wait <= 0:
+            return
+        if time.monotonic() + wait > deadline:
+            raise RateLimitExceeded(provider, wait)
+
+        logger.debug(f"Waiting {wait:.2f}s for a {provider} token")
+        time.sleep(wait)
+
+
+def record_usage(provider: str, api_key: Optional[str], tokens: int) -> None:
+    """
+    Charge usage beyond the estimate taken in ``acquire``.
+
+    Called with the difference between the actual and the estimated usage
+    once a response reports it. The bucket may go negative, which delays
+    the next callers until the quota has caught up.
+
+    Args:
+        provider: Provider name, a key of ``AI_RATE_LIMITS``
+        api_key: API key the request was made with
+        tokens: Additional usage tokens to charge
+    """
+    if tokens <= 0 or not get_limits(provider)["tpm"]:
+        return
+    try:
+        _take(provider, api_key, 0, tokens, force=True)
+    except Exception as e:
+        logger.warning(f"Failed to record {provider} usage: {str(e)}")
+
+
+def penalize(provider: str, api_key: Optional[str], retry_after: float) -> None:
+    """
+    Block a bucket after the provider answered 429.
+
+    Args:
+        provider: Provider name, a key of ``AI_RATE_LIMITS``
+        api_key: API key the request was made with
+        retry_after: Seconds the provider asked to wait
+    """
+    try:
+        key = _bucket_key(provider, api_key)
+        pipe = get_redis().pipeline()
+        pipe.hset(key, mapping={"blocked_until": time.time() + retry_after, "requests": 0})
+        pipe.expire(key, max(120, int(math.ceil(retry_after))))
+        pipe.execute()
+        logger.warning(f"{provider} returned 429, blocking requests for {retry_after}s")
+    except Exception as e:
+        logger.warning(f"Failed to penalize {provider} bucket: {str(e)}")
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """Check whether a provider error is a 429 response."""
+    status_code = getattr(error, "status_code", None)
+    if status_code is None:
+        status_code = getattr(getattr(error, "response", None), "status_code", None)
+    if status_code == 429:
+        return True
+    message = str(error)
+    return "rate_limit_exceeded" in message or "429" in message
+
+
+def get_retry_after(error: Exception, default: float = DEFAULT_RETRY_AFTER) -> float:
+    """
+    Read how long to back off from a provider's 429 response.
+
+    Args:
+        error: The exception raised by the provider client
+        default: Seconds to use when the response has no retry-after
+
+    Returns:
+        Seconds to wait before retrying
+    """
+    headers: Any = getattr(error, "headers", None) or getattr(
+        getattr(error, "response", None), "headers", None
+    )
+    if headers:
+        try:
+            if headers.get("retry-after-ms"):
+                return float(headers["retry-after-ms"]) / 1000
+            if headers.get("retry-after"):
+                return float(headers["retry-after"])
+        except (TypeError, ValueError):
+            pass
+    return default
+
+
+def estimate_chat_tokens(messages, max_tokens: Optional[int] = None) -> int:
+    """
+    Estimate the tokens a chat completion will use before it is sent.
+
+    Uses roughly four characters per prompt token, plus the completion
+    limit or a typical completion length.
+
+    Args:
+        messages: Chat messages of the request
+        max_tokens: Completion limit of the request, if set
+
+    Returns:
+        Estimated total tokens
+    """
+    prompt_characters = sum(len(str(message.get("content", ""))) for message in messages)
+    return prompt_characters // 4 + (max_tokens or DEFAULT_COMPLETION_TOKENS)
+
+
+def create_chat_completion(client, api_key: Optional[str], **kwargs):
+    """
+    Create an OpenAI chat completion within the shared quota of an API key.
+
+    Takes the estimated tokens before the call and charges the difference
+    to the actual usage afterwards. A 429 blocks the bucket, and the call
+    is retried up to ``AI_CLIENT_MAX_RETRIES`` times once the limiter
+    hands out a token again; when that is further off than
+    ``AI_RATE_LIMIT_MAX_WAIT``, ``RateLimitExceeded`` is raised instead.
+
+    Args:
+        client: OpenAI client to call
+        api_key: API key the client uses
+        **kwargs: Arguments for ``client.chat.completions.create``
+
+    Returns:
+        The chat completion response
+    """
+    estimate = estimate_chat_tokens(kwargs.get("messages", []), kwargs.get("max_tokens"))
+
+    attempt = 0
+    while True:
+        # After a 429 this waits out the block, or raises if it is too long
+        acquire("openai_chat", api_key, tokens=estimate)
+        try:
+            response = client.chat.completions.create(**kwargs)
+            break
+        except Exception as e:
+            if not is_rate_limit_error(e):
+                raise
+            retry_after = get_retry_after(e)
+            penalize("openai_chat", api_key, retry_after)
+            if attempt >= settings.AI_CLIENT_MAX_RETRIES:
+                raise RateLimitExceeded("openai_chat", retry_after, str(e))
+            attempt += 1
+
+    usage = getattr(response, "usage", None)
+    if usage is not None and usage.total_tokens:
+        record_usage("openai_chat", api_key, usage.total_tokens - estimate)
+    return response
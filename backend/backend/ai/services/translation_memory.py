@@ -0,0 +1,95 @@
+"""
+Translation memory for TranslationService.
+
+Every text the LLM translates is stored keyed by the SHA-256 of the source
+text, the source and target languages and the model. Before a translation
+request, the texts already in memory are looked up and only the misses are
+sent, so re-translating an edited script pays for the changed texts only.
+"""
+
+import hashlib
+import logging
+from typing import Dict, Iterable
+
+from django.db.models import F
+from django.utils import timezone
+
+from backend.ai.models import TranslationMemory
+
+logger = logging.getLogger(__name__)
+
+
+def text_hash(text: str) -> str:
+    """Get the memory key of a source text."""
+    return hashlib.sha256(text.strip().encode()).hexdigest()
+
+
+def lookup(
+    texts: Iterable[str], source_language: str, target_language: str, model: str
+) -> Dict[str, str]:
+    """
+    Look up the remembered translations of texts.
+
+    Args:
+        texts: The source texts
+        source_language: ISO code of the source language
+        target_language: ISO code of the target language
+        model: The model the translations must come from
+
+    Returns:
+        Translations by source text, for the texts that were found
+    """
+    texts_by_hash = {text_hash(text): text for text in texts if text and text.strip()}
+    if not texts_by_hash:
+        return {}
+
+    matches = TranslationMemory.objects.filter(
+        source_hash__in=texts_by_hash,
+        source_language=source_language,
+        target_language=target_language,
+        model=model,
+    )
+    found = dict(matches.values_list("source_hash", "translated_text"))
+    if found:
+        matches.update(hits=F("hits") + 1, last_used_at=timezone.now())
+
+    logger.info(
+        f"Translation memory {source_language}->{target_language}: "
+        f"{len(found)} of {len(texts_by_hash)} texts found"
+    )
+    return {texts_by_hash[source_hash]: translated for source_hash, translated in found.items()}
+
+
+def store(
+    translations: Dict[str, str], source_language: str, target_language: str, model: str
+) -> None:
+    """
+    Remember new translations.
+
+    A failure is logged rather than raised, as the translations themselves
+    are still good.
+
+    Args:
+        translations: Translated texts by source text
+        source_language: ISO code of the source language
+        target_language: ISO code of the target language
+        model: The model that translated them
+    """
+    entries = [
+        TranslationMemory(
+            source_hash=text_hash(source),
+            source_language=source_language,
+            target_language=target_language,
+            model=model,
+            source_text=source,
+            translated_text=translated,
+        )
+        for source, translated in translations.items()
+        if source and source.strip() and translated
+    ]
+    if not entries:
+        return
+    try:
+        TranslationMemory.objects.bulk_create(entries, ignore_conflicts=True)
+    except Exception as e:
+        logger.warning(f"Failed to store {len(entries)} translations: {str(e)}")
@@ -3,10 +3,11 @@ Translation service for translating screen content.
 """
 import logging
 import json
-from typing import Dict, Any, List, Optional
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Any, Callable, Hashable, List, Optional
 
 from django.conf import settings
-from openai import OpenAI
+from backend.ai.services import client_registry, rate_limiter, translation_memory
 from django.http import HttpRequest
 logger = logging.getLogger(__name__)
 
@@ -17,7 +18,7 @@ class TranslationService:
     def __init__(self, api_key: Optional[str] = None):
         """Initialize the translation service with an API key."""
         self.api_key = api_key or settings.OPENAI_API_KEY
-        self.client = OpenAI(api_key=self.api_key)
+        self.client = client_registry.get_openai_client(self.api_key)
         self.model = "gpt-4o"
         self.language_names = {
                 'en': 'English',
@@ -36,20 +37,33 @@ class TranslationService:
                 'hi': 'Hindi'
         }
     
+    # Scene fields that are translated, with their names in the LLM payload
+    SCENE_FIELDS = (("narrator", "narration"), ("on_screen_text", "on_screen_text"))
+    # Scenes and narrations sent per LLM call
+    SCENE_BATCH_SIZE = 5
+    NARRATION_BATCH_SIZE = 10
+    
     def translate_scene_data(
         self, 
         scene_data: List[Dict[str, Any]], 
         source_language: str = 'en', 
         target_language: str = 'es',
-        request: Optional[HttpRequest] = None
+        request: Optional[HttpRequest] = None,
+        progress_callback: Optional[Callable[[int, int], None]] = None
     ) -> List[Dict[str, Any]]:
         """
         Translate scene data from source language to target language.
         
+        Texts found in the translation memory are reused, and only scenes
+        with a text missing from it are sent to the LLM, in batches that run
+        concurrently (see ``_run_batches``).
+        
         Args:
             scene_data: List of scene dictionaries containing narration and visual descriptions
             source_language: ISO code of the source language (default: 'en')
             target_language: ISO code of the target language (default: 'es')
+            progress_callback: Optional function called with the number of
+                finished and total batches as each batch finishes
             
         Returns:
             List of translated scene dictionaries
@@ -59,44 +73,91 @@ class TranslationService:
             return []
         
         try:
-            # Prepare the scene data for translation
+            remembered = translation_memory.lookup(
+                (scene.get(field, "") for scene in scene_data for field, _ in self.SCENE_FIELDS),
+                source_language,
+                target_language,
+                self.model
+            )
+            
+            # Prepare the scenes that still need translating
             scenes_for_translation = []
             for i, scene in enumerate(scene_data):
+                texts = [scene.get(field, "") for field, _ in self.SCENE_FIELDS]
+                if all(not text or text in remembered for text in texts):
+                    continue
                 scenes_for_translation.append({
                     "scene_number": i + 1,
                     "narration": scene.get("narrator", ""),
                     "on_screen_text": scene.get("on_screen_text", "")
                 })
             
-            # Create a prompt for the translation
-            language_names = {
-                'en': 'English',
-                'ta': 'Tamil',
-                'es': 'Spanish',
-                'fr': 'French',
-                'de': 'German',
-                'it': 'Italian',
-                'pt': 'Portuguese',
-                'nl': 'Dutch',
-                'ru': 'Russian',
-                'ja': 'Japanese',
-                'zh': 'Chinese',
-                'ko': 'Korean',
-                'ar': 'Arabic',
-                'hi': 'Hindi'
-            }
+            source_lang_name = self.language_names.get(source_language, source_language)
+            target_lang_name = self.language_names.get(target_language, target_language)
             
-            source_lang_name = language_names.get(source_language, source_language)
-            target_lang_name = language_names.get(target_language, target_language)
+            # Translate in concurrent batches; results are keyed by scene
+            # number, so the merge below keeps the scene order
+            translated_scenes = self._run_batches(
+                scenes_for_translation,
+                self.SCENE_BATCH_SIZE,
+                lambda batch: self._translate_scene_batch(batch, source_lang_name, target_lang_name),
+                lambda scene: scene["scene_number"],
+                progress_callback
+            )
             
-            # Split into smaller batches if there are many scenes
-            batch_size = 5
-            batched_results = []
+            # Remember the new translations
+            learned = {}
+            for scene_number, translated_scene in translated_scenes.items():
+                original_scene = scene_data[scene_number - 1]
+                for field, name in self.SCENE_FIELDS:
+                    if original_scene.get(field) and translated_scene.get(name):
+                        learned[original_scene[field]] = translated_scene[name]
+            translation_memory.store(learned, source_language, target_language, self.model)
             
-            for i in range(0, len(scenes_for_translation), batch_size):
-                batch = scenes_for_translation[i:i+batch_size]
-                
-                prompt = f"""
+            # Merge the translated content with the original scene data, in order
+            result = []
+            for i, original_scene in enumerate(scene_data):
+                translated_scene = translated_scenes.get(i + 1, {})
+                # Create a copy of the original scene
+                new_scene = original_scene.copy()
+                for field, name in self.SCENE_FIELDS:
+                    text = original_scene.get(field, "")
+                    # Keep the original if there is no translation for this scene
+                    new_scene[field] = remembered.get(text) or translated_scene.get(name, text)
+                result.append(new_scene)
+            
+            return result
+            
+        except rate_limiter.RateLimitExceeded:
+            raise
+        except Exception as e:
+            logger.error(f"Error translating scene data: {str(e)}")
+            # Log the line number where the error occurred
+            import traceback
+            tb = traceback.extract_tb(e.__traceback__)
+            line_no = tb[-1].lineno if tb else "unknown"
+            logger.error(f"Error occurred at line {line_no}")
+            # Return the original scene data if translation fails
+            raise Exception(f"Error translating scene data: {str(e)}")
+    
+    def _translate_scene_batch(
+        self,
+        batch: List[Dict[str, Any]],
+        source_lang_name: str,
+        target_lang_name: str
+    ) -> Dict[int, Dict[str, Any]]:
+        """
+        Translate a batch of scenes with one LLM call.
+        
+        Args:
+            batch: Scenes with their scene_number, narration and on_screen_text
+            source_lang_name: Name of the source language
+            target_lang_name: Name of the target language
+            
+        Returns:
+            Translated scenes by scene number
+        """
+        prompt = f"""
                 Translate the following video script scenes from {source_lang_name} to {target_lang_name}.
                 Maintain the same meaning, tone, and style, but adapt cultural references if necessary.
                 
@@ -123,97 +184,168 @@ class TranslationService:
                   ]
                 }}
                 """
+        
+        # Call the OpenAI API for translation
+        response = rate_limiter.create_chat_completion(
+            self.client,
+            self.api_key,
+            model=self.model,
+            messages=[
+                {"role": "system", "content": "You are a professional translator. Return valid JSON with all scenes translated."},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0.3,
+            response_format={"type": "json_object"}
+        )
+        
+        # Extract and parse the translated content
+        translated_content = response.choices[0].message.content
+        if not translated_content:
+            logger.error("Empty response from OpenAI API")
+            raise ValueError("Empty response from OpenAI API")
+        
+        try:
+            translated_data = json.loads(translated_content)
+            logger.info(f"Translated data: {translated_data}")
+            
+            # Extract scenes from the response
+            if 'scenes' in translated_data:
+                batch_scenes = translated_data['scenes']
+            else:
+                # If 'scenes' key is missing, try to use the whole response
+                batch_scenes = translated_data
                 
-                logger.info(f"Translating batch {i//batch_size + 1} of {(len(scenes_for_translation) + batch_size - 1)//batch_size}")
-                
-                # Call the OpenAI API for translation
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=[
-                        {"role": "system", "content": "You are a professional translator. Return valid JSON with all scenes translated."},
-                        {"role": "user", "content": prompt}
-                    ],
-                    temperature=0.3,
-                    response_format={"type": "json_object"}
-                )
-                
-                # Extract and parse the translated content
-                translated_content = response.choices[0].message.content
-                if not translated_content:
-                    logger.error("Empty response from OpenAI API")
-                    raise ValueError("Empty response from OpenAI API")
-                
-                try:
-                    translated_data = json.loads(translated_content)
-                    logger.info(f"Translated data: {translated_data}")
-                    
-                    # Extract scenes from the response
-                    if 'scenes' in translated_data:
-                        batch_scenes = translated_data['scenes']
-                    else:
-                        # If 'scenes' key is missing, try to use the whole response
-                        batch_scenes = translated_data
+                # If it's not a list, check if it's a dict with numbered keys
+                if not isinstance(batch_scenes, list):
+                    if isinstance(batch_scenes, dict):
+                        # Try to extract scenes from numbered keys
+                        numbered_scenes = []
+                        for scene in batch:
+                            key = str(scene["scene_number"])
+                            if key in batch_scenes and isinstance(batch_scenes[key], dict):
+                                numbered_scenes.append({**batch_scenes[key], "scene_number": scene["scene_number"]})
                         
-                        # If it's not a list, check if it's a dict with numbered keys
-                        if not isinstance(batch_scenes, list):
-                            if isinstance(batch_scenes, dict):
-                                # Try to extract scenes from numbered keys
-                                numbered_scenes = []
-                                for j in range(1, len(batch) + 1):
-                                    if str(j) in batch_scenes:
-                                        scene = batch_scenes[str(j)]
-                                        if isinstance(scene, dict):
-                                            scene['scene_number'] = j
-                                            numbered_scenes.append(scene)
-                                
-                                if numbered_scenes:
-                                    batch_scenes = numbered_scenes
-                                else:
-                                    # Last resort: try to create a list from the values
-                                    batch_scenes = list(batch_scenes.values())
-                            else:
-                                raise ValueError(f"Unexpected response format: {type(batch_scenes)}")
-                    
-                    # Validate that we got the expected number of scenes
-                    if len(batch_scenes) != len(batch):
-                        logger.warning(
-                            f"Expected {len(batch)} scenes but got {len(batch_scenes)}. "
-                            f"Will use available translations and keep originals for the rest."
-                        )
-                    
-                    batched_results.extend(batch_scenes)
-                    
-                except json.JSONDecodeError as e:
-                    logger.error(f"Failed to parse JSON response: {e}")
-                    logger.error(f"Response content: {translated_content}")
-                    raise ValueError(f"Invalid JSON response: {e}")
-            
-            # Merge the translated content with the original scene data
-            result = []
-            for i, original_scene in enumerate(scene_data):
-                if i < len(batched_results):
-                    translated_scene = batched_results[i]
-                    # Create a copy of the original scene
-                    new_scene = original_scene.copy()
-                    # Update with translated content
-                    new_scene["narrator"] = translated_scene.get("narration", original_scene.get("narrator", ""))
-                    new_scene["on_screen_text"] = translated_scene.get("on_screen_text", original_scene.get("on_screen_text", ""))
-                    result.append(new_scene)
-                else:
-                    # If we don't have a translation for this scene, keep the original
-                    result.append(original_scene)
+                        if numbered_scenes:
+                            batch_scenes = numbered_scenes
+                        else:
+                            # Last resort: try to create a list from the values
+                            batch_scenes = list(batch_scenes.values())
+                    else:
+                        raise ValueError(f"Unexpected response format: {type(batch_scenes)}")
             
-            return result
+            # Validate that we got the expected number of scenes
+            if len(batch_scenes) != len(batch):
+                logger.warning(
+                    f"Expected {len(batch)} scenes but got {len(batch_scenes)}. "
+                    f"Will use available translations and keep originals for the rest."
+                )
+        except json.JSONDecodeError as e:
+            logger.error(f"Failed to parse JSON response: {e}")
+            logger.error(f"Response content: {translated_content}")
+            raise ValueError(f"Invalid JSON response: {e}")
+        
+        # Match the translations to their scenes by number, or by position
+        scenes_by_number = {scene["scene_number"]: scene for scene in batch}
+        scene_numbers = list(scenes_by_number)
+        translated = {}
+        for position, translated_scene in enumerate(batch_scenes):
+            if not isinstance(translated_scene, dict):
+                continue
+            scene_number = translated_scene.get("scene_number")
+            if scene_number not in scenes_by_number:
+                if position >= len(scene_numbers):
+                    continue
+                scene_number = scene_numbers[position]
+            # Scenes whose texts came back empty are left for a retry
+            if any(
+                scenes_by_number[scene_number].get(name) and not translated_scene.get(name)
+                for _, name in self.SCENE_FIELDS
+            ):
+                continue
+            translated[scene_number] = translated_scene
+        return translated
+    
+    def _run_batches(
+        self,
+        items: List[Any],
+        batch_size: int,
+        translate_batch: Callable[[List[Any]], Dict[Hashable, Any]],
+        key: Callable[[Any], Hashable],
+        progress_callback: Optional[Callable[[int, int], None]] = None
+    ) -> Dict[Hashable, Any]:
+        """
+        Translate items in batches, running up to ``TRANSLATION_CONCURRENCY`` at once.
+        
+        Each batch is retried up to ``TRANSLATION_BATCH_RETRIES`` times, for
+        an invalid response or for the items missing from its result. Items
+        still missing after that are left out, so callers keep their
+        originals.
+        
+        Args:
+            items: The items to translate
+            batch_size: Items per LLM call
+            translate_batch: Function translating a batch, returning the
+                translations by item key
+            key: Function returning the key of an item
+            progress_callback: Optional function called with the number of
+                finished and total batches as each batch finishes
             
-        except Exception as e:
-            logger.error(f"Error translating scene data: {str(e)}")
-            # Log the line number where the error occurred
-            import traceback
-            tb = traceback.extract_tb(e.__traceback__)
-            line_no = tb[-1].lineno if tb else "unknown"
-            logger.error(f"Error occurred at line {line_no}")
-            # Return the original scene data if translation fails
-            raise Exception(f"Error translating scene data: {str(e)}")
+        Returns:
+            Translations by item key
+        """
+        batches = [items[i:i + batch_size] for i in range(0, len(items), batch_size)]
+        if not batches:
+            return {}
+        
+        translated = {}
+        with ThreadPoolExecutor(max_workers=min(settings.TRANSLATION_CONCURRENCY, len(batches))) as executor:
+            futures = [
+                executor.submit(self._translate_with_retries, translate_batch, batch, key)
+                for batch in batches
+            ]
+            try:
+                for finished, future in enumerate(as_completed(futures), 1):
+                    translated.update(future.result())
+                    logger.info(f"Translated batch {finished} of {len(batches)}")
+                    if progress_callback:
+                        progress_callback(finished, len(batches))
+            except Exception:
+                for future in futures:
+                    future.cancel()
+                raise
+        return translated
+    
+    def _translate_with_retries(
+        self,
+        translate_batch: Callable[[List[Any]], Dict[Hashable, Any]],
+        batch: List[Any],
+        key: Callable[[Any], Hashable]
+    ) -> Dict[Hashable, Any]:
+        """Translate a batch, retrying an invalid response or the items it missed."""
+        translated = {}
+        pending = batch
+        retries = settings.TRANSLATION_BATCH_RETRIES
+        for attempt in range(retries + 1):
+            try:
+                translated.update(translate_batch(pending))
+            except rate_limiter.RateLimitExceeded:
+                # Waiting out the quota is the caller's decision
+                raise
+            except ValueError as e:
+                if attempt == retries:
+                    raise
+                logger.warning(f"Invalid translation response, retrying batch: {str(e)}")
+                continue
+            
+            pending = [item for item in pending if key(item) not in translated]
+            if not pending:
+                break
+            if attempt < retries:
+                logger.warning(f"{len(pending)} items missing from translation, retrying them")
+        
+        if pending:
+            logger.warning(f"{len(pending)} items still untranslated, keeping their originals")
+        return translated
     
     def translate_text(
         self, 
@@ -224,6 +356,8 @@ class TranslationService:
         """
         Translate a single text from source language to target language.
         
+        A text found in the translation memory isn't sent to the LLM again.
+        
         Args:
             text: Text to translate
             source_language: ISO code of the source language (default: 'en')
@@ -236,6 +370,10 @@ class TranslationService:
             return ""
         
         try:
+            remembered = translation_memory.lookup([text], source_language, target_language, self.model)
+            if text in remembered:
+                return remembered[text]
+            
             # Create a prompt for the translation
             language_names = {
                 'en': 'English',
@@ -265,7 +403,9 @@ class TranslationService:
             """
             
             # Call the OpenAI API for translation
-            response = self.client.chat.completions.create(
+            response = rate_limiter.create_chat_completion(
+                self.client,
+                self.api_key,
                 model=self.model,
                 messages=[
                     {"role": "system", "content": "You are a professional translator."},
@@ -276,6 +416,7 @@ class TranslationService:
             
             # Extract the translated content
             translated_text = response.choices[0].message.content.strip()
+            translation_memory.store({text: translated_text}, source_language, target_language, self.model)
             return translated_text
             
         except Exception as e:
@@ -287,15 +428,22 @@ class TranslationService:
         self,
         script_object: Script,
         target_language: str,
-        request: Optional[HttpRequest] = None
+        request: Optional[HttpRequest] = None,
+        progress_callback: Optional[Callable[[int, int], None]] = None
     ) -> Dict[str, Any]:
         """
         Translate only the narrator parts of a script to the target language.
         
+        Narrations found in the translation memory are reused, so only new
+        or edited narrations are sent to the LLM, in batches that run
+        concurrently (see ``_run_batches``).
+        
         Args:
-            script_data: Dictionary containing the script data with scenes
+            script_object: The script whose scenes to translate
             target_language: ISO code of the target language
             request: Optional HTTP request object containing API key
+            progress_callback: Optional function called with the number of
+                finished and total batches as each batch finishes
             
         Returns:
             Dictionary with translated script data
@@ -305,76 +453,113 @@ class TranslationService:
             scenes = json.loads(script_object.content)
             if not scenes:
                 logger.warning("No scenes found in script data")
-                return script_object
+                return {"scenes": []}
             
             # Prepare narration texts for translation
-            narrations = []
-            for scene in scenes:
-                if "narrator" in scene:
-                    narrations.append(scene["narrator"])
-            
+            narrations = [scene["narrator"] for scene in scenes if scene.get("narrator")]
             if not narrations:
                 logger.warning("No narrations found to translate")
-                return script_data
+                return {"scenes": scenes}
             
-            # Create translation prompt
-            language_names = self.language_names
+            source_language = script_object.language
+            translations = translation_memory.lookup(
+                narrations, source_language, target_language, self.model
+            )
+            missing = list(dict.fromkeys(text for text in narrations if text not in translations))
             
-            target_lang_name = language_names.get(target_language, target_language)
+            if missing:
+                learned = self._run_batches(
+                    missing,
+                    self.NARRATION_BATCH_SIZE,
+                    lambda batch: self._translate_narrations(batch, target_language),
+                    lambda text: text,
+                    progress_callback
+                )
+                translation_memory.store(learned, source_language, target_language, self.model)
+                translations.update(learned)
             
-            prompt = f"""
+            # Create new script with translated narrations, in order
+            for scene in scenes:
+                if scene.get("narrator") in translations:
+                    scene["narrator"] = translations[scene["narrator"]]
+            
+            return {"scenes": scenes}
+            
+        except rate_limiter.RateLimitExceeded:
+            raise
+        except Exception as e:
+            import traceback
+            logger.error(f"Error translating script narration: {str(e)} {traceback.format_exc()}")
+            raise Exception(f"Error translating script narration: {str(e)} {traceback.format_exc()}")
+    
+    def _translate_narrations(self, narrations: List[str], target_language: str) -> Dict[str, str]:
+        """
+        Translate narration texts with one LLM call.
+        
+        The translations are matched to their source texts by position, so
+        a response without one per text is discarded for a retry.
+        
+        Args:
+            narrations: The texts to translate
+            target_language: ISO code of the target language
+            
+        Returns:
+            Translations by source text, for the texts the LLM returned
+            
+        Raises:
+            ValueError: If the response is not valid JSON
+        """
+        target_lang_name = self.language_names.get(target_language, target_language)
+        
+        prompt = f"""
             Translate the following narration texts to {target_lang_name}.
             Maintain the same tone, style, and meaning while adapting for cultural context if necessary.
             
             Here are the texts to translate:
             {json.dumps(narrations, indent=2)}
             
-            Return ONLY a JSON array containing the translated texts in the same order.
+            Return ONLY a JSON object with a "translations" array containing the translated texts in the same order.
             """
-            
-            print("--------------------------------", prompt)
-
-            # Call OpenAI API for translation
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "You are a professional translator. Return only the translated texts as a JSON array."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.3,
-                response_format={"type": "json_object"}
+        
+        # Call OpenAI API for translation
+        response = rate_limiter.create_chat_completion(
+            self.client,
+            self.api_key,
+            model=self.model,
+            messages=[
+                {"role": "system", "content": "You are a professional translator. Return only the translated texts as a JSON array."},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0.3,
+            response_format={"type": "json_object"}
+        )
+        
+        # Extract and parse translated content
+        translated_content = response.choices[0].message.content
+        if not translated_content:
+            logger.error("Empty response from OpenAI API")
+            raise ValueError("Empty response from OpenAI API")
+        
+        try:
+            translated_texts = json.loads(translated_content)
+        except json.JSONDecodeError as e:
+            logger.error(f"Failed to parse JSON response: {e}")
+            logger.error(f"Response content: {translated_content}")
+            raise ValueError(f"Invalid JSON response: {e}")
+        
+        if isinstance(translated_texts, dict) and "translations" in translated_texts:
+            translated_texts = translated_texts["translations"]
+        elif not isinstance(translated_texts, list):
+            translated_texts = list(translated_texts.values())
+        
+        if len(translated_texts) != len(narrations):
+            logger.warning(
+                f"Expected {len(narrations)} translations but got {len(translated_texts)}"
             )
-            print("--------------------------------", prompt)
-            print(response.choices[0].message.content)
-            # Extract and parse translated content
-            translated_content = response.choices[0].message.content
-            if not translated_content:
-                logger.error("Empty response from OpenAI API")
-                raise ValueError("Empty response from OpenAI API")
-            
-            try:
-                translated_texts = json.loads(translated_content)
-                if isinstance(translated_texts, dict) and "translations" in translated_texts:
-                    translated_texts = translated_texts["translations"]
-                elif not isinstance(translated_texts, list):
-                    translated_texts = list(translated_texts.values())
-                
-                # Create new script with translated narrations
-                new_script = { "scenes": json.loads(script_object.content)}
-                
-                for i, scene in enumerate(new_script["scenes"]):
-                    if i < len(translated_texts) and "narrator" in scene:
-                        scene["narrator"] = translated_texts[i]
-                
-                return new_script
-                
-            except json.JSONDecodeError as e:
-                logger.error(f"Failed to parse JSON response: {e}")
-                logger.error(f"Response content: {translated_content}")
-                raise ValueError(f"Invalid JSON response: {e}")
-            
-        except Exception as e:
-            import traceback
-            traceback.print_exc()
-            logger.error(f"Error translating script narration: {str(e)} {traceback.format_exc()}")
-            raise Exception(f"Error translating script narration: {str(e)} {traceback.format_exc()}") 
\ No newline at end of file
+            return {}
+        
+        return {
+            source: translated
+            for source, translated in zip(narrations, translated_texts)
+            if isinstance(translated, str) and translated
+        }
@@ -0,0 +1,45 @@
+import httpx
+import pytest
+from openai import OpenAI
+from openai import RateLimitError
+
+from backend.ai.services import client_registry
+
+
+@pytest.fixture
+def openai_client(monkeypatch):
+    """An OpenAI client with the registry's response hook, counting requests."""
+    requests = []
+    responses = {}
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(responses["status"], json={"error": {"message": "Error"}})
+
+    monkeypatch.setattr("openai._base_client.time.sleep", lambda seconds: None)
+    http_client = httpx.Client(
+        transport=httpx.MockTransport(handler),
+        event_hooks={"response": [client_registry._skip_rate_limit_retry]},
+    )
+    client = OpenAI(api_key="key", max_retries=2, http_client=http_client)
+    return client, responses, requests
+
+
+def test_openai_client_leaves_429s_to_the_rate_limiter(openai_client):
+    client, responses, requests = openai_client
+    responses["status"] = 429
+
+    with pytest.raises(RateLimitError):
+        client.chat.completions.create(model="gpt-4o", messages=[])
+
+    assert len(requests) == 1
+
+
+def test_openai_client_still_retries_server_errors(openai_client):
+    client, responses, requests = openai_client
+    responses["status"] = 500
+
+    with pytest.raises(Exception):
+        client.chat.completions.create(model="gpt-4o", messages=[])
+
+    assert len(requests) == 3
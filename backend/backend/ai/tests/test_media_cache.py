@@ -0,0 +1,123 @@
+import os
+
+import pytest
+
+from backend.ai.services import media_cache
+from backend.users.tests.factories import UserFactory
+from backend.workspaces.tests.factories import MediaFactory
+from backend.workspaces.tests.factories import WorkspaceFactory
+
+pytestmark = pytest.mark.django_db
+
+KEY = media_cache.voice_key("Hello there.", "voice", "model")
+
+
+def _path(media):
+    return os.path.join(media.file.storage.location, media.file.name)
+
+
+def test_voice_key_ignores_whitespace_and_unicode_form():
+    assert media_cache.voice_key("  Hello \n there. ", "voice", "model") == KEY
+    assert media_cache.voice_key("Café", "voice", "model") == media_cache.voice_key(
+        "Café", "voice", "model"
+    )
+
+
+def test_voice_key_depends_on_every_input():
+    assert media_cache.voice_key("Hello there!", "voice", "model") != KEY
+    assert media_cache.voice_key("Hello there.", "other-voice", "model") != KEY
+    assert media_cache.voice_key("Hello there.", "voice", "other-model") != KEY
+    assert media_cache.voice_key("Hello there.", "voice", "model", {"stability": 0.5}) != KEY
+
+
+def test_image_prompt_key_ignores_case_and_punctuation():
+    key = media_cache.image_prompt_key("A red fox, at dawn!", "1024x1024", "standard", "vivid", "dall-e-3")
+
+    assert key == media_cache.image_prompt_key(
+        "a red  fox at dawn", "1024x1024", "standard", "vivid", "dall-e-3"
+    )
+    assert key != media_cache.image_key("A red fox, at dawn!", "1024x1024", "standard", "vivid", "dall-e-3")
+
+
+def test_find_prefers_the_same_workspace(user):
+    workspace = WorkspaceFactory(owner=user)
+    own = MediaFactory(workspace=workspace, uploaded_by=user, cache_key=KEY)
+    # Newer, but in another of the user's workspaces
+    MediaFactory(workspace=WorkspaceFactory(owner=user), uploaded_by=user, cache_key=KEY)
+
+    assert media_cache.find(KEY, workspace, user) == own
+
+
+def test_find_reuses_the_users_other_workspaces(user):
+    other = MediaFactory(workspace=WorkspaceFactory(owner=user), uploaded_by=user, cache_key=KEY)
+
+    assert media_cache.find(KEY, WorkspaceFactory(owner=user), user) == other
+
+
+def test_find_never_reuses_another_users_media(user):
+    workspace = WorkspaceFactory(owner=user)
+    MediaFactory(cache_key=KEY)
+    # Even in a workspace the user works in
+    MediaFactory(workspace=workspace, uploaded_by=UserFactory(), cache_key=KEY)
+
+    assert media_cache.find(KEY, workspace, user) is None
+
+
+def test_find_matches_the_file_type(user):
+    workspace = WorkspaceFactory(owner=user)
+    MediaFactory(workspace=workspace, uploaded_by=user, cache_key=KEY)
+
+    assert media_cache.find(KEY, workspace, user, file_type="image") is None
+
+
+def test_find_skips_media_whose_file_is_missing(user):
+    workspace = WorkspaceFactory(owner=user)
+    older = MediaFactory(workspace=workspace, uploaded_by=user, cache_key=KEY)
+    newer = MediaFactory(workspace=workspace, uploaded_by=user, cache_key=KEY)
+    os.remove(_path(newer))
+
+    assert media_cache.find(KEY, workspace, user) == older
+
+
+def test_find_near_duplicates_by_prompt_key(user):
+    workspace = WorkspaceFactory(owner=user)
+    image = MediaFactory(
+        workspace=workspace, uploaded_by=user, file_type="image", metadata={"prompt_key": "prompt-key"}
+    )
+
+    assert media_cache.find("prompt-key", workspace, user, file_type="image") is None
+    assert media_cache.find("prompt-key", workspace, user, file_type="image", near_duplicate=True) == image
+
+
+def test_copy_to_writes_a_new_file_with_the_same_content(user):
+    source = MediaFactory(uploaded_by=user, cache_key=KEY)
+    workspace = WorkspaceFactory(owner=user)
+
+    media_file, relative_path = media_cache.copy_to(source, workspace)
+
+    assert media_file.path != _path(source)
+    assert relative_path.startswith(os.path.join("media", str(workspace.id)))
+    with open(media_file.path, "rb") as copied, open(_path(source), "rb") as original:
+        assert copied.read() == original.read()
+    assert media_file.size == source.file_size
+
+
+def test_deleting_a_clone_leaves_the_source_intact(user):
+    source = MediaFactory(uploaded_by=user, cache_key=KEY, duration=2.5, metadata={"voice_id": "voice"})
+    workspace = WorkspaceFactory(owner=user)
+
+    clone = media_cache.clone(source, workspace, "Narration", user, {"screen_id": "screen"})
+
+    assert clone.workspace == workspace
+    assert clone.cache_key == KEY
+    assert clone.duration == 2.5
+    assert clone.metadata["voice_id"] == "voice"
+    assert clone.metadata["screen_id"] == "screen"
+    assert clone.metadata["cached_from"] == str(source.id)
+
+    clone_path = _path(clone)
+    clone.delete()
+
+    assert not os.path.exists(clone_path)
+    with open(_path(source), "rb") as original:
+        assert original.read() == b"generated media"
@@ -0,0 +1,197 @@
+import types
+
+import pytest
+
+from backend.ai.services import rate_limiter
+from backend.ai.services.rate_limiter import RateLimitExceeded
+
+
+@pytest.fixture(autouse=True)
+def _limits(settings, redis):
+    settings.AI_RATE_LIMITS = {
+        "test": {"rpm": 2, "tpm": 100},
+        "requests_only": {"rpm": 60, "tpm": 0},
+        "openai_chat": {"rpm": 60, "tpm": 0},
+    }
+
+
+class RateLimited(Exception):
+    status_code = 429
+
+    def __init__(self, retry_after):
+        super().__init__("Rate limited")
+        self.headers = {"retry-after": str(retry_after)}
+
+
+class FakeChatClient:
+    """Answers chat completions with the given errors, then a response."""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+        self.chat = types.SimpleNamespace(completions=self)
+
+    def create(self, **kwargs):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return types.SimpleNamespace(usage=None)
+
+
+def test_acquire_takes_tokens_until_the_bucket_is_empty():
+    rate_limiter.acquire("test", "key", max_wait=0)
+    rate_limiter.acquire("test", "key", max_wait=0)
+
+    with pytest.raises(RateLimitExceeded) as exc_info:
+        rate_limiter.acquire("test", "key", max_wait=0)
+
+    # One request refills every 30 seconds at 2 rpm
+    assert 29 <= exc_info.value.retry_after <= 30
+    assert exc_info.value.provider == "test"
+
+
+def test_acquire_counts_usage_tokens():
+    rate_limiter.acquire("test", "key", tokens=80, max_wait=0)
+
+    with pytest.raises(RateLimitExceeded) as exc_info:
+        rate_limiter.acquire("test", "key", tokens=50, max_wait=0)
+
+    # 30 missing tokens refill in 18 seconds at 100 tpm
+    assert 17 <= exc_info.value.retry_after <= 18
+
+
+def test_acquire_caps_requests_larger_than_the_bucket():
+    rate_limiter.acquire("test", "key", tokens=1000, max_wait=0)
+
+
+def test_buckets_are_per_api_key():
+    rate_limiter.acquire("test", "key", max_wait=0)
+    rate_limiter.acquire("test", "key", max_wait=0)
+
+    rate_limiter.acquire("test", "other-key", max_wait=0)
+
+
+def test_bucket_key_doesnt_contain_the_api_key(redis):
+    rate_limiter.acquire("test", "secret-api-key", max_wait=0)
+
+    keys = redis.keys("ratelimit:*")
+    assert len(keys) == 1
+    assert "secret-api-key" not in keys[0]
+
+
+def test_record_usage_charges_beyond_the_bucket():
+    rate_limiter.acquire("test", "key", tokens=10, max_wait=0)
+    rate_limiter.record_usage("test", "key", 190)
+
+    with pytest.raises(RateLimitExceeded) as exc_info:
+        rate_limiter.acquire("test", "key", tokens=1, max_wait=0)
+
+    # The bucket is 100 tokens in debt
+    assert exc_info.value.retry_after >= 60
+
+
+def test_penalize_blocks_the_bucket():
+    rate_limiter.penalize("requests_only", "key", 45)
+
+    with pytest.raises(RateLimitExceeded) as exc_info:
+        rate_limiter.acquire("requests_only", "key", max_wait=0)
+
+    assert 44 <= exc_info.value.retry_after <= 45
+
+
+def test_penalize_only_blocks_its_own_key():
+    rate_limiter.penalize("requests_only", "key", 45)
+
+    rate_limiter.acquire("requests_only", "other-key", max_wait=0)
+
+
+def test_acquire_waits_for_a_short_refill(monkeypatch):
+    sleeps = []
+    waits = iter([0.5, 0.0])
+    monkeypatch.setattr(rate_limiter, "_take", lambda *args, **kwargs: next(waits))
+    monkeypatch.setattr(rate_limiter.time, "sleep", sleeps.append)
+
+    rate_limiter.acquire("test", "key", max_wait=5)
+
+    assert sleeps == [0.5]
+
+
+def test_acquire_allows_requests_when_redis_is_down(monkeypatch):
+    def unavailable(*args, **kwargs):
+        raise ConnectionError("Redis is down")
+
+    monkeypatch.setattr(rate_limiter, "_TAKE", unavailable)
+
+    rate_limiter.acquire("test", "key", max_wait=0)
+
+
+def test_rate_limit_exceeded_rounds_retry_after_up():
+    error = RateLimitExceeded("test", 2.1)
+
+    assert error.retry_after == 3
+    assert isinstance(error, ValueError)
+    assert error.args[1]["error"]["error_type"] == "rate_limit"
+    assert error.args[1]["error"]["retry_after"] == 3
+
+
+def test_rate_limit_exceeded_waits_at_least_a_second():
+    assert RateLimitExceeded("test", 0).retry_after == 1
+
+
+def test_get_retry_after_reads_the_response_headers():
+    class ProviderError(Exception):
+        status_code = 429
+        headers = {"retry-after-ms": "1500"}
+
+    error = ProviderError()
+
+    assert rate_limiter.is_rate_limit_error(error)
+    assert rate_limiter.get_retry_after(error) == 1.5
+    assert rate_limiter.get_retry_after(Exception("429")) == rate_limiter.DEFAULT_RETRY_AFTER
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Control the time the limiter sees, advancing it on every sleep."""
+    now = [1_000_000.0]
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        now[0] += seconds
+
+    monkeypatch.setattr(
+        rate_limiter,
+        "time",
+        types.SimpleNamespace(time=lambda: now[0], monotonic=lambda: now[0], sleep=sleep),
+    )
+    return sleeps
+
+
+def test_chat_completion_retries_a_429_once_the_limiter_allows(clock):
+    client = FakeChatClient(RateLimited(retry_after=2))
+
+    rate_limiter.create_chat_completion(client, "key", messages=[])
+
+    assert client.calls == 2
+    # The retry waited out the block the 429 put on the bucket
+    assert sum(clock) == pytest.approx(2)
+
+
+def test_chat_completion_gives_up_after_the_retry_budget(clock, settings):
+    client = FakeChatClient(*(RateLimited(retry_after=1) for _ in range(5)))
+
+    with pytest.raises(RateLimitExceeded):
+        rate_limiter.create_chat_completion(client, "key", messages=[])
+
+    assert client.calls == settings.AI_CLIENT_MAX_RETRIES + 1
+
+
+def test_chat_completion_defers_a_long_block_to_the_caller(clock):
+    client = FakeChatClient(RateLimited(retry_after=120))
+
+    with pytest.raises(RateLimitExceeded) as exc_info:
+        rate_limiter.create_chat_completion(client, "key", messages=[])
+
+    assert client.calls == 1
+    assert exc_info.value.retry_after >= 119
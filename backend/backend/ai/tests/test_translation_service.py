@@ -0,0 +1,217 @@
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from backend.ai.models import TranslationMemory
+from backend.ai.services import translation_service
+from backend.ai.services.translation_service import TranslationService
+from backend.workspaces.tests.factories import ScriptFactory
+
+pytestmark = pytest.mark.django_db
+
+
+class FakeLLM:
+    """Stands in for create_chat_completion, translating by prefixing the language.
+
+    ``fault`` is called with each batch and the number of times the batch's
+    first item was sent before, and may return a response to send instead.
+    """
+
+    def __init__(self):
+        self.batches = []
+        self.fault = None
+        self._lock = threading.Lock()
+        self._attempts = {}
+
+    def __call__(self, client, api_key, **kwargs):
+        prompt = kwargs["messages"][1]["content"]
+        if "Here are the texts to translate:" in prompt:
+            batch = json.loads(prompt.split("Here are the texts to translate:")[1].split("Return ONLY")[0])
+            content = {"translations": [f"FR {text}" for text in batch]}
+        else:
+            batch = json.loads(prompt.split("Here are the scenes to translate:")[1].split("Return ONLY")[0])
+            content = {"scenes": [self.translate(scene) for scene in batch]}
+
+        with self._lock:
+            self.batches.append(batch)
+            first = json.dumps(batch[0])
+            attempt = self._attempts.get(first, 0)
+            self._attempts[first] = attempt + 1
+        if self.fault:
+            content = self.fault(batch, attempt, content) or content
+        return self.response(content)
+
+    @staticmethod
+    def translate(scene):
+        return {
+            "scene_number": scene["scene_number"],
+            "narration": f"ES {scene['narration']}" if scene["narration"] else "",
+            "on_screen_text": f"ES {scene['on_screen_text']}" if scene["on_screen_text"] else "",
+        }
+
+    @staticmethod
+    def response(content):
+        message = SimpleNamespace(content=content if isinstance(content, str) else json.dumps(content))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+    @property
+    def sent(self):
+        return [scene["scene_number"] for batch in self.batches for scene in batch]
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    fake = FakeLLM()
+    monkeypatch.setattr(translation_service.rate_limiter, "create_chat_completion", fake)
+    return fake
+
+
+def _scenes(count):
+    return [{"narrator": f"Line {i}", "on_screen_text": "", "visual": f"Visual {i}"} for i in range(count)]
+
+
+def test_second_translation_only_sends_changed_scenes(llm):
+    service = TranslationService(api_key="test-key")
+    scenes = _scenes(4)
+    service.translate_scene_data(scenes, "en", "es")
+    assert llm.sent == [1, 2, 3, 4]
+
+    llm.batches.clear()
+    scenes[2]["narrator"] = "An edited line"
+    translated = service.translate_scene_data(scenes, "en", "es")
+
+    assert llm.sent == [3]
+    assert [scene["narrator"] for scene in translated] == [
+        "ES Line 0", "ES Line 1", "ES An edited line", "ES Line 3"
+    ]
+    assert translated[0]["visual"] == "Visual 0"
+
+
+def test_memory_hits_are_counted():
+    TranslationMemory.objects.create(
+        source_hash=translation_service.translation_memory.text_hash("Hello"),
+        source_language="en",
+        target_language="es",
+        model="gpt-4o",
+        source_text="Hello",
+        translated_text="Hola",
+    )
+    memory = TranslationMemory.objects.get()
+    last_used_at = memory.last_used_at
+
+    found = translation_service.translation_memory.lookup(["Hello", "Bye"], "en", "es", "gpt-4o")
+
+    assert found == {"Hello": "Hola"}
+    memory.refresh_from_db()
+    assert memory.hits == 1
+    assert memory.last_used_at > last_used_at
+
+
+def test_memory_is_per_language_pair_and_model(llm):
+    service = TranslationService(api_key="test-key")
+    service.translate_scene_data(_scenes(1), "en", "es")
+
+    assert translation_service.translation_memory.lookup(["Line 0"], "en", "fr", service.model) == {}
+    assert translation_service.translation_memory.lookup(["Line 0"], "en", "es", "other-model") == {}
+
+
+def test_batches_finishing_out_of_order_keep_the_scene_order(llm, settings):
+    settings.TRANSLATION_CONCURRENCY = 4
+
+    def reversed_and_slow_first(batch, attempt, content):
+        # Earlier batches finish last, and scenes come back reversed
+        time.sleep(0.05 if batch[0]["scene_number"] == 1 else 0)
+        return {"scenes": list(reversed(content["scenes"]))}
+
+    llm.fault = reversed_and_slow_first
+    progress = []
+
+    translated = TranslationService(api_key="test-key").translate_scene_data(
+        _scenes(12), "en", "es", progress_callback=lambda done, total: progress.append((done, total))
+    )
+
+    assert [scene["narrator"] for scene in translated] == [f"ES Line {i}" for i in range(12)]
+    assert [scene["visual"] for scene in translated] == [f"Visual {i}" for i in range(12)]
+    assert progress == [(1, 3), (2, 3), (3, 3)]
+
+
+def test_dropped_scenes_are_retried_alone(llm):
+    def drop_scene_three(batch, attempt, content):
+        if attempt == 0:
+            return {"scenes": [scene for scene in content["scenes"] if scene["scene_number"] != 3]}
+
+    llm.fault = drop_scene_three
+
+    translated = TranslationService(api_key="test-key").translate_scene_data(_scenes(5), "en", "es")
+
+    assert llm.batches[1] == [{"scene_number": 3, "narration": "Line 2", "on_screen_text": ""}]
+    assert [scene["narrator"] for scene in translated] == [f"ES Line {i}" for i in range(5)]
+
+
+def test_invalid_json_is_retried(llm):
+    llm.fault = lambda batch, attempt, content: "not json" if attempt == 0 else None
+
+    translated = TranslationService(api_key="test-key").translate_scene_data(_scenes(3), "en", "es")
+
+    assert len(llm.batches) == 2
+    assert [scene["narrator"] for scene in translated] == [f"ES Line {i}" for i in range(3)]
+
+
+def test_unrecoverable_scenes_keep_their_originals(llm, settings):
+    settings.TRANSLATION_BATCH_RETRIES = 2
+
+    def drop_scene_two(batch, attempt, content):
+        # Scene 2 comes back with an empty narration every time
+        return {"scenes": [
+            {**scene, "narration": ""} if scene["scene_number"] == 2 else scene
+            for scene in content["scenes"]
+        ]}
+
+    llm.fault = drop_scene_two
+
+    translated = TranslationService(api_key="test-key").translate_scene_data(_scenes(4), "en", "es")
+
+    assert [scene["narrator"] for scene in translated] == ["ES Line 0", "Line 1", "ES Line 2", "ES Line 3"]
+    # The first attempt and two retries of scene 2 alone
+    assert llm.sent == [1, 2, 3, 4, 2, 2]
+    assert not TranslationMemory.objects.filter(source_text="Line 1").exists()
+
+
+def test_invalid_json_on_every_attempt_fails_the_translation(llm):
+    llm.fault = lambda batch, attempt, content: "not json"
+
+    with pytest.raises(Exception, match="Invalid JSON response"):
+        TranslationService(api_key="test-key").translate_scene_data(_scenes(2), "en", "es")
+
+
+def test_narration_batches_keep_the_scene_order(llm, settings):
+    settings.TRANSLATION_CONCURRENCY = 4
+
+    def short_first_answer(batch, attempt, content):
+        # The first batch's first answer misses a text, so it can't be
+        # matched by position and the batch is retried
+        if batch[0] == "Line 0" and attempt == 0:
+            return {"translations": content["translations"][1:]}
+
+    llm.fault = short_first_answer
+    script = ScriptFactory(content=json.dumps(_scenes(25) + [{"visual": "No narration"}]))
+
+    translated = TranslationService(api_key="test-key").translate_script_narration(script, "fr")
+
+    assert [scene.get("narrator") for scene in translated["scenes"]] == (
+        [f"FR Line {i}" for i in range(25)] + [None]
+    )
+    assert len(llm.batches) == 4
+
+
+def test_narrations_that_never_match_keep_their_originals(llm):
+    llm.fault = lambda batch, attempt, content: {"translations": content["translations"][1:]}
+    script = ScriptFactory(content=json.dumps(_scenes(2)))
+
+    translated = TranslationService(api_key="test-key").translate_script_narration(script, "fr")
+
+    assert [scene["narrator"] for scene in translated["scenes"]] == ["Line 0", "Line 1"]
+    assert not TranslationMemory.objects.exists()
@@ -1,3 +1,4 @@
+import fakeredis
 import pytest
 
 from backend.users.models import User
@@ -12,3 +13,18 @@ def _media_storage(settings, tmpdir) -> None:
 @pytest.fixture
 def user(db) -> User:
     return UserFactory()
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    """Point the shared Redis client at an empty in-memory server."""
+    from backend.utils import redis_client
+
+    client = fakeredis.FakeRedis(server=_REDIS_SERVER, decode_responses=True)
+    client.flushall()
+    monkeypatch.setattr(redis_client, "_client", client)
+    return client
+
+
+# Lua scripts stay registered on the first client, so every test shares one server
+_REDIS_SERVER = fakeredis.FakeServer()
@@ -0,0 +1,25 @@
+from django.db.models.signals import pre_save
+from django.dispatch import receiver
+
+from backend.users.models import User
+
+API_KEY_FIELDS = ("openai_api_key", "elevenlabs_api_key")
+
+
+@receiver(pre_save, sender=User)
+def evict_rotated_api_key_clients(sender, instance, update_fields=None, **kwargs):
+    """Drop this process's provider clients for API keys a user replaces."""
+    if instance.pk is None:
+        return
+    if update_fields is not None and not set(update_fields) & set(API_KEY_FIELDS):
+        return
+
+    previous = User.objects.filter(pk=instance.pk).values(*API_KEY_FIELDS).first()
+    if previous is None:
+        return
+
+    from backend.ai.services import client_registry
+
+    for field in API_KEY_FIELDS:
+        if previous[field] and previous[field] != getattr(instance, field):
+            client_registry.evict(previous[field])
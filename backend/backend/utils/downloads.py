@@ -0,0 +1,94 @@
+"""
+Streaming writes of downloaded and generated files.
+
+Files are written to disk chunk by chunk as they are received, so memory
+stays flat whatever their size. The SHA-256 and size are computed while
+writing, and a file only appears at its final path once it is complete:
+chunks go to a temporary file in the same directory, which is renamed into
+place at the end.
+"""
+
+import hashlib
+import os
+import tempfile
+from typing import AsyncIterable, Iterable, NamedTuple
+
+# Bytes read from a response per chunk
+CHUNK_SIZE = 64 * 1024
+
+
+class StreamedFile(NamedTuple):
+    """A file written from a stream."""
+
+    path: str
+    size: int
+    sha256: str
+
+
+class _PartialFile:
+    """Temporary file that hashes what is written and is moved into place on success."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.size = 0
+        self.digest = hashlib.sha256()
+
+    def __enter__(self) -> "_PartialFile":
+        directory = os.path.dirname(self.path)
+        os.makedirs(directory, exist_ok=True)
+        self.file = tempfile.NamedTemporaryFile(
+            dir=directory, prefix=".", suffix=".part", delete=False
+        )
+        return self
+
+    def write(self, chunk: bytes) -> None:
+        self.file.write(chunk)
+        self.digest.update(chunk)
+        self.size += len(chunk)
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.file.close()
+        if exc_type is None:
+            os.replace(self.file.name, self.path)
+        elif os.path.exists(self.file.name):
+            os.remove(self.file.name)
+
+    @property
+    def result(self) -> StreamedFile:
+        return StreamedFile(self.path, self.size, self.digest.hexdigest())
+
+
+def write_stream(chunks: Iterable[bytes], path: str) -> StreamedFile:
+    """
+    Write a stream of bytes to a file.
+
+    Args:
+        chunks: The bytes to write, e.g. ``response.iter_content(CHUNK_SIZE)``
+        path: Final path of the file
+
+    Returns:
+        The written file with its size and SHA-256
+    """
+    with _PartialFile(path) as partial:
+        for chunk in chunks:
+            if chunk:
+                partial.write(chunk)
+    return partial.result
+
+
+async def awrite_stream(chunks: AsyncIterable[bytes], path: str) -> StreamedFile:
+    """
+    Write an async stream of bytes to a file.
+
+    Args:
+        chunks: The bytes to write, e.g. ``response.aiter_bytes(CHUNK_SIZE)``
+        path: Final path of the file
+
+    Returns:
+        The written file with its size and SHA-256
+    """
+    with _PartialFile(path) as partial:
+        async for chunk in chunks:
+            if chunk:
+                partial.write(chunk)
+    return partial.result
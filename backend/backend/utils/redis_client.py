@@ -0,0 +1,67 @@
+"""
+Shared Redis client for coordination state that lives outside the cache.
+
+Schedulers, rate limiters and locks need atomic Redis commands and Lua
+scripts, which the Django cache API doesn't expose. They all share one
+connection pool per process, created on first use from ``REDIS_URL``.
+"""
+
+import ssl
+import logging
+from typing import Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_client = None
+
+
+def get_redis():
+    """
+    Get the process-wide Redis client.
+
+    Returns:
+        A redis.Redis client with decoded string responses
+    """
+    global _client
+    if _client is None:
+        import redis
+
+        options = {"decode_responses": True, "health_check_interval": 30}
+        if settings.REDIS_URL.startswith("rediss://"):
+            options["ssl_cert_reqs"] = ssl.CERT_NONE
+        _client = redis.Redis.from_url(settings.REDIS_URL, **options)
+        logger.debug("Created Redis client")
+    return _client
+
+
+def register_script(source: str):
+    """
+    Register a Lua script on the shared client.
+
+    The returned callable runs the script with EVALSHA and loads it on
+    first use, so scripts can be registered at import time. Passing a
+    pipeline as ``client`` queues the call on it instead.
+
+    Args:
+        source: Lua source of the script
+
+    Returns:
+        A callable taking ``keys``, ``args`` and an optional ``client``
+    """
+    script: Optional[object] = None
+
+    def run(keys=(), args=(), client=None):
+        nonlocal script
+        if script is None:
+            script = get_redis().register_script(source)
+        return script(keys=list(keys), args=list(args), client=client)
+
+    return run
+
+
+def reset_client():
+    """Drop the shared client, e.g. after a worker process forks."""
+    global _client
+    _client = None
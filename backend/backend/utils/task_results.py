@@ -0,0 +1,36 @@
+"""
+Compact results for high-volume Celery tasks.
+
+Every stored result sits in the Redis result backend until it expires, and
+per-screen generation tasks run by the hundred for each batch. They return
+only a status code and the ID of what they worked on; messages and errors
+are recorded on the object itself (e.g. ``Screen.status_data``).
+"""
+
+from typing import Optional, TypedDict
+
+SUCCESS = "success"
+ERROR = "error"
+DUPLICATE = "duplicate"
+CANCELLED = "cancelled"
+
+
+class TaskResult(TypedDict):
+    """Result stored for a generation task."""
+
+    status: str
+    ref: Optional[str]
+
+
+def task_result(status: str, ref: Optional[str] = None) -> TaskResult:
+    """
+    Build a compact task result.
+
+    Args:
+        status: Status code, one of SUCCESS, ERROR, DUPLICATE or CANCELLED
+        ref: ID of the object the task worked on, or of the task it deferred to
+
+    Returns:
+        The task result
+    """
+    return {"status": status, "ref": ref}
@@ -0,0 +1,154 @@
+"""
+Warm-up of Celery worker processes.
+
+Without it, the first task on a fresh worker imports the render stack,
+loads fonts and builds effect kernels before it can start. ``preload`` does
+that work when the worker starts, before the prefork pool forks, so every
+child process (including ones added by autoscaling) inherits the loaded
+modules and caches. Database connections are made persistent for the
+worker, and ``init_process`` runs in each child after the fork to set up
+what can't be shared between processes.
+
+What is preloaded depends on the queues the worker consumes, read from
+``CELERY_WORKER_QUEUES`` as set by the worker start scripts, so the io pool
+doesn't carry the render stack and the render pools don't carry the
+provider SDKs. A worker started without it preloads everything.
+"""
+
+import importlib
+import logging
+import os
+import time
+from typing import Set
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Queues whose tasks render video, and whose tasks call AI providers
+RENDER_QUEUES = {"interactive", "bulk"}
+PROVIDER_QUEUES = {"io"}
+
+RENDER_MODULES = (
+    "numpy",
+    "cv2",
+    "PIL.Image",
+    "moviepy",
+    "backend.video.services.ffmpeg_service",
+    "backend.video.services.preview_service",
+    "backend.video.services.video_composer",
+    "backend.video.services.compilation_service",
+)
+PROVIDER_MODULES = (
+    "openai",
+    "elevenlabs.client",
+    "backend.ai.services.client_registry",
+    "backend.ai.services.async_generation",
+    "backend.ai.services.image_service",
+    "backend.ai.services.elevenlabs_service",
+    "backend.ai.services.openai_service",
+    "backend.ai.services.translation_service",
+)
+
+# Frame sizes the render pipeline outputs (landscape and portrait 1080p)
+FRAME_SIZES = ((1920, 1080), (1080, 1920))
+# Watermark rendered for channels without a logo, at its preview size
+DEFAULT_WATERMARK = ("CraftVid", 48)
+
+
+def get_worker_queues() -> Set[str]:
+    """Get the queues this worker consumes, empty if unknown."""
+    queues = os.environ.get("CELERY_WORKER_QUEUES", "")
+    return {queue.strip() for queue in queues.split(",") if queue.strip()}
+
+
+def _import_all(modules) -> None:
+    """Import modules, skipping optional ones that aren't installed."""
+    for module in modules:
+        try:
+            importlib.import_module(module)
+        except ImportError as e:
+            logger.warning(f"Could not preload {module}: {str(e)}")
+
+
+def _warm_render_caches() -> None:
+    """Build the effect kernels and font caches used by every render."""
+    from backend.video.services import font_registry
+    from backend.video.services.ffmpeg_service import vignette_mask
+
+    for width, height in FRAME_SIZES:
+        vignette_mask(width, height)
+
+    text, size = DEFAULT_WATERMARK
+    for font_key in font_registry.FONTS:
+        font_registry.render_text(text, font_key, size)
+
+
+def _warm_provider_clients() -> None:
+    """Create the shared clients of the default API keys."""
+    from backend.ai.services import client_registry
+
+    if settings.OPENAI_API_KEY:
+        client_registry.get_openai_client(settings.OPENAI_API_KEY)
+    if settings.ELEVENLABS_API_KEY:
+        client_registry.get_elevenlabs_client(settings.ELEVENLABS_API_KEY)
+    client_registry.get_http_session()
+
+
+def preload() -> None:
+    """
+    Load the modules and caches the worker's tasks need.
+
+    Runs once in the main worker process before the pool starts.
+    """
+    started = time.monotonic()
+    queues = get_worker_queues()
+
+    if not queues or queues & RENDER_QUEUES:
+        _import_all(RENDER_MODULES)
+        try:
+            _warm_render_caches()
+        except Exception as e:
+            logger.warning(f"Could not warm render caches: {str(e)}")
+
+    if not queues or queues & PROVIDER_QUEUES:
+        _import_all(PROVIDER_MODULES)
+        try:
+            _warm_provider_clients()
+        except Exception as e:
+            logger.warning(f"Could not create provider clients: {str(e)}")
+
+    logger.info(
+        f"Preloaded worker for queues {sorted(queues) or 'all'} in {time.monotonic() - started:.2f}s"
+    )
+
+
+def configure_connections() -> None:
+    """
+    Keep database connections open between tasks.
+
+    Runs in the main worker process, so forked children inherit it.
+    Connections are reused for ``WORKER_CONN_MAX_AGE`` seconds and
+    health-checked before each task; Celery's Django fixup closes the ones
+    that have aged out after each task.
+    """
+    from django.db import connections
+
+    for alias in connections:
+        connections.settings[alias]["CONN_MAX_AGE"] = settings.WORKER_CONN_MAX_AGE
+        connections.settings[alias]["CONN_HEALTH_CHECKS"] = True
+
+
+def init_process() -> None:
+    """
+    Set up per-process state in a freshly forked worker child.
+
+    Celery's Django fixup already closes the database connections
+    inherited from the parent; the shared Redis client and provider clients
+    are dropped here too, so the child opens its own pools on first use.
+    """
+    from backend.ai.services import client_registry
+    from backend.utils.redis_client import reset_client
+
+    reset_client()
+    client_registry.reset()
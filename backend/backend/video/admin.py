@@ -1,3 +1,19 @@
 from django.contrib import admin
+from .models import RenderJob, ScreenEvent
 
-# Register your models here.
+
+@admin.register(RenderJob)
+class RenderJobAdmin(admin.ModelAdmin):
+    """Admin interface for RenderJob model."""
+    list_display = ('script', 'status', 'current_stage', 'attempts', 'created_at')
+    list_filter = ('status', 'current_stage', 'created_at')
+    search_fields = ('script__title', 'task_id')
+    readonly_fields = ('created_at', 'updated_at', 'heartbeat_at')
+
+
+@admin.register(ScreenEvent)
+class ScreenEventAdmin(admin.ModelAdmin):
+    """Admin interface for ScreenEvent model."""
+    list_display = ('screen', 'event', 'created_at', 'published_at', 'processed_at')
+    list_filter = ('event', 'created_at')
+    readonly_fields = ('created_at', 'published_at', 'processed_at')
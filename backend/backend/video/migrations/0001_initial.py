@@ -0,0 +1,42 @@
+# Generated by Django 5.0.11 on 2026-10-18 22:23
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('workspaces', '0018_channel_font'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RenderJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed'), ('cancelled', 'Cancelled')], default='pending', max_length=20, verbose_name='Status')),
+                ('current_stage', models.CharField(blank=True, max_length=20, verbose_name='Current Stage')),
+                ('checkpoints', models.JSONField(blank=True, default=dict, help_text='Output path and hash of each completed stage', verbose_name='Checkpoints')),
+                ('task_id', models.CharField(blank=True, db_index=True, max_length=255, verbose_name='Task ID')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Attempts')),
+                ('heartbeat_at', models.DateTimeField(blank=True, null=True, verbose_name='Heartbeat')),
+                ('output_file', models.CharField(blank=True, max_length=500, verbose_name='Output File')),
+                ('error_message', models.TextField(blank=True, verbose_name='Error Message')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='render_jobs', to=settings.AUTH_USER_MODEL)),
+                ('script', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='render_jobs', to='workspaces.script')),
+            ],
+            options={
+                'verbose_name': 'Render Job',
+                'verbose_name_plural': 'Render Jobs',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
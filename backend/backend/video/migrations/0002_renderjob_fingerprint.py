@@ -0,0 +1,24 @@
+# Generated by Django 5.0.11 on 2026-10-18 22:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('video', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='renderjob',
+            name='duplicate_of',
+            field=models.ForeignKey(blank=True, help_text='Job this request was attached to instead of rendering', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='duplicates', to='video.renderjob'),
+        ),
+        migrations.AddField(
+            model_name='renderjob',
+            name='fingerprint',
+            field=models.CharField(blank=True, db_index=True, help_text='Hash over everything that determines the compiled output', max_length=64, verbose_name='Input Fingerprint'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.0.11 on 2026-10-18 23:01
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+def delete_pending_video_poller(apps, schema_editor):
+    """Remove the beat entry of the replaced check_pending_videos poller."""
+    PeriodicTask = apps.get_model("django_celery_beat", "PeriodicTask")
+    PeriodicTask.objects.filter(task="backend.video.tasks.check_pending_videos").delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('video', '0002_renderjob_fingerprint'),
+        ('workspaces', '0019_screen_screen_ready_idx'),
+        ('django_celery_beat', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScreenEvent',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('event', models.CharField(choices=[('ready', 'Ready')], max_length=20, verbose_name='Event')),
+                ('published_at', models.DateTimeField(blank=True, null=True, verbose_name='Published')),
+                ('processed_at', models.DateTimeField(blank=True, null=True, verbose_name='Processed')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('screen', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='workspaces.screen')),
+            ],
+            options={
+                'verbose_name': 'Screen Event',
+                'verbose_name_plural': 'Screen Events',
+                'ordering': ['created_at'],
+                'indexes': [models.Index(condition=models.Q(('processed_at__isnull', True)), fields=['created_at'], name='screenevent_pending_idx')],
+            },
+        ),
+        migrations.RunPython(delete_pending_video_poller, migrations.RunPython.noop),
+    ]
@@ -1,3 +1,223 @@
+import os
+import uuid
+import hashlib
+import logging
+from typing import Any, Dict, Optional
+
 from django.db import models
+from django.conf import settings
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+logger = logging.getLogger(__name__)
+
+
+def file_hash(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """Compute the SHA-256 hash of a file, reading it in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class RenderJob(models.Model):
+    """Model for tracking a script compile through checkpointed stages.
+
+    Each stage records the path and hash of its output in ``checkpoints``.
+    A redelivered compile task picks the job up again and skips every stage
+    whose checkpoint still exists on disk with a matching hash.
+    """
+
+    STATUS_CHOICES = (
+        ("pending", _("Pending")),
+        ("running", _("Running")),
+        ("completed", _("Completed")),
+        ("failed", _("Failed")),
+        ("cancelled", _("Cancelled")),
+    )
+
+    # Stages in the order they run
+    STAGES = ("probe", "segments", "audio_mix", "mux", "upload")
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    script = models.ForeignKey(
+        "workspaces.Script", on_delete=models.CASCADE, related_name="render_jobs"
+    )
+    status = models.CharField(
+        _("Status"), max_length=20, choices=STATUS_CHOICES, default="pending"
+    )
+    current_stage = models.CharField(_("Current Stage"), max_length=20, blank=True)
+    checkpoints = models.JSONField(
+        _("Checkpoints"),
+        default=dict,
+        blank=True,
+        help_text=_("Output path and hash of each completed stage"),
+    )
+    task_id = models.CharField(_("Task ID"), max_length=255, blank=True, db_index=True)
+    fingerprint = models.CharField(
+        _("Input Fingerprint"),
+        max_length=64,
+        blank=True,
+        db_index=True,
+        help_text=_("Hash over everything that determines the compiled output"),
+    )
+    duplicate_of = models.ForeignKey(
+        "self",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="duplicates",
+        help_text=_("Job this request was attached to instead of rendering"),
+    )
+    attempts = models.PositiveIntegerField(_("Attempts"), default=0)
+    heartbeat_at = models.DateTimeField(_("Heartbeat"), null=True, blank=True)
+    output_file = models.CharField(_("Output File"), max_length=500, blank=True)
+    error_message = models.TextField(_("Error Message"), blank=True)
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="render_jobs",
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        verbose_name = _("Render Job")
+        verbose_name_plural = _("Render Jobs")
+
+    def __str__(self):
+        return f"Render {self.script_id} ({self.status})"
+
+    @property
+    def work_dir(self) -> str:
+        """Directory holding the intermediate files of this job."""
+        return os.path.join(settings.MEDIA_ROOT, "temp", "render_jobs", str(self.id))
+
+    def get_checkpoint(self, stage: str, key: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Get the checkpoint of a stage, or of one item within a stage."""
+        checkpoint = self.checkpoints.get(stage)
+        if checkpoint and key is not None:
+            checkpoint = checkpoint.get("items", {}).get(key)
+        return checkpoint
+
+    def is_stage_complete(self, stage: str, key: Optional[str] = None) -> bool:
+        """Check that a stage finished and its output is still intact.
+
+        Args:
+            stage: Stage name
+            key: Optional item key for stages with several outputs
+
+        Returns:
+            bool: True if the checkpoint exists and its file hash matches
+        """
+        checkpoint = self.get_checkpoint(stage, key)
+        if not checkpoint or not checkpoint.get("completed"):
+            return False
+
+        # A stage with several outputs is only complete if all of them are
+        if key is None and "items" in checkpoint:
+            return all(self.is_stage_complete(stage, item_key) for item_key in checkpoint["items"])
+
+        path = checkpoint.get("path")
+        if not path:
+            return True
+        if not os.path.exists(path):
+            logger.warning(f"Checkpoint output missing for {stage} of render job {self.id}")
+            return False
+        if file_hash(path) != checkpoint.get("hash"):
+            logger.warning(f"Checkpoint hash mismatch for {stage} of render job {self.id}")
+            return False
+        return True
+
+    def checkpoint(self, stage: str, path: Optional[str] = None, key: Optional[str] = None, **data):
+        """Record a completed stage, or one completed item within a stage.
+
+        Args:
+            stage: Stage name
+            path: Optional path of the stage output; its hash is recorded
+            key: Optional item key for stages with several outputs
+            **data: Extra data to keep with the checkpoint
+        """
+        entry = {
+            "completed": True,
+            "path": path,
+            "hash": file_hash(path) if path else None,
+            "completed_at": timezone.now().isoformat(),
+            **data,
+        }
+        if key is not None:
+            stage_data = self.checkpoints.setdefault(stage, {"items": {}})
+            stage_data.setdefault("items", {})[key] = entry
+        else:
+            self.checkpoints[stage] = entry
+
+        self.heartbeat_at = timezone.now()
+        self.save(update_fields=["checkpoints", "heartbeat_at", "updated_at"])
+
+    def start_stage(self, stage: str):
+        """Mark a stage as the one currently running."""
+        self.current_stage = stage
+        self.heartbeat_at = timezone.now()
+        self.save(update_fields=["current_stage", "heartbeat_at", "updated_at"])
+
+    def invalidate_from(self, stage: str):
+        """Drop the checkpoints of a stage and every stage after it."""
+        for later_stage in self.STAGES[self.STAGES.index(stage):]:
+            self.checkpoints.pop(later_stage, None)
+        self.save(update_fields=["checkpoints", "updated_at"])
+
+    def is_alive(self, stale_after: int) -> bool:
+        """Check whether another worker is actively running this job."""
+        if self.status != "running" or not self.heartbeat_at:
+            return False
+        return (timezone.now() - self.heartbeat_at).total_seconds() < stale_after
+
+    @property
+    def resolved_status(self) -> str:
+        """Status of this job, or of the job it is attached to while that one renders."""
+        if self.duplicate_of_id and self.status == "pending":
+            return self.duplicate_of.status
+        return self.status
+
+
+class ScreenEvent(models.Model):
+    """Outbox of screen state transitions that start background work.
+
+    An event is written in the same transaction as the transition, then
+    published to the screen event stream once the transaction commits.
+    Events that are still unprocessed after a while are republished by the
+    reconciler.
+    """
+
+    EVENT_CHOICES = (
+        ("ready", _("Ready")),
+    )
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    screen = models.ForeignKey(
+        "workspaces.Screen", on_delete=models.CASCADE, related_name="events"
+    )
+    event = models.CharField(_("Event"), max_length=20, choices=EVENT_CHOICES)
+    published_at = models.DateTimeField(_("Published"), null=True, blank=True)
+    processed_at = models.DateTimeField(_("Processed"), null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["created_at"]
+        verbose_name = _("Screen Event")
+        verbose_name_plural = _("Screen Events")
+        indexes = [
+            # Only unprocessed events are looked up by the reconciler
+            models.Index(
+                fields=["created_at"],
+                name="screenevent_pending_idx",
+                condition=models.Q(processed_at__isnull=True),
+            ),
+        ]
 
-# Create your models here.
+    def __str__(self):
+        return f"{self.event} {self.screen_id}"
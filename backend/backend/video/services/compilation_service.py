@@ -1,87 +1,474 @@
 """
-Service for compiling videos from screen previews.
+Service for compiling videos from screens.
+
+A compile runs as a RenderJob through checkpointed stages:
+
+1. probe: resolve each screen's inputs and duration
+2. segments: render one video segment per screen
+3. audio_mix: mix the narration track with the background music
+4. mux: concatenate the segments and add the mixed audio, without re-encoding
+5. upload: save the final video and its caption sidecars to storage
+
+Every stage records its output path and hash on the job. If the job is run
+again after a crash, intact stages are skipped and work resumes from the
+first missing one.
+
+Compiles are deduplicated by a fingerprint over their inputs: a request
+matching the latest finished output reuses it, and one matching a job that
+is still rendering attaches to that job.
 """
 import os
+import json
+import shutil
+import hashlib
 import logging
 import tempfile
-from typing import List, Optional
-import uuid
+import subprocess
+from typing import Any, Dict, List, Optional
 from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
 
 from django.core.files import File
+from django.core.files.storage import default_storage
 
+from backend.video.models import RenderJob, file_hash
+from backend.video.services import font_registry, render_planner, subtitle_service
 from backend.video.services.video_composer import VideoComposer
 
 logger = logging.getLogger(__name__)
-from backend.workspaces.models import Script
 
-def compile_video(screens, output_filename: Optional[str] = None, script: Optional[Script] = None) -> File:
+# Storytelling effects rotated between screens
+SEGMENT_EFFECTS = ['ken_burns', 'pulse', 'fade']
+# Duration of screens without narration audio
+SILENT_SCREEN_DURATION = 5
+BACKGROUND_VOLUME = 0.1
+# Bump when the compile pipeline changes its output for the same inputs
+COMPILE_VERSION = 1
+# How long computed file hashes are cached
+FILE_HASH_TTL = 60 * 60 * 24
+
+
+def run_render_job(render_job: RenderJob) -> str:
     """
-    Compile multiple preview videos into a single video.
-    
+    Run (or resume) a render job for a script.
+
     Args:
-        preview_files: List of paths to preview video files
-        output_filename: Optional name for the output file
-        
+        render_job: The render job to run
+
     Returns:
-        A File object containing the compiled video
+        The storage name of the compiled video
     """
+    os.makedirs(render_job.work_dir, exist_ok=True)
 
-    
+    render_job.status = 'running'
+    render_job.attempts += 1
+    render_job.error_message = ''
+    render_job.save(update_fields=['status', 'attempts', 'error_message', 'updated_at'])
 
-    
-    # Create a default filename if none provided
-    if not output_filename:
-        output_filename = f"compiled_video_{uuid.uuid4()}.mp4"
-    elif not output_filename.endswith('.mp4'):
-        output_filename = f"{output_filename}.mp4"
-    
-    # Create a permanent location for the compiled video
-    persistent_temp_dir = os.path.join(settings.MEDIA_ROOT, 'scripts' , str(script.workspace.id), str(script.id))
-    os.makedirs(persistent_temp_dir, exist_ok=True)
-    
-    persistent_output_path = os.path.join(persistent_temp_dir, output_filename)
-        
-    video_composer = VideoComposer(format="shorts")
-    # screens is a list of screen objects
-    image_paths = [img.image.file.path for img in screens]
-    audio_paths = [img.voice.file.path if (img.voice and img.voice.file) else os.path.join(settings.MEDIA_ROOT, '1-second-of-silence.mp3') for img in screens]
-    # Add images and their corresponding audio segments
-    for idx, (image_path, audio_path) in enumerate(zip(image_paths, audio_paths)):
-        if audio_path and os.path.exists(audio_path):
-            # Rotate between different storytelling effects
-            effects = ['ken_burns', 'pulse', 'fade']
-            # effects = ['ken_burns']
-            effect = effects[idx % len(effects)]
-            audio_duration = video_composer.get_audio_duration(audio_path)
-            
-            # Add image with audio and effect
-            video_composer.add_image_with_audio(
-                image_path, 
-                audio_path, 
-                duration=audio_duration,
-                effect=effect
-            )
+    try:
+        manifest = _run_probe(render_job)
+        segment_paths = _run_segments(render_job, manifest)
+        mix_path = _run_audio_mix(render_job, manifest)
+        final_path = _run_mux(render_job, segment_paths, mix_path)
+        output_name = _run_upload(render_job, manifest, final_path)
+    except Exception as e:
+        render_job.status = 'failed'
+        render_job.error_message = str(e)
+        render_job.save(update_fields=['status', 'error_message', 'updated_at'])
+        _resolve_duplicates(render_job)
+        raise
+
+    render_job.status = 'completed'
+    render_job.output_file = output_name
+    render_job.save(update_fields=['status', 'output_file', 'updated_at'])
+    _resolve_duplicates(render_job)
+
+    # Intermediate files are no longer needed once the output is stored
+    shutil.rmtree(render_job.work_dir, ignore_errors=True)
+    logger.info(f"Render job {render_job.id} completed: {output_name}")
+    return output_name
+
+
+def _resolve_duplicates(render_job: RenderJob) -> None:
+    """Give the requests attached to a finished job its outcome."""
+    render_job.duplicates.filter(status='pending').update(
+        status=render_job.status,
+        output_file=render_job.output_file,
+        error_message=render_job.error_message,
+        updated_at=timezone.now(),
+    )
+
+
+def compute_fingerprint(script) -> Optional[str]:
+    """
+    Compute a fingerprint over everything that determines a compiled video.
+
+    The fingerprint covers the screen order, image and narration hashes,
+    captions, effects, background music, watermark, font, format and encode
+    preset. Two compiles with the same fingerprint produce the same video.
+
+    Args:
+        script: The script to fingerprint
+
+    Returns:
+        A hex digest, or None if the script isn't ready to compile
+    """
+    try:
+        inputs = _resolve_inputs(script)
+    except ValueError:
+        return None
+
+    payload = {
+        'version': COMPILE_VERSION,
+        'format': 'shorts',
+        'preset': render_planner.RENDER_PRESETS['final'],
+        'background_volume': BACKGROUND_VOLUME,
+        'font': inputs['font'],
+        'background': _cached_file_hash(inputs['background_path']),
+        'watermark': _cached_file_hash(inputs['logo_path']),
+        'screens': [
+            {
+                'image': _cached_file_hash(entry['image_path']),
+                'audio': _cached_file_hash(entry['audio_path']),
+                'effect': entry['effect'],
+                'on_screen_text': entry['scene_data'].get('on_screen_text'),
+                'text_params': entry['scene_data'].get('text_params'),
+                'word_timings': entry['scene_data'].get('word_timings'),
+            }
+            for entry in inputs['screens']
+        ],
+    }
+    encoded = json.dumps(payload, sort_keys=True, default=str).encode()
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def find_matching_job(script, fingerprint: str, exclude: Optional[RenderJob] = None) -> Optional[RenderJob]:
+    """
+    Find a render job whose output can be reused for a fingerprint.
+
+    Every compile of a script writes to the same output file, so only the
+    latest completed job can be reused. Otherwise an in-flight job with the
+    same fingerprint is returned so the request can attach to it.
+
+    Args:
+        script: The script being compiled
+        fingerprint: Fingerprint of the requested compile
+        exclude: Optional job to leave out (the caller's own job)
+
+    Returns:
+        The matching RenderJob, or None
+    """
+    if not fingerprint:
+        return None
+
+    jobs = RenderJob.objects.filter(script=script, duplicate_of__isnull=True)
+    if exclude is not None:
+        jobs = jobs.exclude(id=exclude.id)
+
+    latest = jobs.filter(status='completed').order_by('-updated_at').first()
+    if (
+        latest
+        and latest.fingerprint == fingerprint
+        and latest.output_file
+        and default_storage.exists(latest.output_file)
+    ):
+        return latest
+
+    stale_after = settings.RENDER_JOB_STALE_SECONDS
+    for job in jobs.filter(fingerprint=fingerprint, status__in=['pending', 'running']).order_by('-created_at'):
+        if job.is_alive(stale_after) or (
+            job.status == 'pending'
+            and (timezone.now() - job.created_at).total_seconds() < stale_after
+        ):
+            return job
+    return None
+
+
+def _resolve_inputs(script) -> Dict[str, Any]:
+    """Resolve the input files of every screen of a script."""
+    from backend.workspaces.models import Screen
+
+    screens = Screen.objects.filter(script=script).order_by('scene').select_related('image', 'voice')
+    if not screens.exists():
+        raise ValueError(f"No screens found for script {script.id}")
+
+    silence_path = os.path.join(settings.MEDIA_ROOT, '1-second-of-silence.mp3')
+    entries = []
+    for idx, screen in enumerate(screens):
+        if not screen.image or not screen.image.file:
+            raise ValueError(f"Screen {screen.id} has no image")
+
+        audio_path = screen.voice.file.path if (screen.voice and screen.voice.file) else silence_path
+        if not os.path.exists(audio_path):
+            audio_path = None
+
+        entries.append({
+            'screen_id': str(screen.id),
+            'scene_data': screen.scene_data or {},
+            'image_path': screen.image.file.path,
+            'audio_path': audio_path,
+            'effect': SEGMENT_EFFECTS[idx % len(SEGMENT_EFFECTS)] if audio_path else 'ken_burns',
+        })
+
+    return {
+        'screens': entries,
+        'font': font_registry.resolve_font(script.channel),
+        'background_path': os.path.join(settings.MEDIA_ROOT, 'background.mp3'),
+        'logo_path': os.path.join(settings.MEDIA_ROOT, 'Logo.png'),
+    }
+
+
+def _cached_file_hash(path: Optional[str]) -> Optional[str]:
+    """Hash a file, caching the result by path, size and modification time."""
+    if not path or not os.path.exists(path):
+        return None
+
+    stat = os.stat(path)
+    key = f"file_hash:{hashlib.md5(path.encode()).hexdigest()}:{stat.st_size}:{stat.st_mtime_ns}"
+    digest = cache.get(key)
+    if digest is None:
+        digest = file_hash(path)
+        cache.set(key, digest, FILE_HASH_TTL)
+    return digest
+
+
+def _run_stage(render_job: RenderJob, stage: str) -> bool:
+    """
+    Check whether a stage has to run, dropping stale later checkpoints.
+
+    Returns:
+        True if the stage must run, False if its checkpoint is intact
+    """
+    if render_job.is_stage_complete(stage):
+        logger.info(f"Render job {render_job.id}: skipping completed stage {stage}")
+        return False
+
+    render_job.invalidate_from(stage)
+    render_job.start_stage(stage)
+    return True
+
+
+def _run_probe(render_job: RenderJob) -> Dict[str, Any]:
+    """Resolve the inputs, durations and captions of every screen."""
+    manifest_path = os.path.join(render_job.work_dir, 'probe.json')
+    if not _run_stage(render_job, 'probe'):
+        with open(manifest_path) as f:
+            return json.load(f)
+
+    script = render_job.script
+    inputs = _resolve_inputs(script)
+
+    entries = []
+    cues = []
+    offset = 0.0
+    for entry in inputs['screens']:
+        audio_path = entry['audio_path']
+        if audio_path:
+            duration = render_planner.probe_duration(audio_path) or VideoComposer().get_audio_duration(audio_path)
         else:
-            # Add image with effect only
-            video_composer.add_image_with_effect(
-                image_path,
-                duration=5,
-                effect='ken_burns'  # Ken Burns effect is great for storytelling
-            )
-    background_audio_path = os.path.join(settings.MEDIA_ROOT, 'background.mp3')
-    logo_path = os.path.join(settings.MEDIA_ROOT, 'Logo.png')
-    video_composer.add_background_audio(audio_path=background_audio_path, loop=True, volume=0.1)
-    # Add watermark before composing the video
+            duration = SILENT_SCREEN_DURATION
+
+        screen_cues = subtitle_service.build_screen_cues(entry['scene_data'], duration)
+        entries.append({
+            'screen_id': entry['screen_id'],
+            'image_path': entry['image_path'],
+            'audio_path': audio_path,
+            'duration': duration,
+            'effect': entry['effect'],
+            'cues': screen_cues,
+        })
+        cues.extend(
+            {**cue, 'start': cue['start'] + offset, 'end': cue['end'] + offset}
+            for cue in screen_cues
+        )
+        offset += duration
+
+    manifest = {
+        'screens': entries,
+        'cues': cues,
+        'duration': offset,
+        'font': inputs['font'],
+        'background_path': inputs['background_path'],
+        'logo_path': inputs['logo_path'],
+        'output_filename': f"script_{script.id}_final.mp4",
+    }
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f)
+
+    render_job.checkpoint('probe', path=manifest_path)
+    return manifest
+
+
+def _run_segments(render_job: RenderJob, manifest: Dict[str, Any]) -> List[str]:
+    """Render one video segment per screen, skipping intact segments."""
+    if render_job.is_stage_complete('segments'):
+        return [
+            render_job.get_checkpoint('segments', entry['screen_id'])['path']
+            for entry in manifest['screens']
+        ]
+
+    render_job.invalidate_from('audio_mix')
+    render_job.start_stage('segments')
+
+    segment_paths = []
+    for idx, entry in enumerate(manifest['screens']):
+        screen_id = entry['screen_id']
+        if render_job.is_stage_complete('segments', screen_id):
+            segment_paths.append(render_job.get_checkpoint('segments', screen_id)['path'])
+            continue
+
+        segment_path = os.path.join(render_job.work_dir, f"segment_{idx:03d}.mp4")
+        _render_segment(render_job, entry, segment_path, manifest)
+        render_job.checkpoint('segments', path=segment_path, key=screen_id)
+        segment_paths.append(segment_path)
+
+    render_job.checkpoints['segments']['completed'] = True
+    render_job.save(update_fields=['checkpoints', 'updated_at'])
+    return segment_paths
+
+
+def _render_segment(render_job: RenderJob, entry: Dict[str, Any], segment_path: str, manifest: Dict[str, Any]):
+    """Render a single screen with its effect, watermark and captions."""
+    video_composer = VideoComposer(format="shorts")
+    if entry['audio_path']:
+        video_composer.add_image_with_audio(
+            entry['image_path'],
+            entry['audio_path'],
+            duration=entry['duration'],
+            effect=entry['effect']
+        )
+    else:
+        video_composer.add_image_with_effect(
+            entry['image_path'],
+            duration=entry['duration'],
+            effect=entry['effect']
+        )
+
     video_composer.add_watermark(
-        image_path=logo_path,
-        position='bottom-right',  # or 'top-left', 'center', etc.
-        opacity=0.7,             # 70% opacity
-        size_ratio=0.10          # 15% of video width
+        image_path=manifest['logo_path'],
+        position='bottom-right',
+        opacity=0.7,
+        size_ratio=0.10
     )
-    video_composer.compose_video(persistent_output_path)
-    return f'{persistent_temp_dir}/{output_filename}'
 
+    if entry['cues']:
+        subtitle_path = os.path.splitext(segment_path)[0] + '.ass'
+        subtitle_service.write_ass(entry['cues'], subtitle_path, width=1080, height=1920, font=manifest['font'])
+        video_composer.add_subtitles(subtitle_path)
+
+    video_composer.compose_video(segment_path)
+
+
+def _run_audio_mix(render_job: RenderJob, manifest: Dict[str, Any]) -> str:
+    """Build the narration track and mix the background music under it."""
+    mix_path = os.path.join(render_job.work_dir, 'audio_mix.m4a')
+    if not _run_stage(render_job, 'audio_mix'):
+        return mix_path
+
+    cmd = ['ffmpeg', '-y', '-v', 'error']
+    filters = []
+    for idx, entry in enumerate(manifest['screens']):
+        if entry['audio_path']:
+            cmd += ['-i', entry['audio_path']]
+        else:
+            cmd += ['-f', 'lavfi', '-i', 'anullsrc=r=44100:cl=stereo']
+        # Pad or trim every narration to the exact length of its segment
+        filters.append(
+            f"[{idx}:a]aresample=44100,aformat=channel_layouts=stereo,"
+            f"apad,atrim=0:{entry['duration']:.3f}[a{idx}]"
+        )
+
+    count = len(manifest['screens'])
+    filters.append(''.join(f"[a{idx}]" for idx in range(count)) + f"concat=n={count}:v=0:a=1[narration]")
+
+    output_label = '[narration]'
+    if os.path.exists(manifest['background_path']):
+        cmd += ['-stream_loop', '-1', '-i', manifest['background_path']]
+        filters.append(
+            f"[{count}:a]aresample=44100,aformat=channel_layouts=stereo,"
+            f"volume={BACKGROUND_VOLUME},atrim=0:{manifest['duration']:.3f}[background]"
+        )
+        filters.append('[narration][background]amix=inputs=2:duration=first:normalize=0[mix]')
+        output_label = '[mix]'
+
+    cmd += [
+        '-filter_complex', ';'.join(filters),
+        '-map', output_label,
+        '-c:a', 'aac', '-b:a', '192k',
+        mix_path,
+    ]
+    _run_ffmpeg(cmd, 'mix audio')
+
+    render_job.checkpoint('audio_mix', path=mix_path)
+    return mix_path
+
+
+def _run_mux(render_job: RenderJob, segment_paths: List[str], mix_path: str) -> str:
+    """Concatenate the segments and add the mixed audio without re-encoding."""
+    final_path = os.path.join(render_job.work_dir, 'final.mp4')
+    if not _run_stage(render_job, 'mux'):
+        return final_path
+
+    list_path = os.path.join(render_job.work_dir, 'segments.txt')
+    with open(list_path, 'w') as f:
+        for segment_path in segment_paths:
+            f.write(f"file '{segment_path}'\n")
+
+    _run_ffmpeg([
+        'ffmpeg', '-y', '-v', 'error',
+        '-f', 'concat', '-safe', '0', '-i', list_path,
+        '-i', mix_path,
+        '-map', '0:v:0', '-map', '1:a:0',
+        '-c', 'copy',
+        '-shortest',
+        '-movflags', '+faststart',
+        final_path,
+    ], 'mux video')
+
+    render_job.checkpoint('mux', path=final_path)
+    return final_path
+
+
+def _run_upload(render_job: RenderJob, manifest: Dict[str, Any], final_path: str) -> str:
+    """Save the final video and its caption sidecars to storage."""
+    if not _run_stage(render_job, 'upload'):
+        return render_job.get_checkpoint('upload')['name']
+
+    script = render_job.script
+    storage_dir = os.path.join('scripts', str(script.workspace.id), str(script.id))
+    output_name = _save_to_storage(final_path, os.path.join(storage_dir, manifest['output_filename']))
+
+    if manifest['cues']:
+        sidecars = subtitle_service.write_sidecars(manifest['cues'], final_path)
+        for sidecar_path in sidecars.values():
+            _save_to_storage(
+                sidecar_path,
+                os.path.splitext(output_name)[0] + os.path.splitext(sidecar_path)[1]
+            )
+
+    script.output_file = output_name
+    script.save(update_fields=['output_file', 'updated_at'])
+
+    render_job.checkpoint('upload', name=output_name)
+    return output_name
+
+
+def _save_to_storage(path: str, name: str) -> str:
+    """Save a local file to storage, replacing any existing file with that name."""
+    if default_storage.exists(name):
+        default_storage.delete(name)
+    with open(path, 'rb') as f:
+        return default_storage.save(name, File(f))
+
+
+def _run_ffmpeg(cmd: List[str], action: str):
+    """Run an FFmpeg command, raising a RuntimeError with its output on failure."""
+    try:
+        subprocess.run(cmd, check=True, capture_output=True, text=True)
+    except subprocess.CalledProcessError as e:
+        logger.error(f"FFmpeg error: {e.stderr}")
+        raise RuntimeError(f"Failed to {action}: {e.stderr}")
 
 
 def add_intro_outro(
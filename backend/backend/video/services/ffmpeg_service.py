@@ -7,6 +7,7 @@ import subprocess
 import math
 import json
 import numpy as np
+from functools import lru_cache
 from typing import Dict, List, Any
 
 from django.conf import settings
@@ -24,12 +25,41 @@ from moviepy.video.fx import (
 )
 from moviepy.audio.fx import MultiplyVolume
 
+from backend.video.services import subtitle_service
+
 # from moviepy.video.fx.fadein import fadein
 # from moviepy.video.fx.fadeout import fadeout
 
 logger = logging.getLogger(__name__)
 
 
+@lru_cache(maxsize=8)
+def vignette_mask(width: int, height: int, intensity: float = 0.5) -> np.ndarray:
+    """
+    Build the vignette mask for a frame size.
+
+    Masks are cached per process, so each output size is computed once
+    rather than for every frame. The returned array is shared and read-only.
+
+    Args:
+        width: Frame width in pixels
+        height: Frame height in pixels
+        intensity: Falloff exponent of the vignette
+
+    Returns:
+        A (height, width, 3) array of per-pixel factors
+    """
+    x = np.linspace(-1, 1, width)
+    y = np.linspace(-1, 1, height)
+    X, Y = np.meshgrid(x, y)
+    mask = np.sqrt(X**2 + Y**2)
+    mask = (1 - mask) ** intensity
+    mask = np.clip(mask, 0, 1)
+    mask = np.dstack((mask, mask, mask))
+    mask.flags.writeable = False
+    return mask
+
+
 class FFmpegService:
     """Service for video processing and compilation using FFmpeg and MoviePy."""
     
@@ -129,6 +159,7 @@ class FFmpegService:
             quality_settings = self.QUALITY_PRESETS.get(quality, self.QUALITY_PRESETS['medium'])
             
             # Create video clip from image - direct approach from video_composer.py
+            subtitle_path = None
             try:
                 # Set default duration
                 duration = 5.0  # Default duration
@@ -176,7 +207,8 @@ class FFmpegService:
                     # Apply the effect
                     clip = self._apply_effect(clip, effect, **effect_params)
                 
-                # Add on-screen text if available
+                # Burn on-screen text in during the encode via an ASS subtitle track
+                ffmpeg_params = None
                 on_screen_text = scene_data.get('on_screen_text')
                 if on_screen_text and on_screen_text.strip():
                     # Parse text parameters if provided
@@ -190,8 +222,11 @@ class FFmpegService:
                         except (json.JSONDecodeError, TypeError):
                             logger.warning(f"Invalid text parameters: {scene_data['text_params']}")
                     
-                    # Apply the text overlay
-                    clip = self._apply_text_overlay(clip, on_screen_text, **text_params)
+                    cues = subtitle_service.build_screen_cues(scene_data, clip.duration)
+                    width, height = clip.size
+                    subtitle_path = os.path.join(settings.MEDIA_ROOT, 'temp', f"preview_{scene_id}.ass")
+                    subtitle_service.write_ass(cues, subtitle_path, width=width, height=height, **text_params)
+                    ffmpeg_params = ['-vf', subtitle_service.ass_filter(subtitle_path)]
                 
                 # Write video file with parameters like in video_composer.py
                 clip.write_videofile(
@@ -203,7 +238,8 @@ class FFmpegService:
                     preset='medium',
                     bitrate='2000k',  # Lower bitrate for previews
                     temp_audiofile=os.path.join(settings.MEDIA_ROOT, 'temp', 'temp_audio.m4a'),
-                    remove_temp=True
+                    remove_temp=True,
+                    ffmpeg_params=ffmpeg_params
                 )
                 
                 # Clean up
@@ -216,6 +252,9 @@ class FFmpegService:
             except Exception as e:
                 logger.error(f"Error in scene preview generation: {str(e)}")
                 raise
+            finally:
+                if subtitle_path and os.path.exists(subtitle_path):
+                    os.remove(subtitle_path)
             
             # Return relative path for storage in database
             relative_path = os.path.join('previews', workspace_id, output_filename)
@@ -727,14 +766,7 @@ class FFmpegService:
         def make_frame(t):
             frame = clip.get_frame(t)
             height, width = frame.shape[:2]
-            x = np.linspace(-1, 1, width)
-            y = np.linspace(-1, 1, height)
-            X, Y = np.meshgrid(x, y)
-            mask = np.sqrt(X**2 + Y**2)
-            mask = (1 - mask) ** intensity
-            mask = np.clip(mask, 0, 1)
-            mask = np.dstack((mask, mask, mask))
-            return frame * mask
+            return frame * vignette_mask(width, height, intensity)
         return clip.with_duration(clip.duration).fl_image(make_frame)
 
     def _apply_time_mirror_effect(self, clip):
@@ -840,76 +872,6 @@ class FFmpegService:
             return cv2.resize(small, (w, h), interpolation=cv2.INTER_NEAREST)
         return clip.with_duration(clip.duration).fl_image(make_frame)
 
-    def _apply_text_overlay(self, clip, text, position='bottom', fontsize=30, color='white', 
-                           bg_color=None, font=None, opacity=1.0, stroke_color=None, 
-                           stroke_width=1, align='center', vertical_offset=0.1):
-        """
-        Add text overlay to a video clip.
-        
-        Args:
-            clip: The video clip to add text to
-            text: The text to display
-            position: Position of the text ('top', 'center', 'bottom')
-            fontsize: Size of the font
-            color: Color of the text
-            bg_color: Background color for the text (None for transparent)
-            font: Font to use (None for default)
-            opacity: Opacity of the text (0.0-1.0)
-            stroke_color: Color of the text outline (None for no outline)
-            stroke_width: Width of the text outline
-            align: Text alignment ('left', 'center', 'right')
-            vertical_offset: Offset from the position (0.0-1.0)
-            
-        Returns:
-            Clip with text overlay
-        """
-        from moviepy import TextClip
-
-        
-        # Create text clip
-        txt_clip = TextClip(
-            font='/Users/karthicksakkaravarthi/Project/CraftVid/backend/backend/video/services/BigShoulders-VariableFont_opsz,wght.ttf',
-            text=text, 
-            color=color,
-            font_size=40,
-            bg_color=bg_color,
-            stroke_color=stroke_color,
-            stroke_width=stroke_width,
-            # align=align
-        )
-        
-        # Set duration to match the video
-        txt_clip = txt_clip.with_duration(clip.duration)
-        
-        # Set opacity if needed
-        if opacity < 1.0:
-            txt_clip = txt_clip.with_opacity(opacity)
-        
-        # Calculate position
-        w, h = clip.size
-        txt_w, txt_h = txt_clip.size
-        
-        # Horizontal position (centered by default)
-        x_pos = (w - txt_w) / 2
-        if align == 'left':
-            x_pos = 20  # Left margin
-        elif align == 'right':
-            x_pos = w - txt_w - 20  # Right margin
-        
-        # Vertical position
-        if position == 'top':
-            y_pos = h * vertical_offset
-        elif position == 'center':
-            y_pos = (h - txt_h) / 2
-        else:  # bottom
-            y_pos = h - txt_h - (h * vertical_offset)
-        
-        # Apply position
-        txt_clip = txt_clip.with_position((x_pos, y_pos))
-        
-        # Composite with original clip
-        return CompositeVideoClip([clip, txt_clip])
-
     def generate_video(
         self,
         image_path: str,
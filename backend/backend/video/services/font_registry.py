@@ -0,0 +1,132 @@
+"""
+Registry of the fonts shipped with the project.
+
+Fonts live in ``backend/video/fonts`` and are resolved by key, optionally
+per channel. Loaded FreeType faces and rasterized text runs are cached for
+the lifetime of the worker process, so repeated captions and watermarks
+don't reload or re-render the font for every job.
+"""
+
+import os
+import logging
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Directory holding the font files shipped with the project
+FONTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "fonts")
+
+# Registered fonts: key -> font file and the family name libass matches on
+FONTS: Dict[str, Dict[str, str]] = {
+    "big_shoulders": {
+        "file": "BigShoulders-VariableFont_opsz,wght.ttf",
+        "family": "Big Shoulders",
+    },
+    "freedom": {
+        "file": "Freedom-10eM.ttf",
+        "family": "FREEDOM",
+    },
+}
+
+DEFAULT_FONT = "big_shoulders"
+
+Color = Tuple[int, int, int, int]
+
+
+def resolve_font(channel=None, font_key: Optional[str] = None) -> str:
+    """
+    Resolve the registry key of the font to use.
+
+    An explicit key wins, then the channel's font, then the default font.
+    Unknown keys fall back to the default with a warning.
+
+    Args:
+        channel: Optional channel whose font should be used
+        font_key: Optional explicit font key
+
+    Returns:
+        A registered font key
+    """
+    key = font_key or getattr(channel, "font", None) or DEFAULT_FONT
+    if key not in FONTS:
+        logger.warning(f"Unknown font '{key}', using {DEFAULT_FONT}")
+        key = DEFAULT_FONT
+    return key
+
+
+def get_font_path(font_key: str = DEFAULT_FONT) -> str:
+    """Get the absolute path of a registered font file."""
+    return os.path.join(FONTS_DIR, FONTS[resolve_font(font_key=font_key)]["file"])
+
+
+def get_font_family(font_key: str = DEFAULT_FONT) -> str:
+    """Get the family name of a registered font, as used in ASS styles."""
+    return FONTS[resolve_font(font_key=font_key)]["family"]
+
+
+@lru_cache(maxsize=64)
+def get_font(font_key: str = DEFAULT_FONT, size: int = 48):
+    """
+    Load a FreeType face for a registered font.
+
+    Faces are cached per process by key and size.
+
+    Args:
+        font_key: Registered font key
+        size: Font size in pixels
+
+    Returns:
+        A PIL FreeTypeFont
+    """
+    from PIL import ImageFont
+
+    font_path = get_font_path(font_key)
+    logger.debug(f"Loading font {font_path} at size {size}")
+    return ImageFont.truetype(font_path, size)
+
+
+@lru_cache(maxsize=256)
+def render_text(
+    text: str,
+    font_key: str = DEFAULT_FONT,
+    size: int = 48,
+    fill: Color = (255, 255, 255, 200),
+    shadow: Optional[Color] = (0, 0, 0, 128),
+    shadow_offset: int = 2,
+):
+    """
+    Rasterize a run of text onto a transparent image.
+
+    Rendered runs are cached per process, so the returned image is shared
+    and must be treated as read-only; copy it before drawing on it.
+
+    Args:
+        text: The text to render
+        font_key: Registered font key
+        size: Font size in pixels
+        fill: RGBA colour of the text
+        shadow: RGBA colour of the drop shadow (None for no shadow)
+        shadow_offset: Offset of the drop shadow in pixels
+
+    Returns:
+        An RGBA PIL Image tightly fitting the text
+    """
+    from PIL import Image, ImageDraw
+
+    font = get_font(font_key, size)
+    left, top, right, bottom = font.getbbox(text)
+    offset = shadow_offset if shadow else 0
+    image = Image.new("RGBA", (right - left + offset, bottom - top + offset), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(image)
+
+    if shadow:
+        draw.text((offset - left, offset - top), text, font=font, fill=shadow)
+    draw.text((-left, -top), text, font=font, fill=fill)
+    return image
+
+
+def clear_cache():
+    """Drop all cached font faces and rendered text runs."""
+    get_font.cache_clear()
+    render_text.cache_clear()
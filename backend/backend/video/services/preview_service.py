@@ -5,6 +5,7 @@ Service for generating screen previews using MoviePy.
 import os
 import uuid
 import math
+import time
 import logging
 import tempfile
 from typing import Optional
@@ -28,6 +29,8 @@ from moviepy.audio.fx import MultiplyVolume
 from moviepy.video.fx.Crop import Crop  # Import the crop function
 from moviepy.video.fx import Resize, SlideIn, SlideOut
 
+from backend.video.services import font_registry, render_planner
+
 logger = logging.getLogger(__name__)
 
 
@@ -101,45 +104,27 @@ def generate_preview(
     # If no watermark is provided or channel logo not accessible, create a text-based watermark
     if not watermark_path or not os.path.exists(watermark_path):
         try:
-            from PIL import Image, ImageDraw, ImageFont
+            from PIL import Image
 
             # Create temporary file for the watermark
             temp_watermark = tempfile.NamedTemporaryFile(delete=False, suffix=".png")
             temp_watermark.close()
 
-            # Create a simple text watermark
+            # Create a simple text watermark with the channel's font; the
+            # rendered text run is cached across jobs by the font registry
             watermark_text = channel.name if channel and channel.name else "CraftVid"
-            img_size = (400, 100)
+            text_img = font_registry.render_text(
+                watermark_text, font_registry.resolve_font(channel), 48
+            )
+            text_width, text_height = text_img.size
+            img_size = (max(400, text_width), max(100, text_height))
             watermark_img = Image.new("RGBA", img_size, (255, 255, 255, 0))
-            draw = ImageDraw.Draw(watermark_img)
-
-            # Try to use a system font
-            try:
-                font = ImageFont.truetype("Arial", 48)
-            except IOError:
-                # Fall back to default font
-                font = ImageFont.load_default()
-
-            # Draw text
-            try:
-                text_width, text_height = draw.textsize(watermark_text, font=font)
-            except AttributeError:
-                # For newer Pillow versions
-                text_width, text_height = font.getbbox(watermark_text)[2:4]
 
             position = (
                 (img_size[0] - text_width) // 2,
                 (img_size[1] - text_height) // 2,
             )
-
-            # Draw text with shadow for better visibility
-            draw.text(
-                (position[0] + 2, position[1] + 2),
-                watermark_text,
-                font=font,
-                fill=(0, 0, 0, 128),
-            )
-            draw.text(position, watermark_text, font=font, fill=(255, 255, 255, 200))
+            watermark_img.alpha_composite(text_img, dest=position)
 
             # Save the watermark
             watermark_img.save(temp_watermark.name)
@@ -229,6 +214,7 @@ def generate_preview(
 
         # Write to file
         logger.info(f"Writing video to {output_path}")
+        render_started = time.monotonic()
         final_clip.write_videofile(
             output_path,
             codec="libx264",
@@ -241,6 +227,9 @@ def generate_preview(
             remove_temp=True,
             logger=None,
         )
+        render_planner.record_render_speed(
+            "preview", int(duration * 24), time.monotonic() - render_started
+        )
 
         # Clean up clips
         logger.info("Cleaning up clips")
@@ -0,0 +1,257 @@
+"""
+Service for estimating the cost of a render before it is enqueued.
+
+The planner looks at a script's screens and the requested outputs and
+estimates render time, disk usage and API spend. Render speed comes from
+the encode fps recorded per preset by ``record_render_speed``, so estimates
+track the real throughput of the workers.
+"""
+
+import logging
+import subprocess
+from typing import Any, Dict, Iterable, Optional
+
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+# Output presets: frame rate, video bitrate and a fallback encode speed
+# (frames encoded per second) used until real measurements exist
+RENDER_PRESETS = {
+    "preview": {"fps": 24, "bitrate_kbps": 5000, "default_encode_fps": 30.0},
+    "final": {"fps": 24, "bitrate_kbps": 8000, "default_encode_fps": 15.0},
+}
+
+# Cache key and lifetime of the measured encode speed per preset
+RENDER_SPEED_CACHE_KEY = "render_planner:encode_fps:{preset}"
+RENDER_SPEED_TTL = 60 * 60 * 24 * 30
+# Weight of a new measurement in the moving average
+RENDER_SPEED_SMOOTHING = 0.2
+
+# Average narration speed used when no audio exists yet
+WORDS_PER_SECOND = 2.5
+# Duration used for screens with no narration at all
+DEFAULT_SCREEN_SECONDS = 5.0
+
+# API pricing, kept in line with ImageService and ElevenLabsService
+IMAGE_COST = {"standard": 0.04, "hd": 0.08}
+VOICE_COST_PER_1K_CHARS = 0.003
+
+# Typical API latency and output size per generated asset
+IMAGE_SECONDS = 15.0
+VOICE_SECONDS_PER_1K_CHARS = 4.0
+IMAGE_BYTES = 2 * 1024 * 1024
+VOICE_BYTES_PER_SECOND = 16 * 1024
+
+# Estimated render seconds above which a job is treated as heavy
+HEAVY_RENDER_SECONDS = 300
+
+# Celery priorities (0 is highest) by estimated render seconds
+PRIORITY_THRESHOLDS = (
+    (30, 0),
+    (120, 3),
+    (HEAVY_RENDER_SECONDS, 6),
+)
+LOWEST_PRIORITY = 9
+
+
+def record_render_speed(preset: str, frames: int, seconds: float) -> None:
+    """
+    Record the measured encode speed of a finished render.
+
+    The speed is kept as an exponential moving average per preset in the
+    cache so it is shared by all workers.
+
+    Args:
+        preset: Render preset name ('preview' or 'final')
+        frames: Number of frames encoded
+        seconds: Wall-clock seconds the encode took
+    """
+    if frames <= 0 or seconds <= 0:
+        return
+
+    measured = frames / seconds
+    key = RENDER_SPEED_CACHE_KEY.format(preset=preset)
+    try:
+        previous = cache.get(key)
+        if previous:
+            measured = previous + RENDER_SPEED_SMOOTHING * (measured - previous)
+        cache.set(key, measured, RENDER_SPEED_TTL)
+        logger.debug(f"Recorded {preset} encode speed: {measured:.1f} fps")
+    except Exception as e:
+        logger.warning(f"Failed to record render speed: {str(e)}")
+
+
+def get_render_speed(preset: str) -> float:
+    """Get the encode speed (frames per second) for a preset."""
+    default = RENDER_PRESETS[preset]["default_encode_fps"]
+    try:
+        return cache.get(RENDER_SPEED_CACHE_KEY.format(preset=preset)) or default
+    except Exception:
+        return default
+
+
+def probe_duration(path: str) -> Optional[float]:
+    """
+    Probe the duration of a media file with ffprobe.
+
+    Args:
+        path: Path to the media file
+
+    Returns:
+        Duration in seconds, or None if it can't be determined
+    """
+    try:
+        result = subprocess.run(
+            [
+                "ffprobe",
+                "-v", "error",
+                "-show_entries", "format=duration",
+                "-of", "default=noprint_wrappers=1:nokey=1",
+                path,
+            ],
+            check=True,
+            capture_output=True,
+            text=True,
+            timeout=10,
+        )
+        return float(result.stdout.strip())
+    except Exception as e:
+        logger.debug(f"Could not probe duration of {path}: {str(e)}")
+        return None
+
+
+def estimate_screen_duration(screen) -> float:
+    """
+    Estimate the duration of a screen in seconds.
+
+    Uses the recorded voice duration, then the narration length. Voice files
+    are never probed here, as estimates run in web requests; voices missing
+    a duration are backfilled by ``queue_duration_backfill``.
+
+    Args:
+        screen: Screen instance
+
+    Returns:
+        Estimated duration in seconds
+    """
+    voice = screen.voice
+    if voice and voice.duration:
+        return voice.duration
+
+    narration = _get_narration(screen)
+    if narration:
+        return max(len(narration.split()) / WORDS_PER_SECOND, 1.0)
+    return DEFAULT_SCREEN_SECONDS
+
+
+def queue_duration_backfill(media_ids: Iterable[str]) -> None:
+    """Queue probing the durations of media that have none recorded."""
+    media_ids = [str(media_id) for media_id in media_ids]
+    if not media_ids:
+        return
+    try:
+        from backend.video.tasks import backfill_media_durations
+
+        backfill_media_durations.delay(media_ids)
+    except Exception as e:
+        logger.warning(f"Failed to queue duration backfill: {str(e)}")
+
+
+def estimate_render(
+    screens: Iterable,
+    generate_images: bool = True,
+    generate_voices: bool = True,
+    generate_previews: bool = True,
+    create_final_video: bool = False,
+    image_quality: str = "standard",
+) -> Dict[str, Any]:
+    """
+    Estimate the cost of generating the requested outputs for screens.
+
+    Screens that already have an image or voice are not charged again.
+
+    Args:
+        screens: Screens to generate outputs for
+        generate_images: Whether images will be generated
+        generate_voices: Whether voices will be generated
+        generate_previews: Whether screen previews will be rendered
+        create_final_video: Whether the final video will be compiled
+        image_quality: Image quality that will be requested (standard, hd)
+
+    Returns:
+        Dictionary with render seconds, disk bytes, API spend, ETA and the
+        scheduling priority
+    """
+    preview_preset = RENDER_PRESETS["preview"]
+    final_preset = RENDER_PRESETS["final"]
+    preview_speed = get_render_speed("preview")
+    final_speed = get_render_speed("final")
+
+    total_duration = 0.0
+    render_seconds = 0.0
+    api_seconds = 0.0
+    disk_bytes = 0
+    api_cost = 0.0
+    image_count = 0
+    voice_characters = 0
+    screen_count = 0
+
+    missing_durations = []
+
+    for screen in screens:
+        screen_count += 1
+        duration = estimate_screen_duration(screen)
+        total_duration += duration
+        if screen.voice and not screen.voice.duration:
+            missing_durations.append(screen.voice_id)
+
+        if generate_images and not screen.image:
+            image_count += 1
+            api_cost += IMAGE_COST.get(image_quality, IMAGE_COST["standard"])
+            api_seconds += IMAGE_SECONDS
+            disk_bytes += IMAGE_BYTES
+
+        if generate_voices and not screen.voice:
+            characters = len(_get_narration(screen))
+            voice_characters += characters
+            api_cost += characters / 1000 * VOICE_COST_PER_1K_CHARS
+            api_seconds += characters / 1000 * VOICE_SECONDS_PER_1K_CHARS
+            disk_bytes += int(duration * VOICE_BYTES_PER_SECOND)
+
+        if generate_previews:
+            render_seconds += duration * preview_preset["fps"] / preview_speed
+            disk_bytes += int(duration * preview_preset["bitrate_kbps"] * 1000 / 8)
+
+    queue_duration_backfill(missing_durations)
+
+    if create_final_video:
+        render_seconds += total_duration * final_preset["fps"] / final_speed
+        disk_bytes += int(total_duration * final_preset["bitrate_kbps"] * 1000 / 8)
+
+    return {
+        "screens": screen_count,
+        "video_duration": round(total_duration, 1),
+        "images": image_count,
+        "voice_characters": voice_characters,
+        "render_seconds": round(render_seconds, 1),
+        "disk_bytes": disk_bytes,
+        "api_cost": round(api_cost, 4),
+        "eta_seconds": round(api_seconds + render_seconds, 1),
+        "priority": get_priority(render_seconds),
+        "heavy": render_seconds > HEAVY_RENDER_SECONDS,
+    }
+
+
+def get_priority(render_seconds: float) -> int:
+    """Map estimated render seconds to a Celery priority (0 is highest)."""
+    for threshold, priority in PRIORITY_THRESHOLDS:
+        if render_seconds <= threshold:
+            return priority
+    return LOWEST_PRIORITY
+
+
+def _get_narration(screen) -> str:
+    """Get the narration text of a screen."""
+    scene_data = screen.scene_data or {}
+    return scene_data.get("narrator") or scene_data.get("narration") or ""
@@ -0,0 +1,254 @@
+"""
+Event-driven dispatch of pending screen work.
+
+A screen state transition that starts background work (e.g. a screen
+becoming ready to render once ``ScreenService.update_screen_status``
+records its media as complete) writes a ``ScreenEvent`` row in the same
+transaction. Once the transaction commits, the event is added to a Redis
+stream and a consumer task is queued, which reads the stream through a
+consumer group, starts the work and acknowledges the entry.
+
+Nothing is lost if a process dies in between: events that were never
+processed stay in the outbox, and entries a consumer read but never
+acknowledged stay pending in the stream. ``reconcile`` runs every few
+minutes to republish the former and reclaim the latter, and to raise
+events for screens that were set to ready without going through
+``mark_ready``. Processing is idempotent, so an event published twice
+starts its work once.
+"""
+
+import logging
+from datetime import timedelta
+from typing import Iterable, List
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from backend.utils.redis_client import get_redis
+from backend.video.models import ScreenEvent
+
+logger = logging.getLogger(__name__)
+
+CONSUMER_GROUP = "dispatchers"
+CONSUMER_NAME = "dispatcher"
+# Entries read from the stream per round trip
+READ_BATCH = 100
+# Events republished and screens swept per reconciler run
+RECONCILE_BATCH = 500
+
+
+def mark_ready(screen) -> ScreenEvent:
+    """
+    Mark a screen as ready to render and queue its render.
+
+    Args:
+        screen: The screen whose media is complete
+
+    Returns:
+        The outbox event recorded for the transition
+    """
+    from backend.workspaces.models import Screen
+
+    with transaction.atomic():
+        Screen.objects.filter(id=screen.id).update(status="ready", updated_at=timezone.now())
+        screen.status = "ready"
+        event = ScreenEvent.objects.create(screen=screen, event="ready")
+        transaction.on_commit(lambda: publish([event.id]))
+    return event
+
+
+def publish(event_ids: Iterable) -> int:
+    """
+    Add outbox events to the stream and wake a consumer.
+
+    If Redis is unavailable the events stay unpublished and the
+    reconciler publishes them later.
+
+    Args:
+        event_ids: IDs of the events to publish
+
+    Returns:
+        Number of events published
+    """
+    from backend.video.tasks import consume_screen_events
+
+    event_ids = [str(event_id) for event_id in event_ids]
+    if not event_ids:
+        return 0
+
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        for event_id in event_ids:
+            pipe.xadd(
+                settings.SCREEN_EVENT_STREAM,
+                {"event_id": event_id},
+                maxlen=settings.SCREEN_EVENT_STREAM_MAXLEN,
+                approximate=True,
+            )
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"Failed to publish {len(event_ids)} screen events: {str(e)}")
+        return 0
+
+    ScreenEvent.objects.filter(id__in=event_ids, published_at__isnull=True).update(
+        published_at=timezone.now()
+    )
+    try:
+        consume_screen_events.delay()
+    except Exception as e:
+        # The entries are read by the next consumer or reconciler run
+        logger.warning(f"Failed to queue screen event consumer: {str(e)}")
+    return len(event_ids)
+
+
+def consume(claim_idle_seconds: int = 0) -> int:
+    """
+    Process the stream's new entries, and optionally reclaim stale ones.
+
+    Args:
+        claim_idle_seconds: Also process entries read by a consumer but not
+            acknowledged for this long (0 to only read new entries)
+
+    Returns:
+        Number of events processed
+    """
+    client = get_redis()
+    _ensure_group(client)
+    stream = settings.SCREEN_EVENT_STREAM
+
+    processed = 0
+    if claim_idle_seconds:
+        claimed = client.xautoclaim(
+            stream, CONSUMER_GROUP, CONSUMER_NAME, claim_idle_seconds * 1000, count=READ_BATCH
+        )
+        processed += _process_entries(client, claimed[1])
+
+    while True:
+        response = client.xreadgroup(CONSUMER_GROUP, CONSUMER_NAME, {stream: ">"}, count=READ_BATCH)
+        entries = [entry for _, stream_entries in response for entry in stream_entries]
+        if not entries:
+            return processed
+        processed += _process_entries(client, entries)
+
+
+def reconcile() -> dict:
+    """
+    Recover screen work that no event delivered.
+
+    Raises events for ready screens without a pending one, republishes
+    events that were never processed, and reclaims stream entries whose
+    consumer died. Only rows older than ``SCREEN_EVENT_RECONCILE_SECONDS``
+    are touched, so work that is still in flight is left alone.
+
+    Returns:
+        Counts of created, republished and processed events
+    """
+    from backend.workspaces.models import Screen
+
+    grace = settings.SCREEN_EVENT_RECONCILE_SECONDS
+    cutoff = timezone.now() - timedelta(seconds=grace)
+
+    # Uses the partial index on ready screens
+    pending_event = ScreenEvent.objects.filter(screen=OuterRef("pk"), processed_at__isnull=True)
+    orphan_ids = list(
+        Screen.objects.filter(status="ready", updated_at__lt=cutoff)
+        .exclude(Exists(pending_event))
+        .values_list("id", flat=True)[:RECONCILE_BATCH]
+    )
+    created = ScreenEvent.objects.bulk_create(
+        [ScreenEvent(screen_id=screen_id, event="ready") for screen_id in orphan_ids]
+    )
+
+    stale_ids = list(
+        ScreenEvent.objects.filter(processed_at__isnull=True, created_at__lt=cutoff)
+        .values_list("id", flat=True)[:RECONCILE_BATCH]
+    )
+    republished = publish(stale_ids + [event.id for event in created])
+    processed = consume(claim_idle_seconds=grace)
+
+    return {"created": len(created), "republished": republished, "processed": processed}
+
+
+def _ensure_group(client):
+    """Create the consumer group (and the stream) if they don't exist yet."""
+    from redis.exceptions import ResponseError
+
+    try:
+        client.xgroup_create(settings.SCREEN_EVENT_STREAM, CONSUMER_GROUP, id="0", mkstream=True)
+    except ResponseError as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+
+def _process_entries(client, entries: List) -> int:
+    """Process stream entries, acknowledging the ones that succeeded."""
+    processed = 0
+    for message_id, fields in entries:
+        # Entries trimmed from the stream while pending come back empty
+        if fields and fields.get("event_id"):
+            try:
+                if _process_event(fields["event_id"]):
+                    processed += 1
+            except Exception as e:
+                # Left pending, so the reconciler retries it
+                logger.error(f"Error processing screen event {fields['event_id']}: {str(e)}")
+                continue
+        client.xack(settings.SCREEN_EVENT_STREAM, CONSUMER_GROUP, message_id)
+    return processed
+
+
+def _process_event(event_id: str) -> bool:
+    """
+    Start the work of an outbox event, unless it was already processed.
+
+    Returns:
+        True if the event was processed now, False otherwise
+    """
+    with transaction.atomic():
+        event = (
+            ScreenEvent.objects.select_for_update(skip_locked=True)
+            .filter(id=event_id, processed_at__isnull=True)
+            .first()
+        )
+        if event is None:
+            return False
+
+        if event.event == "ready":
+            _start_render(event.screen_id)
+
+        event.processed_at = timezone.now()
+        event.save(update_fields=["processed_at"])
+    return True
+
+
+def _start_render(screen_id) -> bool:
+    """
+    Move a ready screen to processing and queue its render.
+
+    Returns:
+        True if the render was queued, False if the screen is no longer ready
+    """
+    from celery import chain
+
+    from config.celery_app import BULK_QUEUE
+    from backend.video.tasks import finish_screen_render
+    from backend.workspaces.models import Screen
+    from backend.workspaces.tasks import generate_screen_preview
+
+    claimed = Screen.objects.filter(id=screen_id, status="ready").update(
+        status="processing", updated_at=timezone.now()
+    )
+    if not claimed:
+        logger.info(f"Screen {screen_id} is no longer ready, not rendering it")
+        return False
+
+    # Queued inside the transaction, so a broker error rolls the claim back.
+    # Nobody is waiting on these renders, so they go to the batch pool
+    chain(
+        generate_screen_preview.si(str(screen_id)).set(queue=BULK_QUEUE),
+        finish_screen_render.s(str(screen_id)),
+    ).apply_async()
+    logger.info(f"Queued render of ready screen {screen_id}")
+    return True
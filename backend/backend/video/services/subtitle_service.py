@@ -0,0 +1,383 @@
+"""
+Service for building subtitle tracks (ASS, SRT, WebVTT) from screen data.
+
+The ASS track is burned into the video by FFmpeg's ``ass`` filter during the
+main encode, so text rendering is done natively by libass instead of
+compositing a text clip over every frame in Python.
+"""
+
+import os
+import re
+import logging
+from typing import Any, Dict, List, Optional
+
+from backend.video.services import font_registry
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of characters shown in a single caption
+MAX_CAPTION_CHARS = 42
+
+# ASS numpad alignment for each supported text position (centred text)
+ASS_ALIGNMENT = {
+    "bottom": 2,
+    "center": 5,
+    "top": 8,
+}
+
+# Shift applied to the numpad alignment for left/right aligned text
+ASS_HORIZONTAL_SHIFT = {
+    "left": -1,
+    "center": 0,
+    "right": 1,
+}
+
+# Simple named colours accepted in text parameters
+NAMED_COLORS = {
+    "white": (255, 255, 255),
+    "black": (0, 0, 0),
+    "yellow": (255, 255, 0),
+    "red": (255, 0, 0),
+    "green": (0, 255, 0),
+    "blue": (0, 0, 255),
+}
+
+
+def build_cues(
+    text: str,
+    duration: float,
+    offset: float = 0.0,
+    word_timings: Optional[List[Dict[str, Any]]] = None,
+    max_chars: int = MAX_CAPTION_CHARS,
+) -> List[Dict[str, Any]]:
+    """
+    Split text into timed caption cues.
+
+    When word timings are available (``{"word", "start", "end"}`` entries
+    relative to the start of the narration) the cues follow them exactly.
+    Otherwise the text is split into phrases and the duration is shared
+    between them in proportion to their length.
+
+    Args:
+        text: The caption text
+        duration: Duration the text should cover in seconds
+        offset: Start time of the text within the video in seconds
+        word_timings: Optional word-level timings for the text
+        max_chars: Maximum number of characters per cue
+
+    Returns:
+        List of cue dictionaries with start, end and text keys
+    """
+    if word_timings:
+        return _cues_from_word_timings(word_timings, offset, max_chars)
+
+    text = " ".join((text or "").split())
+    if not text or duration <= 0:
+        return []
+
+    phrases = _split_phrases(text, max_chars)
+    total_chars = sum(len(phrase) for phrase in phrases)
+
+    cues = []
+    start = offset
+    for phrase in phrases:
+        phrase_duration = duration * len(phrase) / total_chars
+        cues.append({"start": start, "end": start + phrase_duration, "text": phrase})
+        start += phrase_duration
+
+    # Avoid rounding drift on the last cue
+    cues[-1]["end"] = offset + duration
+    return cues
+
+
+def build_screen_cues(
+    scene_data: Dict[str, Any],
+    duration: float,
+    offset: float = 0.0,
+    word_timings: Optional[List[Dict[str, Any]]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Build the caption cues for a single screen.
+
+    The screen's ``on_screen_text`` is shown while its narration is spoken.
+    If narration word timings are known, the caption starts with the first
+    word and ends with the last one; otherwise it spans the whole screen.
+
+    Args:
+        scene_data: The screen's scene data
+        duration: Duration of the screen in seconds
+        offset: Start time of the screen within the video in seconds
+        word_timings: Optional word-level timings of the narration
+
+    Returns:
+        List of cue dictionaries
+    """
+    on_screen_text = (scene_data.get("on_screen_text") or "").strip()
+    if not on_screen_text:
+        return []
+
+    word_timings = word_timings or scene_data.get("word_timings")
+    start, end = 0.0, duration
+    if word_timings:
+        start = max(0.0, float(word_timings[0].get("start", 0.0)))
+        end = min(duration, float(word_timings[-1].get("end", duration)))
+        if end <= start:
+            start, end = 0.0, duration
+
+    return build_cues(on_screen_text, end - start, offset=offset + start)
+
+
+def write_ass(
+    cues: List[Dict[str, Any]],
+    output_path: str,
+    width: int = 1080,
+    height: int = 1920,
+    font: Optional[str] = None,
+    position: str = "bottom",
+    fontsize: int = 40,
+    color: str = "white",
+    stroke_color: Optional[str] = "black",
+    stroke_width: float = 1,
+    bg_color: Optional[str] = None,
+    opacity: float = 1.0,
+    align: str = "center",
+    vertical_offset: float = 0.1,
+    **kwargs,
+) -> str:
+    """
+    Write cues to an Advanced SubStation Alpha file.
+
+    The style arguments mirror the text parameters accepted in scene data so
+    existing ``text_params`` can be passed straight through.
+
+    Args:
+        cues: List of cue dictionaries
+        output_path: Path of the ASS file to write
+        width: Video width in pixels
+        height: Video height in pixels
+        font: Registered font key to render with (None for the default font)
+        position: Position of the text ('top', 'center', 'bottom')
+        fontsize: Size of the font in pixels
+        color: Text colour
+        stroke_color: Outline colour (None for no outline)
+        stroke_width: Outline width in pixels
+        bg_color: Background box colour (None for transparent)
+        opacity: Opacity of the text (0.0-1.0)
+        align: Text alignment ('left', 'center', 'right')
+        vertical_offset: Margin from the top/bottom edge (0.0-1.0 of height)
+
+    Returns:
+        The path of the written file
+    """
+    alpha = 255 - int(255 * max(0.0, min(opacity, 1.0)))
+    primary = _ass_color(color, alpha)
+    outline = _ass_color(stroke_color or "black", alpha)
+    back = _ass_color(bg_color or "black", alpha if bg_color else 255)
+    border_style = 3 if bg_color else 1
+    outline_width = stroke_width if stroke_color else 0
+    font_family = font_registry.get_font_family(font or font_registry.DEFAULT_FONT)
+    alignment = ASS_ALIGNMENT.get(position, ASS_ALIGNMENT["bottom"])
+    alignment += ASS_HORIZONTAL_SHIFT.get(align, 0)
+    margin_v = int(height * vertical_offset) if position != "center" else 0
+
+    lines = [
+        "[Script Info]",
+        "ScriptType: v4.00+",
+        f"PlayResX: {width}",
+        f"PlayResY: {height}",
+        "WrapStyle: 0",
+        "ScaledBorderAndShadow: yes",
+        "",
+        "[V4+ Styles]",
+        "Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, "
+        "BackColour, Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, "
+        "BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding",
+        f"Style: Default,{font_family},{fontsize},{primary},{primary},{outline},{back},"
+        f"0,0,0,0,100,100,0,0,{border_style},{outline_width},0,{alignment},20,20,{margin_v},1",
+        "",
+        "[Events]",
+        "Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text",
+    ]
+    for cue in cues:
+        text = cue["text"].replace("\\", "\\\\").replace("{", "(").replace("}", ")")
+        text = text.replace("\n", "\\N")
+        lines.append(
+            f"Dialogue: 0,{_ass_timestamp(cue['start'])},{_ass_timestamp(cue['end'])},"
+            f"Default,,0,0,0,,{text}"
+        )
+
+    _write_lines(output_path, lines)
+    logger.info(f"Wrote {len(cues)} subtitle cues to {output_path}")
+    return output_path
+
+
+def write_srt(cues: List[Dict[str, Any]], output_path: str) -> str:
+    """
+    Write cues to a SubRip (SRT) sidecar file.
+
+    Args:
+        cues: List of cue dictionaries
+        output_path: Path of the SRT file to write
+
+    Returns:
+        The path of the written file
+    """
+    lines = []
+    for index, cue in enumerate(cues, 1):
+        lines.extend([
+            str(index),
+            f"{_srt_timestamp(cue['start'], ',')} --> {_srt_timestamp(cue['end'], ',')}",
+            cue["text"],
+            "",
+        ])
+    _write_lines(output_path, lines)
+    return output_path
+
+
+def write_vtt(cues: List[Dict[str, Any]], output_path: str) -> str:
+    """
+    Write cues to a WebVTT sidecar file.
+
+    Args:
+        cues: List of cue dictionaries
+        output_path: Path of the VTT file to write
+
+    Returns:
+        The path of the written file
+    """
+    lines = ["WEBVTT", ""]
+    for cue in cues:
+        lines.extend([
+            f"{_srt_timestamp(cue['start'], '.')} --> {_srt_timestamp(cue['end'], '.')}",
+            cue["text"],
+            "",
+        ])
+    _write_lines(output_path, lines)
+    return output_path
+
+
+def write_sidecars(cues: List[Dict[str, Any]], video_path: str) -> Dict[str, str]:
+    """
+    Write SRT and VTT sidecar files next to a video.
+
+    Args:
+        cues: List of cue dictionaries
+        video_path: Path of the video the captions belong to
+
+    Returns:
+        Dictionary mapping the sidecar format to its path
+    """
+    base_path = os.path.splitext(video_path)[0]
+    return {
+        "srt": write_srt(cues, f"{base_path}.srt"),
+        "vtt": write_vtt(cues, f"{base_path}.vtt"),
+    }
+
+
+def ass_filter(subtitle_path: str, fonts_dir: Optional[str] = font_registry.FONTS_DIR) -> str:
+    """
+    Build the FFmpeg video filter that burns an ASS file into the video.
+
+    Args:
+        subtitle_path: Path to the ASS file
+        fonts_dir: Optional directory with additional fonts for libass
+
+    Returns:
+        Filter string suitable for ``-vf``
+    """
+    video_filter = f"ass={_escape_filter_path(subtitle_path)}"
+    if fonts_dir:
+        video_filter += f":fontsdir={_escape_filter_path(fonts_dir)}"
+    return video_filter
+
+
+def _cues_from_word_timings(
+    word_timings: List[Dict[str, Any]], offset: float, max_chars: int
+) -> List[Dict[str, Any]]:
+    """Group word timings into phrase cues of at most max_chars characters."""
+    cues = []
+    current = None
+    for timing in word_timings:
+        word = str(timing.get("word", "")).strip()
+        if not word:
+            continue
+        start = offset + float(timing.get("start", 0.0))
+        end = offset + float(timing.get("end", timing.get("start", 0.0)))
+
+        if current and len(current["text"]) + 1 + len(word) <= max_chars:
+            current["text"] += f" {word}"
+            current["end"] = end
+        else:
+            current = {"start": start, "end": end, "text": word}
+            cues.append(current)
+
+        if word[-1] in ".!?;:":
+            current = None
+    return cues
+
+
+def _split_phrases(text: str, max_chars: int) -> List[str]:
+    """Split text at sentence punctuation, then wrap phrases to max_chars."""
+    phrases = []
+    for sentence in re.split(r"(?<=[.!?;:,])\s+", text):
+        current = ""
+        for word in sentence.split():
+            if current and len(current) + 1 + len(word) > max_chars:
+                phrases.append(current)
+                current = word
+            else:
+                current = f"{current} {word}".strip()
+        if current:
+            phrases.append(current)
+    return phrases
+
+
+def _ass_color(color: Optional[str], alpha: int = 0) -> str:
+    """Convert a named or #RRGGBB colour to the ASS &HAABBGGRR format."""
+    color = (color or "white").strip().lower()
+    if color.startswith("#") and len(color) == 7:
+        r, g, b = (int(color[i:i + 2], 16) for i in (1, 3, 5))
+    else:
+        r, g, b = NAMED_COLORS.get(color, NAMED_COLORS["white"])
+    return f"&H{alpha:02X}{b:02X}{g:02X}{r:02X}"
+
+
+def _ass_timestamp(seconds: float) -> str:
+    """Format seconds as an ASS timestamp (H:MM:SS.cc)."""
+    centiseconds = int(round(max(seconds, 0.0) * 100))
+    hours, centiseconds = divmod(centiseconds, 360000)
+    minutes, centiseconds = divmod(centiseconds, 6000)
+    secs, centiseconds = divmod(centiseconds, 100)
+    return f"{hours}:{minutes:02d}:{secs:02d}.{centiseconds:02d}"
+
+
+def _srt_timestamp(seconds: float, separator: str) -> str:
+    """Format seconds as an SRT/VTT timestamp (HH:MM:SS,mmm)."""
+    milliseconds = int(round(max(seconds, 0.0) * 1000))
+    hours, milliseconds = divmod(milliseconds, 3600000)
+    minutes, milliseconds = divmod(milliseconds, 60000)
+    secs, milliseconds = divmod(milliseconds, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}{separator}{milliseconds:03d}"
+
+
+def _escape_filter_path(path: str) -> str:
+    """
+    Escape a path for use as an unquoted FFmpeg filter option value.
+
+    FFmpeg unescapes the value twice: once when splitting the filter's
+    options and again when parsing the filtergraph, so each level's special
+    characters are backslash-escaped in turn.
+    """
+    value = path.replace("\\", "/")
+    for char in "\\:'":
+        value = value.replace(char, f"\\{char}")
+    for char in "\\'[],;":
+        value = value.replace(char, f"\\{char}")
+    return value
+
+
+def _write_lines(output_path: str, lines: List[str]) -> None:
+    """Write lines to a UTF-8 text file, creating the directory if needed."""
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    with open(output_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
@@ -1,4 +1,5 @@
 import os
+import time
 from typing import List, Optional
 import math  # Add math import to fix undefined math errors
 
@@ -14,6 +15,9 @@ from moviepy.video.fx import Resize, SlideIn, SlideOut
 import random  # Add this import at the top
 # from moviepy.video.fx.all import resize, slide_in, slide_out  # Add these imports at the top
 import logging
+
+from backend.video.services import render_planner, subtitle_service
+
 logger = logging.getLogger(__name__)
 
 class VideoComposer:
@@ -22,6 +26,7 @@ class VideoComposer:
         self.audio_clips = [] 
         self.background_audio = None
         self.watermark = None
+        self.subtitles = None
         self.format = format  # Can be "landscape" (16:9) or "shorts" (9:16)
         logger.info(f"VideoComposer initialized with format: {format}")
 
@@ -173,7 +178,19 @@ class VideoComposer:
             
             logger.debug(f"Video duration: {final_video.duration}s")
             
+            ffmpeg_params = [
+                '-pix_fmt', 'yuv420p',  # Standard pixel format
+                '-profile:v', 'high',    # High profile encoding
+                '-level', '4.0',         # Compatibility level
+                '-movflags', '+faststart' # Web playback optimization
+            ]
+            
+            # Burn subtitles in with libass as part of the same encode
+            if self.subtitles:
+                ffmpeg_params.extend(['-vf', subtitle_service.ass_filter(self.subtitles)])
+            
             # Update video writing parameters
+            render_started = time.monotonic()
             final_video.write_videofile(
                 output_path,
                 fps=fps,
@@ -182,16 +199,14 @@ class VideoComposer:
                 bitrate='8000k',  # Increased bitrate for better quality
                 preset='medium',  # Balance between speed and quality
                 threads=4,        # Multi-threading for better performance
-                ffmpeg_params=[
-                    '-pix_fmt', 'yuv420p',  # Standard pixel format
-                    '-profile:v', 'high',    # High profile encoding
-                    '-level', '4.0',         # Compatibility level
-                    '-movflags', '+faststart' # Web playback optimization
-                ],
+                ffmpeg_params=ffmpeg_params,
                 # temp_audiofile=self.file_manager.get_path('audio', 'temp.m4a'),
                 remove_temp=True,
                 logger=None
             )
+            render_planner.record_render_speed(
+                "final", int(final_video.duration * fps), time.monotonic() - render_started
+            )
             logger.info("Video composition completed successfully")
             
             # Clean up
@@ -484,6 +499,20 @@ class VideoComposer:
             logger.error(f"Error adding watermark: {str(e)}")
             raise
 
+    def add_subtitles(self, subtitle_path: str):
+        """
+        Burn an ASS subtitle file into the video during composition
+        
+        Args:
+            subtitle_path: Path to the ASS subtitle file
+        """
+        if not os.path.exists(subtitle_path):
+            logger.error(f"Subtitle file not found: {subtitle_path}")
+            return
+        
+        self.subtitles = subtitle_path
+        logger.info(f"Added subtitles from {subtitle_path}")
+
     def _calculate_watermark_position(self, position: str, video_size: tuple, watermark_size: tuple):
         """Calculate watermark position based on specified position"""
         video_w, video_h = video_size
@@ -4,10 +4,13 @@ import os
 import logging
 import time
 from pathlib import Path
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 
 from celery import shared_task
 from django.conf import settings
+from django.utils import timezone
+
+from backend.utils.task_results import ERROR, SUCCESS, TaskResult, task_result
 
 
 logger = logging.getLogger(__name__)
@@ -179,43 +182,96 @@ def compile_video_from_assets(
 
 
 @shared_task
-def check_pending_videos():
+def consume_screen_events() -> TaskResult:
     """
-    Check for pending videos and process them if needed.
-    This task is scheduled to run periodically.
-    
+    Start the work of newly published screen events.
+
+    Queued each time events are published; concurrent runs read disjoint
+    entries from the stream.
+
+    Returns:
+        A compact result with the outcome
+    """
+    from backend.video.services import screen_events
+
+    try:
+        processed = screen_events.consume()
+        logger.debug(f"Processed {processed} screen events")
+        return task_result(SUCCESS)
+    except Exception as e:
+        logger.error(f"Error consuming screen events: {e}")
+        return task_result(ERROR)
+
+
+@shared_task
+def reconcile_screen_events() -> TaskResult:
+    """
+    Recover screen work that no event delivered.
+
+    Scheduled every few minutes as a safety net; screens are normally
+    dispatched by their state transition.
+
+    Returns:
+        A compact result with the outcome
+    """
+    from backend.video.services import screen_events
+
+    try:
+        counts = screen_events.reconcile()
+        if any(counts.values()):
+            logger.info(f"Reconciled screen events: {counts}")
+        return task_result(SUCCESS)
+    except Exception as e:
+        logger.error(f"Error reconciling screen events: {e}")
+        return task_result(ERROR)
+
+
+@shared_task
+def finish_screen_render(result: Dict[str, Any], screen_id: str) -> TaskResult:
+    """
+    Record the outcome of a ready screen's render.
+
+    Args:
+        result: Result of the preview task
+        screen_id: ID of the rendered screen
+
     Returns:
-        Dict with information about the checked videos
+        A compact result with the screen ID
     """
     from backend.workspaces.models import Screen
-    
-    # Get screens that are in 'draft' or 'ready' status
-    pending_screens = Screen.objects.filter(status__in=['draft', 'ready'])
-    
-    processed_count = 0
-    for screen in pending_screens.filter(status='ready'):
-        # For screens that are ready, start processing
+
+    succeeded = (result or {}).get('status') == SUCCESS
+    Screen.objects.filter(id=screen_id, status='processing').update(
+        status='completed' if succeeded else 'failed', updated_at=timezone.now()
+    )
+    return task_result(SUCCESS if succeeded else ERROR, screen_id)
+
+
+@shared_task
+def backfill_media_durations(media_ids: List[str]) -> TaskResult:
+    """
+    Probe and record the durations of media that have none.
+
+    Queued by render estimates, which run in web requests and don't probe
+    files themselves.
+
+    Args:
+        media_ids: IDs of the media to probe
+
+    Returns:
+        A compact result with the outcome
+    """
+    from backend.video.services.render_planner import probe_duration
+    from backend.workspaces.models import Media
+
+    updated = 0
+    for media in Media.objects.filter(id__in=media_ids, duration__isnull=True):
         try:
-            screen.status = 'processing'
-            screen.save(update_fields=['status'])
-            
-            # Start the compilation task
-            compile_video_from_assets.delay(
-                workspace_id=str(screen.workspace.id),
-                script_id=screen.settings.get('script_id'),
-                images=screen.settings.get('images'),
-                audio_id=screen.settings.get('audio_id'),
-                output_options=screen.settings
-            )
-            
-            processed_count += 1
-        except Exception as e:
-            logger.error(f"Error starting processing for screen {screen.id}: {e}")
-            screen.status = 'failed'
-            screen.error_message = str(e)
-            screen.save(update_fields=['status', 'error_message'])
-    
-    return {
-        'pending_count': pending_screens.count(),
-        'processed_count': processed_count,
-    } 
\ No newline at end of file
+            path = media.file.path
+        except Exception:
+            continue
+        duration = probe_duration(path) if os.path.exists(path) else None
+        if duration:
+            updated += Media.objects.filter(id=media.id, duration__isnull=True).update(duration=duration)
+    logger.debug(f"Backfilled the durations of {updated} media")
+    return task_result(SUCCESS)
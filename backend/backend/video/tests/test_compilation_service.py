@@ -0,0 +1,234 @@
+import os
+
+import pytest
+from django.utils import timezone
+
+from backend.video.models import RenderJob
+from backend.video.services import compilation_service
+from backend.workspaces.models import Channel
+from backend.workspaces.models import Screen
+from backend.workspaces.tasks import compile_script_video
+from backend.workspaces.tests.factories import MediaFactory
+from backend.workspaces.tests.factories import ScreenFactory
+from backend.workspaces.tests.factories import ScriptFactory
+
+pytestmark = pytest.mark.django_db
+
+
+class FakeComposer:
+    """Stands in for VideoComposer, writing a placeholder segment per compose."""
+
+    rendered = []
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def add_image_with_audio(self, *args, **kwargs):
+        pass
+
+    def add_image_with_effect(self, *args, **kwargs):
+        pass
+
+    def add_watermark(self, *args, **kwargs):
+        pass
+
+    def add_subtitles(self, *args, **kwargs):
+        pass
+
+    def compose_video(self, output_path):
+        with open(output_path, "wb") as f:
+            f.write(b"segment")
+        self.rendered.append(os.path.basename(output_path))
+
+
+@pytest.fixture
+def renders(monkeypatch):
+    """Stub media probing, segment rendering and FFmpeg, recording each call."""
+    calls = {"probe": [], "segments": [], "ffmpeg": []}
+
+    def probe_duration(path):
+        calls["probe"].append(path)
+        return 3.0
+
+    def run_ffmpeg(cmd, action):
+        with open(cmd[-1], "wb") as f:
+            f.write(action.encode())
+        calls["ffmpeg"].append(action)
+
+    FakeComposer.rendered = calls["segments"]
+    monkeypatch.setattr(compilation_service.render_planner, "probe_duration", probe_duration)
+    monkeypatch.setattr(compilation_service, "VideoComposer", FakeComposer)
+    monkeypatch.setattr(compilation_service, "_run_ffmpeg", run_ffmpeg)
+    return calls
+
+
+@pytest.fixture
+def script():
+    script = ScriptFactory()
+    for scene in range(2):
+        screen = ScreenFactory(script=script, scene=scene)
+        screen.image = MediaFactory(workspace=script.workspace, file_type="image")
+        screen.voice = MediaFactory(workspace=script.workspace)
+        screen.save()
+    return script
+
+
+def _interrupted_job(script, renders, monkeypatch):
+    """Run a job that fails while muxing, after its earlier stages finished."""
+    def fail_mux(cmd, action):
+        if action == "mux video":
+            raise RuntimeError("Worker lost")
+        renders["ffmpeg"].append(action)
+        with open(cmd[-1], "wb") as f:
+            f.write(action.encode())
+
+    render_job = RenderJob.objects.create(script=script)
+    with monkeypatch.context() as patch:
+        patch.setattr(compilation_service, "_run_ffmpeg", fail_mux)
+        with pytest.raises(RuntimeError):
+            compilation_service.run_render_job(render_job)
+
+    render_job.refresh_from_db()
+    for calls in renders.values():
+        calls.clear()
+    return render_job
+
+
+def test_run_render_job_runs_every_stage(script, renders):
+    render_job = RenderJob.objects.create(script=script)
+
+    output_name = compilation_service.run_render_job(render_job)
+
+    render_job.refresh_from_db()
+    script.refresh_from_db()
+    assert render_job.status == "completed"
+    assert render_job.output_file == output_name == script.output_file
+    assert len(renders["probe"]) == 2
+    assert renders["segments"] == ["segment_000.mp4", "segment_001.mp4"]
+    assert renders["ffmpeg"] == ["mix audio", "mux video"]
+    assert not os.path.exists(render_job.work_dir)
+
+
+def test_resumed_job_skips_completed_stages(script, renders, monkeypatch):
+    render_job = _interrupted_job(script, renders, monkeypatch)
+    assert render_job.status == "failed"
+    assert render_job.current_stage == "mux"
+    assert render_job.is_stage_complete("probe")
+    assert render_job.is_stage_complete("segments")
+
+    compilation_service.run_render_job(render_job)
+
+    render_job.refresh_from_db()
+    assert render_job.status == "completed"
+    assert render_job.attempts == 2
+    assert renders["probe"] == []
+    assert renders["segments"] == []
+    assert renders["ffmpeg"] == ["mux video"]
+
+
+def test_missing_segment_is_rendered_again(script, renders, monkeypatch):
+    render_job = _interrupted_job(script, renders, monkeypatch)
+    os.remove(os.path.join(render_job.work_dir, "segment_001.mp4"))
+    assert not render_job.is_stage_complete("segments")
+
+    compilation_service.run_render_job(render_job)
+
+    assert renders["probe"] == []
+    assert renders["segments"] == ["segment_001.mp4"]
+    # Stages after the segments are dropped and run again
+    assert renders["ffmpeg"] == ["mix audio", "mux video"]
+
+
+def test_changed_checkpoint_reruns_the_stage_and_everything_after_it(script, renders, monkeypatch):
+    render_job = _interrupted_job(script, renders, monkeypatch)
+    with open(os.path.join(render_job.work_dir, "probe.json"), "a") as f:
+        f.write(" ")
+    assert not render_job.is_stage_complete("probe")
+
+    compilation_service.run_render_job(render_job)
+
+    assert len(renders["probe"]) == 2
+    assert renders["segments"] == ["segment_000.mp4", "segment_001.mp4"]
+    assert renders["ffmpeg"] == ["mix audio", "mux video"]
+
+
+def test_invalidate_from_drops_the_stage_and_later_stages(script, renders, monkeypatch):
+    render_job = _interrupted_job(script, renders, monkeypatch)
+
+    render_job.invalidate_from("segments")
+
+    render_job.refresh_from_db()
+    assert set(render_job.checkpoints) == {"probe"}
+
+
+def test_fingerprint_is_stable_for_the_same_inputs(script):
+    fingerprint = compilation_service.compute_fingerprint(script)
+
+    assert fingerprint
+    assert compilation_service.compute_fingerprint(script) == fingerprint
+
+
+def test_fingerprint_of_a_script_without_images_is_none():
+    script = ScriptFactory()
+    ScreenFactory(script=script)
+
+    assert compilation_service.compute_fingerprint(script) is None
+
+
+@pytest.mark.parametrize("change", ["image", "voice", "on_screen_text", "font"])
+def test_fingerprint_changes_with_the_inputs(script, change):
+    fingerprint = compilation_service.compute_fingerprint(script)
+    screen = Screen.objects.filter(script=script).order_by("scene").first()
+
+    if change == "image":
+        screen.image = MediaFactory(workspace=script.workspace, file_type="image", file__data=b"new image")
+        screen.save()
+    elif change == "voice":
+        screen.voice = MediaFactory(workspace=script.workspace, file__data=b"new narration")
+        screen.save()
+    elif change == "on_screen_text":
+        screen.scene_data = {**screen.scene_data, "on_screen_text": "New caption"}
+        screen.save()
+    else:
+        script.channel = Channel.objects.create(name="Channel", font="freedom")
+        script.save()
+
+    assert compilation_service.compute_fingerprint(script) != fingerprint
+
+
+def test_duplicate_compile_attaches_to_the_running_job(script, renders):
+    running = RenderJob.objects.create(
+        script=script,
+        task_id="first-compile",
+        status="running",
+        heartbeat_at=timezone.now(),
+        fingerprint=compilation_service.compute_fingerprint(script),
+    )
+
+    compile_script_video.apply(args=[str(script.id)], task_id="second-compile")
+
+    attached = RenderJob.objects.get(task_id="second-compile")
+    assert attached.duplicate_of == running
+    assert attached.status == "pending"
+    assert attached.resolved_status == "running"
+    assert renders["segments"] == []
+
+    output_name = compilation_service.run_render_job(running)
+
+    attached.refresh_from_db()
+    assert attached.status == attached.resolved_status == "completed"
+    assert attached.output_file == output_name
+
+
+def test_compile_matching_the_latest_output_reuses_it(script, renders):
+    compile_script_video.apply(args=[str(script.id)], task_id="first-compile")
+    first = RenderJob.objects.get(task_id="first-compile")
+    renders["segments"].clear()
+
+    compile_script_video.apply(args=[str(script.id)], task_id="second-compile")
+
+    reused = RenderJob.objects.get(task_id="second-compile")
+    assert reused.duplicate_of == first
+    assert reused.status == "completed"
+    assert reused.output_file == first.output_file
+    assert renders["segments"] == []
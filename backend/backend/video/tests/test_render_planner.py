@@ -0,0 +1,119 @@
+import pytest
+from django.core.cache import cache
+
+from backend.video.services import render_planner
+from backend.workspaces.tests.factories import MediaFactory
+from backend.workspaces.tests.factories import ScreenFactory
+
+
+@pytest.fixture(autouse=True)
+def _locmem_cache(settings):
+    settings.CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+    cache.clear()
+    yield
+    cache.clear()
+
+
+@pytest.fixture
+def backfills(monkeypatch):
+    """Record duration backfills instead of queueing them, and forbid probing."""
+    queued = []
+    monkeypatch.setattr(
+        render_planner, "queue_duration_backfill", lambda media_ids: queued.append(list(media_ids))
+    )
+
+    def fail_probe(path):
+        raise AssertionError("Estimates must not probe media files")
+
+    monkeypatch.setattr(render_planner, "probe_duration", fail_probe)
+    return queued
+
+
+def test_render_speed_defaults_to_the_preset_speed():
+    assert render_planner.get_render_speed("preview") == 30.0
+    assert render_planner.get_render_speed("final") == 15.0
+
+
+def test_render_speed_is_a_moving_average():
+    render_planner.record_render_speed("final", frames=480, seconds=10)
+    assert render_planner.get_render_speed("final") == 48.0
+
+    render_planner.record_render_speed("final", frames=240, seconds=10)
+    # 48 + 0.2 * (24 - 48)
+    assert render_planner.get_render_speed("final") == pytest.approx(43.2)
+    assert render_planner.get_render_speed("preview") == 30.0
+
+
+def test_empty_measurements_are_ignored():
+    render_planner.record_render_speed("final", frames=0, seconds=10)
+    render_planner.record_render_speed("final", frames=240, seconds=0)
+
+    assert render_planner.get_render_speed("final") == 15.0
+
+
+@pytest.mark.django_db
+def test_estimate_uses_recorded_voice_durations(backfills):
+    screen = ScreenFactory()
+    screen.voice = MediaFactory(workspace=screen.workspace, duration=12.0)
+    screen.image = MediaFactory(workspace=screen.workspace, file_type="image")
+    screen.save()
+
+    estimate = render_planner.estimate_render([screen], create_final_video=True)
+
+    assert estimate["video_duration"] == 12.0
+    assert estimate["images"] == 0
+    assert estimate["voice_characters"] == 0
+    assert estimate["api_cost"] == 0
+    # 12s at 24fps: 9.6s of preview encoding at 30fps and 19.2s of final at 15fps
+    assert estimate["render_seconds"] == 28.8
+    assert backfills == [[]]
+
+
+@pytest.mark.django_db
+def test_estimate_falls_back_to_the_narration_length(backfills):
+    narrated = ScreenFactory(scene_data={"narrator": "one two three four five six seven eight nine ten"})
+    silent = ScreenFactory(script=narrated.script, scene_data={})
+    unprobed = ScreenFactory(script=narrated.script, scene_data={"narrator": "a few words here"})
+    unprobed.voice = MediaFactory(workspace=unprobed.workspace, duration=None)
+    unprobed.save()
+
+    estimate = render_planner.estimate_render(
+        [narrated, silent, unprobed], generate_previews=False, image_quality="hd"
+    )
+
+    # 10 and 4 words at 2.5 words/s, plus the default length of a silent screen
+    assert estimate["video_duration"] == pytest.approx(4.0 + 5.0 + 1.6)
+    assert estimate["images"] == 3
+    assert estimate["voice_characters"] == len("one two three four five six seven eight nine ten")
+    assert estimate["render_seconds"] == 0
+    assert estimate["priority"] == 0
+    assert backfills == [[unprobed.voice_id]]
+
+
+@pytest.mark.django_db
+def test_estimate_uses_measured_render_speed(backfills):
+    render_planner.record_render_speed("preview", frames=600, seconds=10)
+    screen = ScreenFactory()
+    screen.voice = MediaFactory(workspace=screen.workspace, duration=10.0)
+    screen.save()
+
+    estimate = render_planner.estimate_render([screen], generate_images=False)
+
+    # 240 frames at the measured 60fps
+    assert estimate["render_seconds"] == 4.0
+
+
+@pytest.mark.parametrize(
+    ("render_seconds", "priority"),
+    [
+        (0, 0),
+        (30, 0),
+        (30.1, 3),
+        (120, 3),
+        (120.1, 6),
+        (render_planner.HEAVY_RENDER_SECONDS, 6),
+        (render_planner.HEAVY_RENDER_SECONDS + 0.1, render_planner.LOWEST_PRIORITY),
+    ],
+)
+def test_priority_boundaries(render_seconds, priority):
+    assert render_planner.get_priority(render_seconds) == priority
@@ -0,0 +1,107 @@
+import pytest
+from celery.canvas import _chain
+
+from backend.video.models import ScreenEvent
+from backend.video.services import screen_events
+from backend.workspaces.services.screen_service import ScreenService
+from backend.workspaces.tests.factories import MediaFactory
+from backend.workspaces.tests.factories import ScreenFactory
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def consumers(monkeypatch):
+    """Record consumer tasks queued by publish instead of sending them."""
+    from backend.video.tasks import consume_screen_events
+
+    queued = []
+    monkeypatch.setattr(consume_screen_events, "delay", lambda: queued.append(True))
+    return queued
+
+
+@pytest.fixture
+def renders(monkeypatch):
+    """Record render workflows queued by the consumer instead of sending them."""
+    queued = []
+    monkeypatch.setattr(_chain, "apply_async", lambda workflow, *args, **kwargs: queued.append(workflow))
+    return queued
+
+
+@pytest.fixture
+def screen():
+    screen = ScreenFactory()
+    screen.image = MediaFactory(workspace=screen.workspace, file_type="image")
+    screen.voice = MediaFactory(workspace=screen.workspace)
+    screen.save()
+    return screen
+
+
+def test_completed_media_publishes_a_ready_event(
+    screen, redis, settings, consumers, django_capture_on_commit_callbacks
+):
+    with django_capture_on_commit_callbacks(execute=True):
+        ScreenService.update_screen_status(str(screen.id), "voices", "completed")
+
+    screen.refresh_from_db()
+    assert screen.status == "ready"
+    event = ScreenEvent.objects.get(screen=screen)
+    assert event.event == "ready"
+    assert event.published_at is not None
+    assert redis.xlen(settings.SCREEN_EVENT_STREAM) == 1
+    assert consumers == [True]
+
+
+def test_completed_media_without_voice_stays_draft(redis, consumers):
+    screen = ScreenFactory()
+    screen.image = MediaFactory(workspace=screen.workspace, file_type="image")
+    screen.save()
+
+    ScreenService.update_screen_status(str(screen.id), "images", "completed")
+
+    screen.refresh_from_db()
+    assert screen.status == "draft"
+    assert not ScreenEvent.objects.filter(screen=screen).exists()
+
+
+def test_screen_with_a_queued_preview_is_not_marked_ready(screen, redis, consumers):
+    screen.status_data = {"preview": {"status": "queued", "task_id": "preview-task"}}
+    screen.save()
+
+    ScreenService.update_screen_status(str(screen.id), "images", "completed")
+
+    screen.refresh_from_db()
+    assert screen.status == "draft"
+    assert not ScreenEvent.objects.filter(screen=screen).exists()
+
+
+def test_consumer_claims_an_event_once(
+    screen, redis, consumers, renders, django_capture_on_commit_callbacks
+):
+    with django_capture_on_commit_callbacks(execute=True):
+        event = screen_events.mark_ready(screen)
+    # A duplicate delivery of the same event
+    screen_events.publish([event.id])
+
+    assert screen_events.consume() == 1
+    assert screen_events.consume() == 0
+
+    screen.refresh_from_db()
+    assert screen.status == "processing"
+    assert len(renders) == 1
+    event.refresh_from_db()
+    assert event.processed_at is not None
+
+
+def test_consumer_skips_screens_no_longer_ready(
+    screen, redis, consumers, renders, django_capture_on_commit_callbacks
+):
+    with django_capture_on_commit_callbacks(execute=True):
+        screen_events.mark_ready(screen)
+        screen_events.mark_ready(screen)
+
+    assert screen_events.consume() == 2
+
+    screen.refresh_from_db()
+    assert screen.status == "processing"
+    assert len(renders) == 1
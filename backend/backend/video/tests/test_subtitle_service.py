@@ -0,0 +1,103 @@
+from backend.video.services import font_registry
+from backend.video.services import subtitle_service
+
+WORD_TIMINGS = [
+    {"word": "Hello", "start": 0.5, "end": 0.9},
+    {"word": "there.", "start": 1.0, "end": 1.4},
+    {"word": "Welcome", "start": 1.6, "end": 2.1},
+    {"word": "back", "start": 2.2, "end": 2.6},
+]
+
+
+def test_screen_cues_span_the_whole_screen_without_word_timings():
+    cues = subtitle_service.build_screen_cues(
+        {"on_screen_text": "First phrase, second phrase"}, duration=4.0, offset=10.0
+    )
+
+    assert [cue["text"] for cue in cues] == ["First phrase,", "second phrase"]
+    assert cues[0]["start"] == 10.0
+    assert cues[0]["end"] == cues[1]["start"]
+    assert cues[-1]["end"] == 14.0
+
+
+def test_screen_cues_follow_the_narration_word_timings():
+    cues = subtitle_service.build_screen_cues(
+        {"on_screen_text": "Hello there", "word_timings": WORD_TIMINGS}, duration=5.0, offset=10.0
+    )
+
+    assert cues == [{"start": 10.5, "end": 12.6, "text": "Hello there"}]
+
+
+def test_screen_cues_ignore_word_timings_past_the_screen():
+    timings = [{"word": "Late", "start": 6.0, "end": 7.0}]
+
+    cues = subtitle_service.build_screen_cues(
+        {"on_screen_text": "Hello"}, duration=5.0, word_timings=timings
+    )
+
+    assert cues == [{"start": 0.0, "end": 5.0, "text": "Hello"}]
+
+
+def test_screen_without_on_screen_text_has_no_cues():
+    assert subtitle_service.build_screen_cues({"on_screen_text": "  "}, duration=5.0) == []
+
+
+def test_word_timing_cues_break_at_sentence_ends():
+    cues = subtitle_service.build_cues("", 0, offset=1.0, word_timings=WORD_TIMINGS)
+
+    assert cues == [
+        {"start": 1.5, "end": 2.4, "text": "Hello there."},
+        {"start": 2.6, "end": 3.6, "text": "Welcome back"},
+    ]
+
+
+def test_write_ass(tmp_path):
+    cues = [{"start": 0.0, "end": 1.25, "text": "Say {hi}\nthere"}]
+    path = subtitle_service.write_ass(
+        cues, str(tmp_path / "captions.ass"), width=720, height=1280, position="top", color="#FF8000"
+    )
+
+    content = (tmp_path / "captions.ass").read_text(encoding="utf-8")
+    assert path == str(tmp_path / "captions.ass")
+    assert "PlayResX: 720\nPlayResY: 1280" in content
+    family = font_registry.get_font_family(font_registry.DEFAULT_FONT)
+    assert f"Style: Default,{family},40,&H000080FF,&H000080FF,&H00000000,&HFF000000," in content
+    # Top-centre alignment with a margin of 10% of the height
+    assert ",8,20,20,128,1\n" in content
+    assert "Dialogue: 0,0:00:00.00,0:00:01.25,Default,,0,0,0,,Say (hi)\\Nthere\n" in content
+
+
+def test_write_srt_and_vtt(tmp_path):
+    cues = [
+        {"start": 0.0, "end": 1.5, "text": "One"},
+        {"start": 3661.25, "end": 3662.0, "text": "Two"},
+    ]
+
+    sidecars = subtitle_service.write_sidecars(cues, str(tmp_path / "video.mp4"))
+
+    assert sidecars == {"srt": str(tmp_path / "video.srt"), "vtt": str(tmp_path / "video.vtt")}
+    assert (tmp_path / "video.srt").read_text(encoding="utf-8") == (
+        "1\n00:00:00,000 --> 00:00:01,500\nOne\n\n"
+        "2\n01:01:01,250 --> 01:01:02,000\nTwo\n\n"
+    )
+    assert (tmp_path / "video.vtt").read_text(encoding="utf-8") == (
+        "WEBVTT\n\n"
+        "00:00:00.000 --> 00:00:01.500\nOne\n\n"
+        "01:01:01.250 --> 01:01:02.000\nTwo\n\n"
+    )
+
+
+def test_ass_filter():
+    assert subtitle_service.ass_filter("/media/temp/preview.ass", fonts_dir="/app/fonts") == (
+        "ass=/media/temp/preview.ass:fontsdir=/app/fonts"
+    )
+    assert subtitle_service.ass_filter("/media/temp/preview.ass", fonts_dir=None) == (
+        "ass=/media/temp/preview.ass"
+    )
+
+
+def test_ass_filter_escapes_quotes_and_separators():
+    video_filter = subtitle_service.ass_filter("C:\\media\\it's [1],a;b.ass", fonts_dir=None)
+
+    # Escaped once for the filter's options and once for the filtergraph
+    assert video_filter == "ass=C\\\\:/media/it\\\\\\'s \\[1\\]\\,a\\;b.ass"
@@ -10,7 +10,7 @@ class ChannelAdmin(admin.ModelAdmin):
     readonly_fields = ('created_at', 'updated_at')
     fieldsets = (
         (None, {
-            'fields': ('name', 'description', 'logo', 'website')
+            'fields': ('name', 'description', 'logo', 'website', 'font')
         }),
         ('Prompt Templates', {
             'fields': ('prompt_templates',),
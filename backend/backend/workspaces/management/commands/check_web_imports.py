@@ -0,0 +1,99 @@
+"""
+Check that the web process doesn't load the media stack.
+
+Boots Django the way a web worker does (settings, URLconf and the ASGI
+application) in a fresh interpreter under ``python -X importtime``, prints
+the slowest imports, and fails if a worker-only module was loaded. Heavy
+modules belong inside tasks and services that only run in Celery workers.
+
+Usage:
+    python manage.py check_web_imports
+    python manage.py check_web_imports --top 30 --forbid moviepy,cv2
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Modules only Celery workers should load
+FORBIDDEN_MODULES = ("moviepy", "cv2", "openai", "elevenlabs")
+
+# Loads what a web worker loads, then reports which top-level packages are present
+BOOTSTRAP = """
+import json, sys
+import django
+django.setup()
+from django.urls import get_resolver
+get_resolver().url_patterns
+import config.asgi
+print(json.dumps(sorted({name.split(".")[0] for name in sys.modules})))
+"""
+
+
+class Command(BaseCommand):
+    help = "Profile web-process imports and fail if worker-only modules are loaded"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--top",
+            type=int,
+            default=15,
+            help="Number of slowest imports to show",
+        )
+        parser.add_argument(
+            "--forbid",
+            default=",".join(FORBIDDEN_MODULES),
+            help="Comma-separated top-level modules the web process must not load",
+        )
+
+    def handle(self, *args, **options):
+        env = {**os.environ, "DJANGO_SETTINGS_MODULE": os.environ.get(
+            "DJANGO_SETTINGS_MODULE", "config.settings.local"
+        )}
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", BOOTSTRAP],
+            cwd=str(settings.BASE_DIR),
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode != 0:
+            raise CommandError(f"Web process failed to start:\n{result.stderr[-2000:]}")
+
+        loaded = set(json.loads(result.stdout.strip().splitlines()[-1]))
+        timings = self._parse_importtime(result.stderr)
+
+        total = sum(self_us for self_us, _, _ in timings) / 1e6
+        self.stdout.write(f"Web process imports: {len(timings)} modules in {total:.2f}s")
+        for _, cumulative, module in sorted(timings, key=lambda timing: -timing[1])[: options["top"]]:
+            self.stdout.write(f"  {cumulative / 1e6:7.3f}s  {module}")
+
+        forbidden = [
+            module.strip() for module in options["forbid"].split(",")
+            if module.strip() in loaded
+        ]
+        if forbidden:
+            raise CommandError(
+                f"Worker-only modules loaded by the web process: {', '.join(forbidden)}. "
+                "Import them inside the tasks or services that use them."
+            )
+        self.stdout.write(self.style.SUCCESS("No worker-only modules loaded by the web process"))
+
+    @staticmethod
+    def _parse_importtime(output: str):
+        """Parse ``-X importtime`` lines into (self us, cumulative us, module)."""
+        timings = []
+        for line in output.splitlines():
+            if not line.startswith("import time:"):
+                continue
+            fields = line[len("import time:"):].split("|")
+            try:
+                timings.append((int(fields[0]), int(fields[1]), fields[2].strip()))
+            except (IndexError, ValueError):
+                # The header line
+                continue
+        return timings
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.11 on 2026-10-18 22:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workspaces', '0017_script_publishing_info'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='channel',
+            name='font',
+            field=models.CharField(choices=[('big_shoulders', 'Big Shoulders'), ('freedom', 'Freedom')], default='big_shoulders', help_text='Font used for captions and text watermarks', max_length=50, verbose_name='Font'),
+        ),
+    ]
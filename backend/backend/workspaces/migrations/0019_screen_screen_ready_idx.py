@@ -0,0 +1,17 @@
+# Generated by Django 5.0.11 on 2026-10-18 23:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workspaces', '0018_channel_font'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='screen',
+            index=models.Index(condition=models.Q(('status', 'ready')), fields=['updated_at'], name='screen_ready_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.0.11 on 2026-10-18 23:14
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workspaces', '0019_screen_screen_ready_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='media',
+            name='cache_key',
+            field=models.CharField(blank=True, default='', max_length=64, verbose_name='Cache Key'),
+        ),
+        migrations.AddIndex(
+            model_name='media',
+            index=models.Index(condition=models.Q(('cache_key', ''), _negated=True), fields=['cache_key'], name='media_cache_key_idx'),
+        ),
+    ]
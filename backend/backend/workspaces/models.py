@@ -17,11 +17,20 @@ logger = logging.getLogger(__name__)
 class Channel(models.Model):
     """Model for storing channel information and prompt templates."""
 
+    FONT_CHOICES = (
+        ("big_shoulders", _("Big Shoulders")),
+        ("freedom", _("Freedom")),
+    )
+
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     name = models.CharField(_("Channel Name"), max_length=255)
     description = models.TextField(_("Description"), blank=True, null=True)
     logo = models.FileField(_("Logo"), blank=True, null=True)
     website = models.URLField(_("Website"), blank=True, null=True)
+    font = models.CharField(
+        _("Font"), max_length=50, choices=FONT_CHOICES, default="big_shoulders",
+        help_text=_("Font used for captions and text watermarks")
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -113,6 +122,8 @@ class Media(models.Model):
     duration = models.FloatField(_("Duration in Seconds"), null=True, blank=True)
     thumbnail_url = models.URLField(_("Thumbnail URL"), blank=True, null=True)
     metadata = models.JSONField(_("Metadata"), default=dict, blank=True)
+    # Hash of the generation inputs, for reusing generated media
+    cache_key = models.CharField(_("Cache Key"), max_length=64, blank=True, default="")
     uploaded_by = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.SET_NULL,
@@ -126,6 +137,14 @@ class Media(models.Model):
         ordering = ["-created_at"]
         verbose_name = _("Media")
         verbose_name_plural = _("Media")
+        indexes = [
+            # Only generated media is looked up by cache key
+            models.Index(
+                fields=["cache_key"],
+                name="media_cache_key_idx",
+                condition=~models.Q(cache_key=""),
+            ),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.file_type})"
@@ -206,6 +225,16 @@ class Screen(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     error_message = models.TextField(null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            # Only ready screens are swept by the screen event reconciler
+            models.Index(
+                fields=["updated_at"],
+                name="screen_ready_idx",
+                condition=models.Q(status="ready"),
+            ),
+        ]
+
     def __str__(self):
         return f"{self.workspace.name} - {self.name}"
 
@@ -225,6 +254,12 @@ class Screen(models.Model):
         #if user is str get user from id
         if isinstance(user, str):
             user = User.objects.get(id=user)
+        # Translations keep the original's visuals
+        if ScreenService.reuse_original_image(self, user):
+            ScreenService.update_screen_status(
+                screen_id=str(self.id), component="images", status="completed"
+            )
+            return {"status": "success", "message": "Image reused from the original screen"}
         # Get the visual description from scene_data
         visual_prompt = self.scene_data.get("visual", "")
         if not visual_prompt:
@@ -284,7 +319,11 @@ class Screen(models.Model):
                     status="rate_limited",
                     error_info=error_info,
                 )
-                return {"status": "failed", "error": "Rate limit error generating image for screen"}
+                return {
+                    "status": "rate_limited",
+                    "error": "Rate limit error generating image for screen",
+                    "retry_after": error_info.get("retry_after", 60),
+                }
             else:
                 # Handle other ValueError
                 error_info = {
@@ -334,6 +373,8 @@ class Screen(models.Model):
             Media: The generated voice media object
         """
         from backend.ai.services.elevenlabs_service import ElevenLabsService
+        from backend.ai.services.rate_limiter import RateLimitExceeded
+        from backend.workspaces.services.screen_service import ScreenService
         if isinstance(user, str):
             user = User.objects.get(id=user)
         # Get the narrator text from scene_data
@@ -351,19 +392,28 @@ class Screen(models.Model):
         )  # Default to 'Brain' voice
         model_id = "eleven_multilingual_v2"  # Default model
 
-        # Generate the voice
-        audio_bytes, metadata = voice_service.generate_voice(
-            text=narrator_text, voice_id=voice_id, model_id=model_id, user=user
-        )
-
-        # Save the audio file
-        filename = f"{uuid.uuid4()}.mp3"
-        local_path, relative_path = voice_service.save_audio_file(
-            audio_bytes, self.workspace, filename
-        )
-
-        # Get file size
-        file_size = os.path.getsize(local_path)
+        # Generate the voice, streaming it straight to a file
+        try:
+            audio_file, relative_path, metadata = voice_service.generate_voice_file(
+                text=narrator_text,
+                workspace=self.workspace,
+                voice_id=voice_id,
+                model_id=model_id,
+                user=user,
+            )
+        except RateLimitExceeded as e:
+            logger.warning(f"Rate limit error generating voice for screen {self.id}: {str(e)}")
+            ScreenService.update_screen_status(
+                screen_id=str(self.id),
+                component="voices",
+                status="rate_limited",
+                error_info=e.args[1]["error"],
+            )
+            return {
+                "status": "rate_limited",
+                "error": "Rate limit error generating voice for screen",
+                "retry_after": e.retry_after,
+            }
 
         # Create a Media object for the voice
         media = Media.objects.create(
@@ -371,13 +421,16 @@ class Screen(models.Model):
             name=f"Voice for {self.name}",
             file_type="audio",
             file=relative_path,
-            file_size=file_size,
+            file_size=audio_file.size,
+            duration=metadata["duration"],
+            cache_key=metadata["cache_key"],
             metadata={
                 "text": narrator_text,
                 "screen_id": str(self.id),
                 "script_id": str(self.script.id) if self.script else None,
                 "voice_id": voice_id,
                 "model_id": model_id,
+                "sha256": audio_file.sha256,
             },
             uploaded_by=user,
         )
@@ -868,86 +921,29 @@ class Script(models.Model):
             .first()
         )
 
-    def compile_video(self, user=None):
+    def compile_video(self, user=None, render_job=None):
         """Compile all screens into a final video.
 
-        This method takes all the screens associated with this script,
-        compiles their previews into a single video, and saves it to
-        the script's output_file.
+        The compile runs as a RenderJob with checkpointed stages, so passing
+        an existing job resumes it from its last completed stage. The result
+        is saved to the script's output_file.
 
         Args:
             user: The user compiling the video (for tracking)
+            render_job: Optional existing RenderJob to run or resume
 
         Returns:
             bool: True if successful, False otherwise
         """
-        from backend.video.services.compilation_service import compile_video
+        from backend.video.models import RenderJob
+        from backend.video.services.compilation_service import run_render_job
 
         try:
-            # Get all screens for this script
-            screens = Screen.objects.filter(script=self).order_by("scene")
-
-            # Check if we have screens
-            if not screens.exists():
-                logger.error(f"No screens found for script {self.id}")
-                return False
-
-            # Check if all screens have previews
-            # incomplete_screens = screens.exclude(status="completed")
-            # if incomplete_screens.exists():
-            #     logger.error(
-            #         f"Found incomplete screens for script {self.id}: {[str(s.id) for s in incomplete_screens]}"
-            #     )
-            #     return False
-
-            # Get all preview files and check if they exist
-            # preview_files = []
-            # for screen in screens:
-            #     if not screen.output_file:
-            #         logger.error(f"Screen {screen.id} has no output file")
-            #         return False
-
-            #     try:
-            #         file_path = screen.output_file.path
-            #         if not os.path.exists(file_path):
-            #             logger.error(f"Preview file not found: {file_path}")
-            #             return False
-            #         preview_files.append(file_path)
-            #     except Exception as e:
-            #         logger.error(
-            #             f"Error accessing preview file for screen {screen.id}: {str(e)}"
-            #         )
-            #         return False
-
-            # # If no valid preview files found, exit
-            # if not preview_files:
-            #     logger.error("No valid preview files found")
-            #     return False
-
-            # logger.info(
-            #     f"Compiling video from {len(preview_files)} preview files for script {self.id}"
-            # )
-
-            # If there's already an output file, delete it to save space
-            if self.output_file:
-                try:
-                    # Get the path of the current output file
-                    old_file_path = self.output_file.path
-
-                    # Check if the file exists
-                    if os.path.exists(old_file_path):
-                        logger.info(f"Removing old compiled video: {old_file_path}")
-                        os.remove(old_file_path)
-                except Exception as e:
-                    # Just log this error, don't fail the whole process
-                    logger.warning(f"Error removing old compiled video: {str(e)}")
-
-            # Compile the video
-            output_file = compile_video(screens, f"script_{self.id}_final.mp4", script=self)
+            if render_job is None:
+                render_job = RenderJob.objects.create(script=self, created_by=user)
 
-            # Save the output file
-            self.output_file = output_file
-            self.save(update_fields=["output_file", "updated_at"])
+            run_render_job(render_job)
+            self.refresh_from_db(fields=["output_file"])
 
             logger.info(f"Successfully compiled video for script {self.id}")
             return True
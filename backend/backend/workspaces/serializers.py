@@ -14,7 +14,7 @@ class ChannelSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Channel
-        fields = ['id', 'name', 'description', 'logo', 'website', 
+        fields = ['id', 'name', 'description', 'logo', 'website', 'font',
                  'prompt_templates', 'created_at', 'updated_at']
         read_only_fields = ['created_at', 'updated_at']
 
@@ -0,0 +1,271 @@
+"""
+In-flight locks for screen media generation.
+
+A generation task holds a Redis lock keyed by its screen, its component and
+a hash of the inputs it generates from. While the lock is held, requests
+for the same generation attach to the task that owns it instead of paying
+the provider again and racing it to write ``screen.image``/``screen.voice``.
+
+Locks are taken when the task is queued and held for
+``GENERATION_LOCK_QUEUED_TTL``, which the scheduler renews while the task's
+job waits in its queue (see ``refresh_screens``). Once the task runs, a
+heartbeat refreshes the lock every third of ``GENERATION_LOCK_TTL``, so a
+worker that dies frees it within minutes and the next request starts a new
+task.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Iterable, Optional, Tuple
+
+from celery.exceptions import Retry
+from django.conf import settings
+
+from backend.utils.redis_client import get_redis, register_script
+from backend.workspaces.models import Screen
+
+logger = logging.getLogger(__name__)
+
+# Scene data each component is generated from
+INPUT_FIELDS = {
+    "images": ("visual",),
+    "voices": ("narrator", "voice_id"),
+}
+
+# KEYS: lock  ARGV: task_id, ttl
+# Takes the lock if it is free (or already ours) and returns its owner.
+_ACQUIRE = register_script("""
+local owner = redis.call('GET', KEYS[1])
+if not owner or owner == ARGV[1] then
+    redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+    return ARGV[1]
+end
+return owner
+""")
+
+# KEYS: lock  ARGV: task_id, ttl
+_REFRESH = register_script("""
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+""")
+
+# KEYS: lock  ARGV: task_id
+_RELEASE = register_script("""
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+""")
+
+
+class GenerationLockService:
+    """Service for deduplicating in-flight screen media generation."""
+
+    @staticmethod
+    def input_hash(screen: Screen, component: str) -> str:
+        """
+        Hash the scene data a component is generated from.
+
+        Args:
+            screen: The screen to generate for
+            component: Status component ('images' or 'voices')
+
+        Returns:
+            A short hex digest of the inputs
+        """
+        scene_data = screen.scene_data or {}
+        inputs = {field: scene_data.get(field) for field in INPUT_FIELDS.get(component, ())}
+        payload = json.dumps(inputs, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+    @staticmethod
+    def lock_key(screen_id: str, component: str, input_hash: str) -> str:
+        """Build the Redis key of a generation lock."""
+        return f"{settings.GENERATION_LOCK_KEY_PREFIX}:{screen_id}:{component}:{input_hash}"
+
+    @staticmethod
+    def acquire(
+        screen: Screen,
+        component: str,
+        task_id: str,
+        input_hash: Optional[str] = None,
+        ttl: Optional[int] = None,
+    ) -> Tuple[str, Optional[str]]:
+        """
+        Take the generation lock of a screen component for a task.
+
+        If Redis is unavailable the task is let through without a lock.
+
+        Args:
+            screen: The screen to generate for
+            component: Status component ('images' or 'voices')
+            task_id: ID of the task that will generate
+            input_hash: Hash of the inputs, computed from the screen if not given
+            ttl: Lock lifetime in seconds, defaults to ``GENERATION_LOCK_QUEUED_TTL``
+
+        Returns:
+            Tuple of the task ID owning the lock (``task_id`` if it was
+            acquired) and the lock key (None if no lock could be taken)
+        """
+        key = GenerationLockService.lock_key(
+            str(screen.id),
+            component,
+            input_hash or GenerationLockService.input_hash(screen, component),
+        )
+        try:
+            owner = _ACQUIRE(
+                keys=[key], args=[task_id, ttl or settings.GENERATION_LOCK_QUEUED_TTL]
+            )
+        except Exception as e:
+            logger.warning(f"Generation lock unavailable, not deduplicating {key}: {str(e)}")
+            return task_id, None
+        return owner, key
+
+    @staticmethod
+    def refresh(key: str, task_id: str, ttl: int) -> bool:
+        """
+        Extend a lock held by a task.
+
+        Returns:
+            True if the task still owns the lock, False otherwise
+        """
+        try:
+            return bool(_REFRESH(keys=[key], args=[task_id, ttl]))
+        except Exception as e:
+            logger.warning(f"Failed to refresh generation lock {key}: {str(e)}")
+            return False
+
+    @staticmethod
+    def release(key: Optional[str], task_id: Optional[str]) -> bool:
+        """
+        Release a lock if it is still held by the task.
+
+        Returns:
+            True if the lock was released, False otherwise
+        """
+        if not key or not task_id:
+            return False
+        try:
+            return bool(_RELEASE(keys=[key], args=[task_id]))
+        except Exception as e:
+            logger.warning(f"Failed to release generation lock {key}: {str(e)}")
+            return False
+
+    @staticmethod
+    def is_held(key: str) -> bool:
+        """Check whether a generation lock is still held by any task."""
+        try:
+            return bool(get_redis().exists(key))
+        except Exception as e:
+            logger.warning(f"Failed to check generation lock {key}: {str(e)}")
+            return False
+
+    @staticmethod
+    @contextmanager
+    def hold(key: Optional[str], task_id: str):
+        """
+        Keep a lock alive while a task generates.
+
+        A heartbeat thread refreshes the lock until the block exits, and the
+        lock is released afterwards. When the task is retried, the lock is
+        kept for the queued TTL instead, so requests made while it waits
+        still attach to it.
+
+        Args:
+            key: Lock key returned by ``acquire`` (None holds nothing)
+            task_id: ID of the task owning the lock
+        """
+        if key is None:
+            yield
+            return
+
+        ttl = settings.GENERATION_LOCK_TTL
+        stop = threading.Event()
+
+        def heartbeat():
+            while not stop.wait(ttl / 3):
+                if not GenerationLockService.refresh(key, task_id, ttl):
+                    logger.warning(f"Task {task_id} lost generation lock {key}")
+                    return
+
+        GenerationLockService.refresh(key, task_id, ttl)
+        thread = threading.Thread(target=heartbeat, name=f"lock-heartbeat-{task_id}", daemon=True)
+        thread.start()
+        retrying = False
+        try:
+            yield
+        except Retry:
+            retrying = True
+            raise
+        finally:
+            stop.set()
+            thread.join()
+            if retrying:
+                GenerationLockService.refresh(key, task_id, settings.GENERATION_LOCK_QUEUED_TTL)
+            else:
+                GenerationLockService.release(key, task_id)
+
+    @staticmethod
+    def refresh_screens(screens: Iterable[Screen]) -> int:
+        """
+        Renew the locks of screens' queued media components in one pipeline.
+
+        Keeps the locks of tasks still waiting to run from expiring, however
+        long they wait. Components that started running are left to their
+        heartbeat.
+
+        Args:
+            screens: The screens whose locks to renew
+
+        Returns:
+            Number of locks renewed
+        """
+        locks = [
+            (data["lock_key"], data["task_id"])
+            for screen in screens
+            for data in ((screen.status_data or {}).get(component) or {} for component in INPUT_FIELDS)
+            if data.get("status") == "queued" and data.get("lock_key") and data.get("task_id")
+        ]
+        if not locks:
+            return 0
+        try:
+            pipe = get_redis().pipeline(transaction=False)
+            for key, task_id in locks:
+                _REFRESH(keys=[key], args=[task_id, settings.GENERATION_LOCK_QUEUED_TTL], client=pipe)
+            return sum(1 for refreshed in pipe.execute() if refreshed)
+        except Exception as e:
+            logger.warning(f"Failed to refresh generation locks: {str(e)}")
+            return 0
+
+    @staticmethod
+    def release_screens(screens: Iterable[Screen]) -> int:
+        """
+        Release the locks of screens' media components in one pipeline, e.g. on cancel.
+
+        Args:
+            screens: The screens whose locks to release
+
+        Returns:
+            Number of locks released
+        """
+        locks = [
+            (data["lock_key"], data["task_id"])
+            for screen in screens
+            for data in ((screen.status_data or {}).get(component) or {} for component in INPUT_FIELDS)
+            if data.get("lock_key") and data.get("task_id")
+        ]
+        if not locks:
+            return 0
+        try:
+            pipe = get_redis().pipeline(transaction=False)
+            for key, task_id in locks:
+                _RELEASE(keys=[key], args=[task_id], client=pipe)
+            return sum(1 for released in pipe.execute() if released)
+        except Exception as e:
+            logger.warning(f"Failed to release generation locks: {str(e)}")
+            return 0
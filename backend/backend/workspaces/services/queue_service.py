@@ -2,21 +2,31 @@
 Queue service for batch processing tasks.
 """
 
+import uuid
 import logging
-from typing import Dict, Any, Optional
-from celery import group
+from typing import Dict, Any, List, Optional, Tuple
+from celery import chord, group
+from celery.canvas import Signature
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 
+from config.celery_app import BULK_QUEUE, IO_QUEUE
+from backend.video.services import render_planner
 from backend.workspaces.models import Screen, Script
 from backend.workspaces.tasks import (
     generate_screen_media,
     generate_screen_preview,
+    generate_script_media,
     compile_script_video,
 )
 
 User = get_user_model()
 logger = logging.getLogger(__name__)
 
+# Component statuses of work that hasn't finished yet
+CANCELLABLE_STATUSES = ("queued", "processing", "rate_limited")
+
 
 class QueueService:
     """Service for managing task queues for batch processing."""
@@ -33,14 +43,22 @@ class QueueService:
         video_options: Optional[Dict[str, Any]] = None,
     ) -> Dict[str, Any]:
         """
-        Queue media generation tasks for all screens in a script.
+        Queue media generation for all screens in a script as one workflow.
+
+        Each screen generates its image and voice in parallel, and its
+        preview starts as soon as both are done. If a final video is
+        requested, the compile starts once every screen has finished. With
+        ``ASYNC_MEDIA_GENERATION`` enabled, the images and voices of every
+        screen are generated by a single async task instead, which queues
+        the previews itself, so the compile only waits for the media (see
+        ``build_script_workflow``).
 
         Args:
             script_id: ID of the script
             user_id: ID of the user running the tasks
             generate_images: Whether to generate images
             generate_voices: Whether to generate voices
-            generate_videos: Whether to generate videos
+            generate_videos: Whether to generate screen previews
             image_options: Options for image generation (not directly used in tasks)
             voice_options: Options for voice generation (not directly used in tasks)
             video_options: Options for video generation
@@ -50,7 +68,7 @@ class QueueService:
         """
         try:
             script = Script.objects.get(id=script_id)
-            screens = Screen.objects.filter(script=script).order_by("scene")
+            screens = Screen.objects.filter(script=script).select_related("voice", "image").order_by("scene")
 
             if not screens.exists():
                 return {
@@ -58,122 +76,73 @@ class QueueService:
                     "message": "No screens found for this script",
                 }
 
-            task_ids = {"images": [], "voices": [], "videos": []}
+            create_final_video = bool(
+                video_options and video_options.get("create_final_video", False)
+            )
+            estimate = render_planner.estimate_render(
+                screens,
+                generate_images=generate_images,
+                generate_voices=generate_voices,
+                generate_previews=generate_videos,
+                create_final_video=create_final_video,
+                image_quality=(image_options or {}).get("quality", "standard"),
+            )
+            priority = estimate["priority"]
 
-            # Queue image generation tasks
-            if generate_images:
-                image_tasks = []
+            task_ids = {"images": [], "voices": [], "videos": []}
+            workflows = []
+            if settings.ASYNC_MEDIA_GENERATION and (generate_images or generate_voices):
+                workflow, task_ids = QueueService.build_script_workflow(
+                    script,
+                    screens,
+                    user_id=user_id,
+                    generate_images=generate_images,
+                    generate_voices=generate_voices,
+                    generate_previews=generate_videos,
+                    priority=priority,
+                )
+                if workflow is not None:
+                    workflows.append(workflow)
+            else:
                 for screen in screens:
-                    # Create task signature without options parameter
-                    task_args = {
-                        "screen_id": str(screen.id),
-                        "media_type": "image",
-                        "user_id": user_id,
-                    }
-                    # Add to list (don't execute yet)
-                    image_tasks.append(
-                        generate_screen_media.signature(kwargs=task_args)
+                    workflow, components = QueueService.build_screen_workflow(
+                        screen,
+                        user_id=user_id,
+                        generate_image=generate_images,
+                        generate_voice=generate_voices,
+                        # A preview needs both an image and a voice to render from
+                        generate_preview=generate_videos
+                        and (generate_images or bool(screen.image))
+                        and (generate_voices or bool(screen.voice)),
+                        priority=priority,
                     )
-
-                # Create a group of tasks to execute in parallel (limited by worker concurrency)
-                if image_tasks:
-                    image_group = group(image_tasks)
-                    image_result = image_group.apply_async()
-                    task_ids["images"] = [task.id for task in image_result.children]
-
-                    # Update screen status for each task
-                    for i, screen in enumerate(screens):
-                        if i < len(task_ids["images"]):
-                            screen.status_data = screen.status_data or {}
-                            screen.status_data["images"] = {
-                                "status": "queued",
-                                "task_id": task_ids["images"][i],
-                            }
-                            screen.save(update_fields=["status_data"])
-
-            # Queue voice generation tasks
-            if generate_voices:
-                voice_tasks = []
-                for screen in screens:
-                    # Create task signature without options parameter
-                    task_args = {
-                        "screen_id": str(screen.id),
-                        "media_type": "voice",
-                        "user_id": user_id,
-                    }
-                    # Add to list (don't execute yet)
-                    voice_tasks.append(
-                        generate_screen_media.signature(kwargs=task_args)
+                    if workflow is not None:
+                        workflows.append(workflow)
+                    for component, key in (("images", "images"), ("voices", "voices"), ("preview", "videos")):
+                        if component in components:
+                            task_ids[key].append(components[component]["task_id"])
+
+            compile_signature = None
+            if create_final_video:
+                if workflows:
+                    compile_signature, compile_info = QueueService.build_compile_signature(
+                        script, user_id=user_id, priority=priority
                     )
+                    task_ids["final_video"] = compile_info["task_id"]
+                else:
+                    # Nothing to wait for, so an identical compile can be reused
+                    compile_result = QueueService.queue_script_compile(
+                        script_id, user_id=user_id, priority=priority
+                    )
+                    task_ids["final_video"] = compile_result.get("task_id")
 
-                # Create a group of tasks to execute in parallel
-                if voice_tasks:
-                    voice_group = group(voice_tasks)
-                    voice_result = voice_group.apply_async()
-                    task_ids["voices"] = [task.id for task in voice_result.children]
-
-                    # Update screen status for each task
-                    for i, screen in enumerate(screens):
-                        if i < len(task_ids["voices"]):
-                            screen.status_data = screen.status_data or {}
-                            screen.status_data["voices"] = {
-                                "status": "queued",
-                                "task_id": task_ids["voices"][i],
-                            }
-                            screen.save(update_fields=["status_data"])
-
-            # Queue video generation tasks (only if both image and voice are ready or being generated)
-            # if generate_videos:
-            #     video_tasks = []
-            #     for screen in screens:
-            #         # Only add video generation if image and voice are being generated or already exist
-            #         should_generate_video = (
-            #             (generate_images or screen.image) and
-            #             (generate_voices or screen.voice)
-            #         )
-
-            #         if should_generate_video:
-            #             # First, generate the preview
-            #             preview_task = generate_screen_preview.signature(
-            #                 kwargs={'screen_id': str(screen.id)},
-            #                 countdown=10
-            #             )
-            #             video_tasks.append(preview_task)
-
-            #     # Create a group of tasks to execute in sequence after media generation
-            #     if video_tasks:
-            #         # Videos need to wait for images and voices, so we use countdown
-            #         video_group = group(video_tasks)
-            #         # Longer countdown to ensure media generation is complete
-            #         video_result = video_group.apply_async(countdown=60)
-            #         task_ids['videos'] = [task.id for task in video_result.children]
-
-            #         # Update screen status for each task
-            #         for i, screen in enumerate(screens):
-            #             if i < len(task_ids['videos']):
-            #                 screen.status_data = screen.status_data or {}
-            #                 screen.status_data['video'] = {
-            #                     'status': 'queued',
-            #                     'task_id': task_ids['videos'][i]
-            #                 }
-            #                 screen.save(update_fields=['status_data'])
-
-            # Finally, if requested, create a task to generate the final video for the script
-            if video_options and video_options.get("create_final_video", False):
-                # Use compile_script_video task instead of generate_final_video
-                final_video_task = compile_script_video.signature(
-                    kwargs={"script_id": script_id},
-                )
-                final_result = final_video_task.apply_async()
-                task_ids["final_video"] = final_result.id
-
-                # Log that the final video compilation was queued
-                logger.info(f"Final video compilation queued for script {script_id}")
+            QueueService.run_workflow(script, workflows, compile_signature, user_id)
 
             return {
                 "status": "success",
                 "message": "Media generation tasks queued successfully",
                 "task_ids": task_ids,
+                "estimate": estimate,
             }
 
         except Script.DoesNotExist:
@@ -189,11 +158,373 @@ class QueueService:
                 "message": f"Error queueing media generation tasks: {str(e)}",
             }
 
+    @staticmethod
+    def build_screen_workflow(
+        screen: Screen,
+        user_id: Optional[str] = None,
+        generate_image: bool = True,
+        generate_voice: bool = True,
+        generate_preview: bool = True,
+        priority: Optional[int] = None,
+    ) -> Tuple[Optional[Signature], Dict[str, Dict[str, Any]]]:
+        """
+        Build the task workflow for a single screen.
+
+        Image and voice generation run in parallel as the header of a chord
+        whose body renders the preview, so the preview starts the moment
+        both inputs exist. Media generation goes to the io pool and the
+        preview to the bulk render pool, leaving the interactive pool free
+        for single-screen requests. The queued components are recorded in
+        the screen's status_data.
+
+        Media generation already in flight for the same inputs isn't queued
+        again: the component attaches to the running task's ID, and the
+        preview waits until that task has released its lock.
+
+        Args:
+            screen: The screen to build the workflow for
+            user_id: ID of the user running the tasks
+            generate_image: Whether to generate the image
+            generate_voice: Whether to generate the voice
+            generate_preview: Whether to render the preview
+            priority: Optional Celery priority for the tasks
+
+        Returns:
+            Tuple of the workflow signature (None if there is nothing to do)
+            and the queued components with their task IDs
+        """
+        from backend.workspaces.services.generation_lock_service import GenerationLockService
+
+        screen_id = str(screen.id)
+        screen.status_data = screen.status_data or {}
+        components = {}
+        queued = {}
+        media = []
+        in_flight = []
+
+        for enabled, media_type, component in (
+            (generate_image, "image", "images"),
+            (generate_voice, "voice", "voices"),
+        ):
+            if enabled:
+                task_id = str(uuid.uuid4())
+                input_hash = GenerationLockService.input_hash(screen, component)
+                owner, lock_key = GenerationLockService.acquire(
+                    screen, component, task_id, input_hash
+                )
+                if owner != task_id:
+                    logger.info(
+                        f"{component} for screen {screen_id} already in flight as task {owner}"
+                    )
+                    in_flight.append(lock_key)
+                    components[component] = {
+                        "status": screen.status_data.get(component, {}).get("status", "queued"),
+                        "task_id": owner,
+                        "deduplicated": True,
+                    }
+                    continue
+
+                media.append(
+                    generate_screen_media.si(screen_id, media_type, user_id, input_hash).set(
+                        task_id=task_id, priority=priority, queue=IO_QUEUE
+                    )
+                )
+                components[component] = {"status": "queued", "task_id": task_id}
+                queued[component] = {**components[component], "lock_key": lock_key}
+
+        preview = None
+        if generate_preview:
+            task_id = str(uuid.uuid4())
+            preview = generate_screen_preview.si(screen_id, in_flight).set(
+                task_id=task_id, priority=priority, queue=BULK_QUEUE
+            )
+            components["preview"] = {"status": "queued", "task_id": task_id}
+            queued["preview"] = components["preview"]
+
+        if queued:
+            screen.status_data.update(queued)
+            screen.save(update_fields=["status_data"])
+
+        if media and preview:
+            return chord(media, preview), components
+        if media:
+            return group(media), components
+        return preview, components
+
+    @staticmethod
+    def build_script_workflow(
+        script: Script,
+        screens,
+        user_id: Optional[str] = None,
+        generate_images: bool = True,
+        generate_voices: bool = True,
+        generate_previews: bool = True,
+        priority: Optional[int] = None,
+    ) -> Tuple[Optional[Signature], Dict[str, List[str]]]:
+        """
+        Build one workflow generating every screen's media in a single task.
+
+        The images and voices of all screens go to one
+        ``generate_script_media`` task, which drives the provider calls
+        concurrently from a single io worker slot. It queues each screen's
+        preview as soon as that screen's own media is done, rather than
+        after the whole run. Locks are taken and status_data is recorded as
+        in ``build_screen_workflow``, so per-screen requests attach to the
+        run and the status poll and cancel work unchanged.
+
+        Args:
+            script: The script the screens belong to
+            screens: The screens to generate media for
+            user_id: ID of the user running the tasks
+            generate_images: Whether to generate images
+            generate_voices: Whether to generate voices
+            generate_previews: Whether to render the screen previews
+            priority: Optional Celery priority for the tasks
+
+        Returns:
+            Tuple of the workflow signature (None if there is nothing to do)
+            and the task IDs per component
+        """
+        from backend.workspaces.services.generation_lock_service import GenerationLockService
+
+        task_id = str(uuid.uuid4())
+        task_ids = {"images": [], "voices": [], "videos": []}
+        jobs = []
+        previews = {}
+
+        for screen in screens:
+            screen_id = str(screen.id)
+            screen.status_data = screen.status_data or {}
+            queued = {}
+            in_flight = []
+
+            for enabled, component in ((generate_images, "images"), (generate_voices, "voices")):
+                if not enabled:
+                    continue
+                input_hash = GenerationLockService.input_hash(screen, component)
+                owner, lock_key = GenerationLockService.acquire(screen, component, task_id, input_hash)
+                task_ids[component].append(owner)
+                if owner != task_id:
+                    logger.info(f"{component} for screen {screen_id} already in flight as task {owner}")
+                    in_flight.append(lock_key)
+                    continue
+                jobs.append({"screen_id": screen_id, "component": component, "input_hash": input_hash})
+                queued[component] = {"status": "queued", "task_id": task_id, "lock_key": lock_key}
+
+            # A preview needs both an image and a voice to render from
+            if (
+                generate_previews
+                and (generate_images or bool(screen.image))
+                and (generate_voices or bool(screen.voice))
+            ):
+                preview_id = str(uuid.uuid4())
+                previews[screen_id] = generate_screen_preview.si(screen_id, in_flight).set(
+                    task_id=preview_id, priority=priority, queue=BULK_QUEUE
+                )
+                task_ids["videos"].append(preview_id)
+                queued["preview"] = {"status": "queued", "task_id": preview_id}
+
+            if queued:
+                screen.status_data.update(queued)
+                screen.save(update_fields=["status_data"])
+
+        if jobs:
+            media = generate_script_media.si(str(script.id), jobs, user_id, previews).set(
+                task_id=task_id, priority=priority, queue=IO_QUEUE
+            )
+            return media, task_ids
+        if previews:
+            return group(list(previews.values())), task_ids
+        return None, task_ids
+
+    @staticmethod
+    def build_compile_signature(
+        script: Script,
+        user_id: Optional[str] = None,
+        priority: Optional[int] = None,
+    ) -> Tuple[Signature, Dict[str, str]]:
+        """
+        Build the compile task for a script without queueing it.
+
+        The RenderJob is created up front with the task ID, so the task (or
+        a redelivery of it) finds its job when it runs.
+
+        Args:
+            script: The script to compile
+            user_id: ID of the user requesting the compile
+            priority: Optional Celery priority for the compile task
+
+        Returns:
+            Tuple of the compile signature and its task and render job IDs
+        """
+        from backend.video.models import RenderJob
+
+        task_id = str(uuid.uuid4())
+        render_job = RenderJob.objects.create(
+            script=script, task_id=task_id, created_by_id=user_id
+        )
+        signature = compile_script_video.si(str(script.id), user_id).set(
+            task_id=task_id, priority=priority
+        )
+        return signature, {"task_id": task_id, "render_job_id": str(render_job.id)}
+
+    @staticmethod
+    def run_workflow(
+        script: Script,
+        workflows: List[Signature],
+        compile_signature: Optional[Signature] = None,
+        user_id: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Submit screen workflows to the scheduler, with an optional compile.
+
+        Each screen workflow is scheduled as its own job so a large script
+        shares workers fairly with other workspaces, while still running as
+        many screens at once as the plan's screen caps allow. The compile is
+        queued once every screen workflow has finished.
+
+        Args:
+            script: Script the workflows belong to
+            workflows: Per-screen workflow signatures
+            compile_signature: Optional compile task to run after every screen
+            user_id: ID of the user submitting the work
+
+        Returns:
+            Dictionary with the scheduled job IDs
+        """
+        from backend.workspaces.services.scheduler_service import SchedulerService
+
+        user = User.objects.filter(id=user_id).first() if user_id else None
+        return SchedulerService.submit_batch(
+            workflows,
+            script.workspace,
+            user,
+            then=compile_signature,
+            label=f"Script {script.title}",
+            script_id=str(script.id),
+        )
+
+    @staticmethod
+    def queue_script_compile(
+        script_id: str,
+        user_id: Optional[str] = None,
+        priority: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        Queue the final video compile for a script, deduplicating requests.
+
+        If the script's inputs are already complete and match the latest
+        compiled output, or a compile with the same inputs is in flight, no
+        new task is queued and the existing job is returned instead.
+
+        Args:
+            script_id: ID of the script
+            user_id: ID of the user requesting the compile
+            priority: Optional Celery priority for the compile task
+
+        Returns:
+            Dictionary with the task ID, render job ID and whether the
+            request was deduplicated
+        """
+        from backend.video.services.compilation_service import (
+            compute_fingerprint,
+            find_matching_job,
+        )
+
+        try:
+            script = Script.objects.get(id=script_id)
+
+            fingerprint = compute_fingerprint(script)
+            match = find_matching_job(script, fingerprint)
+            if match is not None:
+                logger.info(
+                    f"Compile for script {script_id} matches render job {match.id}, not queueing"
+                )
+                return {
+                    "status": "success",
+                    "message": "An identical compile already exists",
+                    "task_id": match.task_id,
+                    "render_job_id": str(match.id),
+                    "deduplicated": True,
+                }
+
+            signature, compile_info = QueueService.build_compile_signature(
+                script, user_id=user_id, priority=priority
+            )
+            QueueService.run_workflow(script, [], signature, user_id)
+            logger.info(f"Final video compilation queued for script {script_id}")
+
+            return {
+                "status": "success",
+                "message": "Compile queued successfully",
+                **compile_info,
+                "deduplicated": False,
+            }
+
+        except Script.DoesNotExist:
+            logger.error(f"Script with ID {script_id} not found")
+            return {
+                "status": "error",
+                "message": f"Script with ID {script_id} not found",
+            }
+        except Exception as e:
+            logger.error(f"Error queueing compile: {str(e)}")
+            return {
+                "status": "error",
+                "message": f"Error queueing compile: {str(e)}",
+            }
+
+    @staticmethod
+    def get_task_states(task_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Read the result-backend state of many tasks at once.
+
+        Key-value result backends (Redis) are read with a single MGET, so a
+        poll costs one round trip however many tasks a script has. Other
+        backends fall back to one lookup per task.
+
+        Args:
+            task_ids: IDs of the tasks to look up
+
+        Returns:
+            Dictionary of task ID to its state and, for failed tasks, error
+        """
+        from celery import states
+        from config.celery_app import app
+
+        task_ids = list(dict.fromkeys(task_ids))
+        if not task_ids:
+            return {}
+
+        backend = app.backend
+        if not hasattr(backend, "mget"):
+            metas = [backend.get_task_meta(task_id) for task_id in task_ids]
+        else:
+            values = backend.mget([backend.get_key_for_task(task_id) for task_id in task_ids])
+            metas = [
+                backend.decode_result(value) if value else {"status": states.PENDING}
+                for value in values
+            ]
+
+        task_states = {}
+        for task_id, meta in zip(task_ids, metas):
+            task_state = {"task_status": meta.get("status", states.PENDING)}
+            if task_state["task_status"] == states.FAILURE:
+                task_state["error"] = str(backend.exception_to_python(meta.get("result")))
+            task_states[task_id] = task_state
+        return task_states
+
     @staticmethod
     def get_queue_status(script_id: str) -> Dict[str, Any]:
         """
         Get the status of all queued tasks for a script.
 
+        Screens are read in one query and their tasks' states in one
+        result-backend read. Components that were never queued and empty
+        fields are left out to keep the polled response small. The script's
+        place in the scheduler queue is served separately by
+        ``SchedulerService.get_workspace_status``, which is polled less often.
+
         Args:
             script_id: ID of the script
 
@@ -201,19 +532,28 @@ class QueueService:
             Dictionary with task status information
         """
         try:
-            script = Script.objects.get(id=script_id)
-            screens = Screen.objects.filter(script=script).order_by("scene")
-
-            if not screens.exists():
+            script = Script.objects.only("id").get(id=script_id)
+            screens = list(
+                Screen.objects.filter(script=script)
+                .order_by("scene")
+                .only("id", "name", "scene", "status", "status_data")
+            )
+
+            if not screens:
                 return {
                     "status": "error",
                     "message": "No screens found for this script",
                 }
 
-            from celery.result import AsyncResult
+            components = ("images", "voices", "preview", "video")
+            task_states = QueueService.get_task_states([
+                screen.status_data[component]["task_id"]
+                for screen in screens
+                for component in components
+                if (screen.status_data or {}).get(component, {}).get("task_id")
+            ])
 
             screens_status = []
-
             for screen in screens:
                 screen_status = {
                     "id": str(screen.id),
@@ -223,31 +563,19 @@ class QueueService:
                     "components": {},
                 }
 
-                # Get status for each component
-                for component in ["images", "voices", "video"]:
-                    component_status = {
-                        "status": "pending",
-                        "task_id": None,
-                        "task_status": None,
-                        "error": None,
-                    }
-
-                    # If status_data exists for this component
-                    if screen.status_data and component in screen.status_data:
-                        component_data = screen.status_data[component]
-                        component_status["status"] = component_data.get(
-                            "status", "pending"
-                        )
-                        component_status["task_id"] = component_data.get("task_id")
+                for component in components:
+                    component_data = (screen.status_data or {}).get(component)
+                    if not component_data:
+                        continue
 
-                        # If there's a task ID, get its status
-                        if component_status["task_id"]:
-                            task_result = AsyncResult(component_status["task_id"])
-                            component_status["task_status"] = task_result.status
-
-                            # If the task failed, get the error
-                            if task_result.failed():
-                                component_status["error"] = str(task_result.result)
+                    component_status = {"status": component_data.get("status", "pending")}
+                    task_id = component_data.get("task_id")
+                    if task_id:
+                        component_status["task_id"] = task_id
+                        component_status.update(task_states.get(task_id, {}))
+                    # Timestamp at which a rate-limited task retries
+                    if component_data.get("retry_after"):
+                        component_status["retry_after"] = component_data["retry_after"]
 
                     screen_status["components"][component] = component_status
 
@@ -275,7 +603,14 @@ class QueueService:
     @staticmethod
     def cancel_queued_tasks(script_id: str) -> Dict[str, Any]:
         """
-        Cancel all queued tasks for a script.
+        Cancel all queued and running tasks for a script.
+
+        The script's scheduled jobs and batch barriers are removed first, so
+        no further stage (such as the final compile) is dispatched. Every
+        active task of the script is then revoked with a single broadcast,
+        and the screens and render jobs are marked cancelled with one bulk
+        update each. Tasks that still start check the cancelled status and
+        exit.
 
         Args:
             script_id: ID of the script
@@ -284,48 +619,55 @@ class QueueService:
             Dictionary with cancellation results
         """
         try:
-            script = Script.objects.get(id=script_id)
-            screens = Screen.objects.filter(script=script)
+            from config.celery_app import app
+            from backend.video.models import RenderJob
+            from backend.workspaces.services.generation_lock_service import GenerationLockService
+            from backend.workspaces.services.scheduler_service import SchedulerService
 
-            if not screens.exists():
+            script = Script.objects.only("id", "workspace_id").get(id=script_id)
+            screens = list(Screen.objects.filter(script=script).only("id", "status_data"))
+
+            if not screens:
                 return {
                     "status": "error",
                     "message": "No screens found for this script",
                 }
 
-            from celery.result import AsyncResult
-
-            cancelled_tasks = 0
-            failed_cancellations = 0
+            # Stop the scheduler first so no further stage is dispatched
+            scheduled = SchedulerService.cancel_script(str(script.workspace_id), str(script.id))
 
+            task_ids = []
+            cancelled_screens = []
             for screen in screens:
-                if not screen.status_data:
-                    continue
+                cancelled = False
+                for component_data in (screen.status_data or {}).values():
+                    if not isinstance(component_data, dict):
+                        continue
+                    if component_data.get("status") in CANCELLABLE_STATUSES:
+                        component_data["status"] = "cancelled"
+                        cancelled = True
+                        if component_data.get("task_id"):
+                            task_ids.append(component_data["task_id"])
+                if cancelled:
+                    cancelled_screens.append(screen)
+
+            render_jobs = RenderJob.objects.filter(script=script, status__in=["pending", "running"])
+            task_ids.extend(task_id for task_id in render_jobs.values_list("task_id", flat=True) if task_id)
+            render_jobs.update(status="cancelled", updated_at=timezone.now())
+            Screen.objects.bulk_update(cancelled_screens, ["status_data"])
+
+            failed_cancellations = 0
+            if task_ids:
+                try:
+                    app.control.revoke(task_ids, terminate=True)
+                except Exception as e:
+                    logger.error(f"Error revoking tasks of script {script_id}: {str(e)}")
+                    failed_cancellations = len(task_ids)
 
-                for component in ["images", "voices", "video"]:
-                    if (
-                        component in screen.status_data
-                        and "task_id" in screen.status_data[component]
-                    ):
-                        task_id = screen.status_data[component]["task_id"]
-                        task_result = AsyncResult(task_id)
-
-                        # Only cancel pending or started tasks
-                        if task_result.state in ["PENDING", "STARTED", "RETRY"]:
-                            try:
-                                task_result.revoke(terminate=True)
-
-                                # Update status
-                                screen.status_data[component]["status"] = "cancelled"
-                                screen.save(update_fields=["status_data"])
-
-                                cancelled_tasks += 1
-                            except Exception as e:
-                                logger.error(
-                                    f"Error cancelling task {task_id}: {str(e)}"
-                                )
-                                failed_cancellations += 1
+            # Let the next request start new generation tasks
+            GenerationLockService.release_screens(cancelled_screens)
 
+            cancelled_tasks = scheduled["queued"] + len(task_ids) - failed_cancellations
             return {
                 "status": "success",
                 "message": f"Cancelled {cancelled_tasks} tasks, failed to cancel {failed_cancellations} tasks",
@@ -0,0 +1,535 @@
+"""
+Fair-share scheduler in front of the Celery queues.
+
+Jobs are not sent to Celery when they are submitted. They are held in a
+Redis list per workspace, and a ring of workspaces with queued jobs is
+walked round-robin to pick the next job to dispatch. A job is only
+dispatched while its workspace and its user are below the concurrency caps
+of their subscription plans, so one large batch can't fill the worker
+queues ahead of everyone else.
+
+A batch submits one job per screen, so the caps count screens in flight:
+a large script still generates many screens in parallel, up to its cap,
+while other workspaces keep getting turns.
+
+Each dispatched job holds a lease in the running sets of its workspace and
+user until its workflow finishes and releases it. Leases expire after
+``SCHEDULER_LEASE_SECONDS`` so a lost job can't hold a slot forever.
+"""
+
+import json
+import time
+import uuid
+import logging
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+
+from backend.utils.redis_client import get_redis, register_script
+
+logger = logging.getLogger(__name__)
+
+# Caps used when a plan doesn't define them
+DEFAULT_USER_CAP = 8
+DEFAULT_WORKSPACE_CAP = 16
+
+# Barriers (follow-up jobs waiting for a batch) are dropped after a day
+BARRIER_TTL = 60 * 60 * 24
+
+# Queued jobs of a workspace looked at per dispatch when its oldest jobs
+# belong to users at their cap
+DISPATCH_SCAN_DEPTH = 100
+
+# KEYS: ring, tenants, queue  ARGV: workspace_id, payload
+_SUBMIT = register_script("""
+redis.call('RPUSH', KEYS[3], ARGV[2])
+if redis.call('SADD', KEYS[2], ARGV[1]) == 1 then
+    redis.call('RPUSH', KEYS[1], ARGV[1])
+end
+return redis.call('LLEN', KEYS[3])
+""")
+
+# KEYS: ring, tenants, jobs  ARGV: prefix, now, lease_expires, scan_depth
+# Rotates the ring until a workspace with a dispatchable job is found;
+# returns that job, or nil if every workspace is at its caps. Within a
+# workspace the oldest job of a user below their cap is taken, so a capped
+# user's jobs don't hold back the other members.
+_DISPATCH = register_script("""
+local prefix = ARGV[1]
+local now = tonumber(ARGV[2])
+local count = redis.call('LLEN', KEYS[1])
+for i = 1, count do
+    local tenant = redis.call('RPOPLPUSH', KEYS[1], KEYS[1])
+    if not tenant then
+        return nil
+    end
+    local queue = prefix .. ':queue:' .. tenant
+    local payloads = redis.call('LRANGE', queue, 0, tonumber(ARGV[4]) - 1)
+    if #payloads == 0 then
+        redis.call('LREM', KEYS[1], 0, tenant)
+        redis.call('SREM', KEYS[2], tenant)
+    else
+        local workspace_running = prefix .. ':running:workspace:' .. tenant
+        redis.call('ZREMRANGEBYSCORE', workspace_running, '-inf', now)
+        local workspace_count = redis.call('ZCARD', workspace_running)
+        local capped_users = {}
+        for _, payload in ipairs(payloads) do
+            local job = cjson.decode(payload)
+            if workspace_count >= tonumber(job['workspace_cap']) then
+                break
+            end
+            local user_running = prefix .. ':running:user:' .. job['user_id']
+            if not capped_users[job['user_id']] then
+                redis.call('ZREMRANGEBYSCORE', user_running, '-inf', now)
+                if redis.call('ZCARD', user_running) < tonumber(job['user_cap']) then
+                    redis.call('LREM', queue, 1, payload)
+                    redis.call('ZADD', workspace_running, ARGV[3], job['job_id'])
+                    redis.call('ZADD', user_running, ARGV[3], job['job_id'])
+                    if redis.call('LLEN', queue) == 0 then
+                        redis.call('LREM', KEYS[1], 0, tenant)
+                        redis.call('SREM', KEYS[2], tenant)
+                    end
+                    job['signature'] = nil
+                    job['lease_expires'] = tonumber(ARGV[3])
+                    redis.call('HSET', KEYS[3], job['job_id'], cjson.encode(job))
+                    return payload
+                end
+                capped_users[job['user_id']] = true
+            end
+        end
+    end
+end
+return nil
+""")
+
+# KEYS: jobs  ARGV: prefix, job_id
+# Frees the job's slots. Returns false if the job was already released, the
+# follow-up job if this was the last job of its batch, or an empty string.
+_RELEASE = register_script("""
+local prefix = ARGV[1]
+local meta = redis.call('HGET', KEYS[1], ARGV[2])
+if not meta then
+    return false
+end
+redis.call('HDEL', KEYS[1], ARGV[2])
+local job = cjson.decode(meta)
+redis.call('ZREM', prefix .. ':running:workspace:' .. job['workspace_id'], ARGV[2])
+redis.call('ZREM', prefix .. ':running:user:' .. job['user_id'], ARGV[2])
+local barrier = job['barrier']
+if type(barrier) == 'string' and barrier ~= '' then
+    local barrier_key = prefix .. ':barrier:' .. barrier
+    if redis.call('DECR', barrier_key) <= 0 then
+        local follow_up = redis.call('GET', barrier_key .. ':job')
+        redis.call('DEL', barrier_key, barrier_key .. ':job')
+        return follow_up or ''
+    end
+end
+return ''
+""")
+
+# KEYS: queue, jobs  ARGV: prefix, script_id
+# Drops the script's queued jobs, frees the slots of its dispatched jobs and
+# deletes the barriers of its batches, so their follow-up jobs never queue.
+# Returns the number of queued and of dispatched jobs removed.
+_CANCEL = register_script("""
+local prefix = ARGV[1]
+local barriers = {}
+local queued = 0
+local running = 0
+for _, payload in ipairs(redis.call('LRANGE', KEYS[1], 0, -1)) do
+    local job = cjson.decode(payload)
+    if job['script_id'] == ARGV[2] then
+        redis.call('LREM', KEYS[1], 1, payload)
+        barriers[#barriers + 1] = job['barrier']
+        queued = queued + 1
+    end
+end
+local jobs = redis.call('HGETALL', KEYS[2])
+for i = 1, #jobs, 2 do
+    local job = cjson.decode(jobs[i + 1])
+    if job['script_id'] == ARGV[2] then
+        redis.call('HDEL', KEYS[2], jobs[i])
+        redis.call('ZREM', prefix .. ':running:workspace:' .. job['workspace_id'], jobs[i])
+        redis.call('ZREM', prefix .. ':running:user:' .. job['user_id'], jobs[i])
+        barriers[#barriers + 1] = job['barrier']
+        running = running + 1
+    end
+end
+for _, barrier in ipairs(barriers) do
+    if type(barrier) == 'string' and barrier ~= '' then
+        local barrier_key = prefix .. ':barrier:' .. barrier
+        redis.call('DEL', barrier_key, barrier_key .. ':job')
+    end
+end
+return {queued, running}
+""")
+
+
+def _key(*parts: str) -> str:
+    """Build a scheduler key under the configured prefix."""
+    return ":".join((settings.SCHEDULER_KEY_PREFIX,) + parts)
+
+
+class SchedulerService:
+    """Service for fair-share scheduling of jobs across workspaces."""
+
+    @staticmethod
+    def get_caps(workspace, user=None) -> Dict[str, int]:
+        """
+        Get the concurrency caps for a job.
+
+        The user cap comes from the submitting user's plan, the workspace
+        cap from the workspace owner's plan.
+
+        Args:
+            workspace: Workspace the job belongs to
+            user: Optional user submitting the job (defaults to the owner)
+
+        Returns:
+            Dictionary with user_cap and workspace_cap
+        """
+        owner_features = workspace.owner.get_subscription_features()
+        user_features = user.get_subscription_features() if user else owner_features
+        return {
+            "user_cap": int(user_features.get("max_concurrent_screens", DEFAULT_USER_CAP)),
+            "workspace_cap": int(
+                owner_features.get("max_workspace_concurrent_screens", DEFAULT_WORKSPACE_CAP)
+            ),
+        }
+
+    @staticmethod
+    def build_job(
+        signature,
+        workspace,
+        user=None,
+        label: str = "",
+        script_id: Optional[str] = None,
+        barrier: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Build the payload of a scheduled job.
+
+        Args:
+            signature: Celery signature or canvas to run when dispatched
+            workspace: Workspace the job belongs to
+            user: Optional user submitting the job
+            label: Short description shown in queue status
+            script_id: Optional ID of the script the job works on
+            barrier: Optional ID of the batch the job belongs to
+
+        Returns:
+            The job payload
+        """
+        return {
+            "job_id": str(uuid.uuid4()),
+            "workspace_id": str(workspace.id),
+            "user_id": str(user.id if user else workspace.owner_id),
+            "script_id": script_id,
+            "label": label,
+            "barrier": barrier or "",
+            "submitted_at": time.time(),
+            **SchedulerService.get_caps(workspace, user),
+            "signature": dict(signature),
+        }
+
+    @staticmethod
+    def submit(
+        signature,
+        workspace,
+        user=None,
+        label: str = "",
+        script_id: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Queue a single job for a workspace and dispatch what fits.
+
+        Args:
+            signature: Celery signature or canvas to run
+            workspace: Workspace the job belongs to
+            user: Optional user submitting the job
+            label: Short description shown in queue status
+            script_id: Optional ID of the script the job works on
+
+        Returns:
+            Dictionary with the job ID and its position in the workspace queue
+        """
+        job = SchedulerService.build_job(signature, workspace, user, label, script_id)
+        length = SchedulerService._enqueue(job)
+        SchedulerService.dispatch()
+        return {"job_id": job["job_id"], "workspace_position": length}
+
+    @staticmethod
+    def submit_batch(
+        signatures: List,
+        workspace,
+        user=None,
+        then=None,
+        label: str = "",
+        script_id: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Queue a batch of jobs, with an optional job to run after all of them.
+
+        Every signature becomes its own job taking one slot, so a batch runs
+        up to its caps in parallel and competes for further slots one job
+        at a time. The follow-up job is queued by whichever
+        job of the batch releases last.
+
+        Args:
+            signatures: Celery signatures or canvases to run
+            workspace: Workspace the jobs belong to
+            user: Optional user submitting the jobs
+            then: Optional signature to queue once every job has finished
+            label: Short description shown in queue status
+            script_id: Optional ID of the script the jobs work on
+
+        Returns:
+            Dictionary with the job IDs and the follow-up job ID
+        """
+        if not signatures:
+            if then is None:
+                return {"job_ids": [], "then_job_id": None}
+            result = SchedulerService.submit(then, workspace, user, f"{label} (final)", script_id)
+            return {"job_ids": [], "then_job_id": result["job_id"]}
+
+        barrier = None
+        then_job_id = None
+        if then is not None:
+            barrier = str(uuid.uuid4())
+            then_job = SchedulerService.build_job(
+                then, workspace, user, f"{label} (final)", script_id
+            )
+            then_job_id = then_job["job_id"]
+            barrier_key = _key("barrier", barrier)
+            pipe = get_redis().pipeline()
+            pipe.set(barrier_key, len(signatures), ex=BARRIER_TTL)
+            pipe.set(f"{barrier_key}:job", json.dumps(then_job), ex=BARRIER_TTL)
+            pipe.execute()
+
+        job_ids = []
+        for signature in signatures:
+            job = SchedulerService.build_job(
+                signature, workspace, user, label, script_id, barrier
+            )
+            SchedulerService._enqueue(job)
+            job_ids.append(job["job_id"])
+
+        SchedulerService.dispatch()
+        return {"job_ids": job_ids, "then_job_id": then_job_id}
+
+    @staticmethod
+    def dispatch(limit: int = 100) -> int:
+        """
+        Send queued jobs to Celery round-robin until every workspace is capped.
+
+        Args:
+            limit: Maximum number of jobs to dispatch in one call
+
+        Returns:
+            Number of jobs dispatched
+        """
+        from celery import signature as celery_signature
+        from backend.workspaces.tasks import release_scheduled_job
+
+        dispatched = 0
+        while dispatched < limit:
+            now = time.time()
+            payload = _DISPATCH(
+                keys=[_key("ring"), _key("tenants"), _key("jobs")],
+                args=[
+                    settings.SCHEDULER_KEY_PREFIX,
+                    now,
+                    now + settings.SCHEDULER_LEASE_SECONDS,
+                    DISPATCH_SCAN_DEPTH,
+                ],
+            )
+            if not payload:
+                break
+
+            job = json.loads(payload)
+            release = release_scheduled_job.si(job["job_id"]).set(priority=0)
+            try:
+                workflow = celery_signature(job["signature"]) | release
+                workflow.on_error(release)
+                workflow.apply_async()
+                dispatched += 1
+                logger.info(
+                    f"Dispatched job {job['job_id']} ({job['label']}) for workspace {job['workspace_id']}"
+                )
+            except Exception as e:
+                logger.error(f"Error dispatching job {job['job_id']}: {str(e)}")
+                SchedulerService.release(job["job_id"], dispatch_next=False)
+        return dispatched
+
+    @staticmethod
+    def release(job_id: str, dispatch_next: bool = True) -> bool:
+        """
+        Free the slots held by a finished job.
+
+        Releasing is idempotent, so the job can be released by both its
+        success and error callbacks.
+
+        Args:
+            job_id: ID of the scheduled job
+            dispatch_next: Whether to dispatch queued jobs into the freed slots
+
+        Returns:
+            bool: True if the job held slots, False if already released
+        """
+        result = _RELEASE(keys=[_key("jobs")], args=[settings.SCHEDULER_KEY_PREFIX, job_id])
+        if result is None:
+            return False
+
+        if result:
+            # Last job of a batch: queue the job waiting for it
+            SchedulerService._enqueue(json.loads(result))
+
+        if dispatch_next:
+            SchedulerService.dispatch()
+        return True
+
+    @staticmethod
+    def expire_leases() -> int:
+        """
+        Release dispatched jobs whose lease has run out.
+
+        Returns:
+            Number of jobs released
+        """
+        redis = get_redis()
+        now = time.time()
+        expired = [
+            job_id
+            for job_id, meta in redis.hscan_iter(_key("jobs"))
+            if json.loads(meta).get("lease_expires", 0) < now
+        ]
+        for job_id in expired:
+            logger.warning(f"Lease of scheduled job {job_id} expired, releasing it")
+            SchedulerService.release(job_id, dispatch_next=False)
+        return len(expired)
+
+    @staticmethod
+    def refresh_generation_locks() -> int:
+        """
+        Renew the generation locks of scripts with queued or dispatched jobs.
+
+        Locks are taken when a job is submitted, and a job can wait longer
+        than ``GENERATION_LOCK_QUEUED_TTL`` behind other workspaces. Renewing
+        them keeps repeat requests attached to the waiting job instead of
+        queueing a duplicate generation.
+
+        Returns:
+            Number of locks renewed
+        """
+        from backend.workspaces.models import Screen
+        from backend.workspaces.services.generation_lock_service import GenerationLockService
+
+        redis = get_redis()
+        pipe = redis.pipeline()
+        for tenant in redis.lrange(_key("ring"), 0, -1):
+            pipe.lrange(_key("queue", tenant), 0, -1)
+        payloads = [payload for queue in pipe.execute() for payload in queue]
+        payloads.extend(redis.hvals(_key("jobs")))
+
+        script_ids = {json.loads(payload).get("script_id") for payload in payloads} - {None}
+        if not script_ids:
+            return 0
+        screens = Screen.objects.filter(script_id__in=script_ids).only("id", "status_data")
+        return GenerationLockService.refresh_screens(screens)
+
+    @staticmethod
+    def cancel_script(workspace_id: str, script_id: str) -> Dict[str, int]:
+        """
+        Remove all scheduled work of a script in one atomic step.
+
+        Queued jobs are dropped, dispatched jobs give up their slots, and
+        the barriers of the script's batches are deleted so a compile
+        waiting for them is never queued.
+
+        Args:
+            workspace_id: ID of the workspace the script belongs to
+            script_id: ID of the script
+
+        Returns:
+            Dictionary with the number of queued and running jobs removed
+        """
+        queued, running = _CANCEL(
+            keys=[_key("queue", str(workspace_id)), _key("jobs")],
+            args=[settings.SCHEDULER_KEY_PREFIX, str(script_id)],
+        )
+        if running:
+            # Hand the freed slots to other jobs
+            SchedulerService.dispatch()
+        return {"queued": queued, "running": running}
+
+    @staticmethod
+    def get_workspace_status(workspace_id: str, script_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Get the running and queued jobs of a workspace with queue positions.
+
+        The position of a queued job is the number of jobs that will be
+        dispatched before it under round-robin, plus one: at most one job
+        per turn from each other workspace, in ring order.
+
+        Args:
+            workspace_id: ID of the workspace
+            script_id: Optional ID of a script to list the queued jobs of
+
+        Returns:
+            Dictionary with running and queued job information
+        """
+        try:
+            redis = get_redis()
+            workspace_id = str(workspace_id)
+            # RPOPLPUSH takes from the tail, so the tail is served next
+            ring = list(reversed(redis.lrange(_key("ring"), 0, -1)))
+            queue = redis.lrange(_key("queue", workspace_id), 0, -1)
+
+            pipe = redis.pipeline()
+            for tenant in ring:
+                pipe.llen(_key("queue", tenant))
+            lengths = dict(zip(ring, pipe.execute()))
+            running = redis.zcount(_key("running", "workspace", workspace_id), time.time(), "+inf")
+
+            served_before = ring.index(workspace_id) if workspace_id in ring else len(ring)
+            queued = []
+            for index, payload in enumerate(queue):
+                job = json.loads(payload)
+                if script_id and job.get("script_id") != str(script_id):
+                    continue
+                # Each other workspace gets one turn per turn of ours, plus one
+                # more if it comes before us in the ring
+                ahead = index + sum(
+                    min(length, index + (1 if position < served_before else 0))
+                    for position, (tenant, length) in enumerate(lengths.items())
+                    if tenant != workspace_id
+                )
+                queued.append({
+                    "job_id": job["job_id"],
+                    "label": job["label"],
+                    "script_id": job.get("script_id"),
+                    "workspace_position": index + 1,
+                    "position": ahead + 1,
+                })
+
+            return {
+                "status": "success",
+                "workspace_id": workspace_id,
+                "running": running,
+                "queued": queued,
+                "workspaces_waiting": len(ring),
+            }
+        except Exception as e:
+            logger.error(f"Error getting scheduler status: {str(e)}")
+            return {
+                "status": "error",
+                "message": f"Error getting scheduler status: {str(e)}",
+            }
+
+    @staticmethod
+    def _enqueue(job: Dict[str, Any]) -> int:
+        """Append a job to its workspace queue and add the workspace to the ring."""
+        return _SUBMIT(
+            keys=[_key("ring"), _key("tenants"), _key("queue", job["workspace_id"])],
+            args=[job["workspace_id"], json.dumps(job)],
+        )
@@ -6,6 +6,7 @@ import logging
 import os
 from typing import List, Dict, Optional, Tuple
 
+from django.conf import settings
 from django.db import transaction
 from django.contrib.auth import get_user_model
 
@@ -146,8 +147,90 @@ class ScreenService:
         translated_screen.scene_data = scene_data
         translated_screen.save(update_fields=['scene_data'])
         
+        # Translations keep the original's visuals
+        user = request.user if request is not None and request.user.is_authenticated else None
+        if ScreenService.reuse_original_image(translated_screen, user):
+            ScreenService.update_screen_status(str(translated_screen.id), 'images', 'completed')
+        
         return translated_screen
     
+    @staticmethod
+    def find_original_image(screen: Screen) -> Optional[Media]:
+        """
+        Find the image of the screen a translated screen was made from.
+        
+        A screen is a translation if it was created by
+        ``create_translated_screen``, or if its script is a translation of
+        another script, whose screen for the same scene is then used.
+        
+        Args:
+            screen: The screen to find the original image for
+            
+        Returns:
+            The original screen's image, or None if the screen isn't a
+            translation or its original has no image
+        """
+        translation = (screen.scene_data or {}).get('translation_metadata') or {}
+        original = None
+        if translation.get('original_screen_id'):
+            original = Screen.objects.filter(id=translation['original_screen_id']).select_related('image').first()
+        elif screen.script_id and screen.script.original_script_id:
+            original = (
+                Screen.objects.filter(
+                    script_id=screen.script.original_script_id,
+                    scene=screen.scene,
+                    image__isnull=False,
+                )
+                .exclude(scene_data__has_key='translation_metadata')
+                .select_related('image')
+                .order_by('id')
+                .first()
+            )
+        
+        if original is None or original.image is None:
+            return None
+        if not os.path.exists(os.path.join(settings.MEDIA_ROOT, original.image.file.name)):
+            return None
+        return original.image
+    
+    @staticmethod
+    def reuse_original_image(screen: Screen, user=None) -> bool:
+        """
+        Give a translated screen a copy of its original's image.
+        
+        Translations only change the narration, so their visuals are never
+        generated again.
+        
+        Args:
+            screen: The screen to link the image to
+            user: The user the image is for
+            
+        Returns:
+            True if the original image was reused, False otherwise
+        """
+        from backend.ai.services import media_cache
+        from backend.ai.services.image_service import ImageService
+        
+        original_image = ScreenService.find_original_image(screen)
+        if original_image is None:
+            return False
+        
+        params = original_image.metadata.get('generation_params', {})
+        ImageService.record_usage(
+            user,
+            params.get('size', '1024x1024'),
+            params.get('quality', 'standard'),
+            params.get('style', 'vivid'),
+            has_script_context=bool(original_image.metadata.get('script_context')),
+            cached_media=original_image,
+        )
+        screen.image = media_cache.clone(
+            original_image, screen.workspace, f"Image for {screen.name}", user
+        )
+        screen.save(update_fields=['image', 'updated_at'])
+        logger.info(f"Reused image {original_image.id} of the original of screen {screen.id}")
+        return True
+    
     @staticmethod
     def update_screen_status(screen_id: str, component: str, status: str, error_info: Optional[Dict] = None) -> bool:
         """
@@ -190,6 +273,9 @@ class ScreenService:
             # Save the screen
             screen.save(update_fields=['status_data', 'error_message' if error_info else 'status_data'])
             
+            if status == 'completed' and component in ('images', 'voices'):
+                ScreenService.mark_ready_if_complete(screen)
+            
             return True
         
         except Screen.DoesNotExist:
@@ -199,6 +285,34 @@ class ScreenService:
             logger.error(f"Error updating screen status: {str(e)}")
             return False
     
+    @staticmethod
+    def mark_ready_if_complete(screen: Screen) -> bool:
+        """
+        Mark a screen whose media just completed as ready to render.
+
+        Screens with both an image and a voice become ready, which raises
+        the event that queues their render. Screens whose workflow already
+        queued a preview, or that are already ready or rendering, are left
+        alone.
+
+        Args:
+            screen: The screen whose image or voice completed
+
+        Returns:
+            True if the screen was marked as ready, False otherwise
+        """
+        from backend.video.services import screen_events
+
+        preview = (screen.status_data or {}).get('preview') or {}
+        if (
+            not (screen.image_id and screen.voice_id)
+            or screen.status in ('ready', 'processing')
+            or preview.get('status') in ('queued', 'processing')
+        ):
+            return False
+        screen_events.mark_ready(screen)
+        return True
+    
     @staticmethod
     def create_screens_from_script(script: Script, user=None) -> Tuple[List[Screen], List[Dict]]:
         """
@@ -0,0 +1,385 @@
+"""
+Generation of a whole script's screen media in one async run.
+
+Instead of one Celery task per screen and component, each blocking a
+worker slot while it waits on the provider, ``generate_script_media``
+hands every image and voice of a script to ``AsyncMediaGenerator`` at once.
+Each result is written to its Media, screen and status as soon as it
+arrives, and a screen's preview is queued the moment its own image and
+voice are done, so previews and progress updates don't wait for the whole
+batch.
+"""
+
+import asyncio
+import logging
+import os
+import uuid
+from typing import Any, Dict, List, Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+
+from backend.ai.services import media_cache
+from backend.channels.utils import send_progress_update
+from backend.workspaces.models import Media, Screen
+from backend.workspaces.services.generation_lock_service import GenerationLockService
+from backend.workspaces.services.screen_service import ScreenService
+
+User = get_user_model()
+logger = logging.getLogger(__name__)
+
+# Default voice and model, as used by Screen.generate_voice
+DEFAULT_VOICE_ID = "nPczCjzI2devNBz1zQrb"
+DEFAULT_VOICE_MODEL = "eleven_multilingual_v2"
+
+TASK_TYPES = {"images": "image_generation", "voices": "voice_generation"}
+
+
+class ScriptMediaService:
+    """Service for generating many screens' media concurrently."""
+
+    @staticmethod
+    def generate(
+        jobs: List[Dict[str, str]],
+        user_id: Optional[str] = None,
+        task_id: Optional[str] = None,
+        previews: Optional[Dict[str, Dict[str, Any]]] = None,
+    ) -> Dict[str, int]:
+        """
+        Generate screen media concurrently and save each result as it arrives.
+
+        Every job holds its generation lock, taken under ``task_id`` when the
+        run was queued, until its media is saved. Each screen's preview is
+        queued as soon as all of that screen's jobs have finished.
+
+        Args:
+            jobs: Dicts with the ``screen_id``, ``component`` ('images' or
+                'voices') and ``input_hash`` of each generation
+            user_id: ID of the user whose API keys and usage to use
+            task_id: ID of the task running the generation
+            previews: Preview task signatures to queue, by screen ID
+
+        Returns:
+            Number of jobs per outcome (completed, failed, cancelled, skipped)
+        """
+        return asyncio.run(ScriptMediaService._generate(jobs, user_id, task_id, previews or {}))
+
+    @staticmethod
+    async def _generate(jobs, user_id, task_id, previews) -> Dict[str, int]:
+        from backend.ai.services.async_generation import AsyncMediaGenerator
+
+        user, screens = await sync_to_async(ScriptMediaService._load)(jobs, user_id)
+        lock_keys = [
+            GenerationLockService.lock_key(job["screen_id"], job["component"], job["input_hash"])
+            for job in jobs
+            if job.get("input_hash")
+        ]
+        heartbeat = asyncio.create_task(ScriptMediaService._heartbeat(lock_keys, task_id))
+
+        generator = AsyncMediaGenerator(
+            openai_api_key=user.openai_api_key if user else None,
+            elevenlabs_api_key=user.elevenlabs_api_key if user else None,
+        )
+        screen_jobs: Dict[str, List[Dict[str, str]]] = {screen_id: [] for screen_id in previews}
+        for job in jobs:
+            screen_jobs.setdefault(job["screen_id"], []).append(job)
+
+        try:
+            async with generator:
+                screen_outcomes = await asyncio.gather(
+                    *(
+                        ScriptMediaService._run_screen(
+                            generator, screens.get(screen_id), jobs_, user, task_id, previews.get(screen_id)
+                        )
+                        for screen_id, jobs_ in screen_jobs.items()
+                    )
+                )
+        finally:
+            heartbeat.cancel()
+            await sync_to_async(ScriptMediaService._close_connections)()
+
+        counts: Dict[str, int] = {}
+        for outcomes in screen_outcomes:
+            for outcome in outcomes:
+                counts[outcome] = counts.get(outcome, 0) + 1
+        logger.info(f"Generated media for {len(jobs)} jobs in one run: {counts}")
+        return counts
+
+    @staticmethod
+    async def _run_screen(
+        generator, screen: Optional[Screen], jobs: List[Dict[str, str]], user, task_id, preview
+    ) -> List[str]:
+        """Generate one screen's components, then queue its preview."""
+        outcomes = await asyncio.gather(
+            *(ScriptMediaService._run_job(generator, screen, job, user, task_id) for job in jobs)
+        )
+        if preview:
+            await asyncio.to_thread(ScriptMediaService._queue_preview, preview)
+        return outcomes
+
+    @staticmethod
+    async def _run_job(generator, screen: Optional[Screen], job: Dict[str, str], user, task_id) -> str:
+        """Generate and save one screen component, returning its outcome."""
+        from backend.ai.services.rate_limiter import RateLimitExceeded
+
+        if screen is None:
+            return "skipped"
+
+        component = job["component"]
+        lock_key = (
+            GenerationLockService.lock_key(job["screen_id"], component, job["input_hash"])
+            if job.get("input_hash")
+            else None
+        )
+        try:
+            if await sync_to_async(ScriptMediaService._is_cancelled)(screen.id, component, task_id):
+                return "cancelled"
+
+            await sync_to_async(ScriptMediaService._set_status)(screen, component, "processing", task_id)
+            if component == "images":
+                await ScriptMediaService._generate_image(generator, screen, user)
+            else:
+                await ScriptMediaService._generate_voice(generator, screen, user)
+            await sync_to_async(ScriptMediaService._set_status)(screen, component, "completed", task_id)
+            return "completed"
+        except RateLimitExceeded as e:
+            error_info = e.args[1]["error"]
+        except Exception as e:
+            logger.error(f"Error generating {component} for screen {screen.id}: {str(e)}")
+            error_info = {"message": str(e), "error_type": "exception"}
+        finally:
+            await asyncio.to_thread(GenerationLockService.release, lock_key, task_id)
+
+        await sync_to_async(ScriptMediaService._set_status)(screen, component, "failed", task_id, error_info)
+        return "failed"
+
+    @staticmethod
+    async def _generate_image(generator, screen: Screen, user) -> None:
+        prompt = screen.scene_data.get("visual", "")
+        if not prompt:
+            raise ValueError("No visual description found in scene data")
+
+        script_context = {
+            "title": screen.script.title if screen.script else None,
+            "screen_name": screen.name,
+        }
+        reused, key, prompt_key = await sync_to_async(ScriptMediaService._reuse_image)(
+            screen, user, prompt, script_context
+        )
+        if reused:
+            return
+
+        path, relative_path = ScriptMediaService._media_path(screen, f"{uuid.uuid4()}.png")
+        metadata = await generator.generate_image(prompt, path, script_context=script_context)
+        await sync_to_async(ScriptMediaService._save_image)(
+            screen, user, prompt, relative_path, metadata, script_context, key, prompt_key
+        )
+
+    @staticmethod
+    async def _generate_voice(generator, screen: Screen, user) -> None:
+        text = screen.scene_data.get("narrator", "")
+        if not text:
+            raise ValueError("No narrator text found in scene data")
+
+        voice_id = screen.scene_data.get("voice_id", DEFAULT_VOICE_ID)
+        key = media_cache.voice_key(text, voice_id, DEFAULT_VOICE_MODEL)
+        if await sync_to_async(ScriptMediaService._reuse_voice)(screen, user, text, voice_id, key):
+            return
+
+        path, relative_path = ScriptMediaService._media_path(screen, f"{uuid.uuid4()}.mp3")
+        metadata = await generator.generate_voice(
+            text, path, voice_id=voice_id, model_id=DEFAULT_VOICE_MODEL
+        )
+        await sync_to_async(ScriptMediaService._save_voice)(
+            screen, user, text, voice_id, relative_path, metadata, key
+        )
+
+    @staticmethod
+    async def _heartbeat(lock_keys: List[str], task_id: Optional[str]) -> None:
+        """Keep the run's generation locks alive until it finishes."""
+        ttl = settings.GENERATION_LOCK_TTL
+        while lock_keys and task_id:
+            for key in lock_keys:
+                await asyncio.to_thread(GenerationLockService.refresh, key, task_id, ttl)
+            await asyncio.sleep(ttl / 3)
+
+    @staticmethod
+    def _load(jobs, user_id):
+        user = User.objects.filter(id=user_id).first() if user_id else None
+        screens = Screen.objects.filter(id__in={job["screen_id"] for job in jobs}).select_related(
+            "workspace", "script"
+        )
+        return user, {str(screen.id): screen for screen in screens}
+
+    @staticmethod
+    def _is_cancelled(screen_id, component: str, task_id: Optional[str]) -> bool:
+        status_data = Screen.objects.filter(id=screen_id).values_list("status_data", flat=True).first()
+        component_data = (status_data or {}).get(component) or {}
+        return component_data.get("status") == "cancelled" and component_data.get("task_id") == task_id
+
+    @staticmethod
+    def _set_status(
+        screen: Screen,
+        component: str,
+        status: str,
+        task_id: Optional[str],
+        error_info: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """Record a job's status and send it to the workspace's progress feed."""
+        ScreenService.update_screen_status(str(screen.id), component, status, error_info)
+        noun = "Image" if component == "images" else "Voice"
+        messages = {
+            "processing": f"Starting {noun.lower()} generation for screen {screen.id}",
+            "completed": f"{noun} generation completed successfully",
+            "failed": f"{noun} generation failed: {(error_info or {}).get('message', 'Unknown error')}",
+        }
+        send_progress_update(
+            workspace_id=str(screen.workspace_id),
+            task_id=task_id,
+            task_type=TASK_TYPES[component],
+            status=status,
+            progress=100 if status == "completed" else 0,
+            message=messages[status],
+            entity_id=str(screen.id),
+        )
+
+    @staticmethod
+    def _media_path(screen: Screen, filename: str):
+        """Get the local path and storage-relative path of a new media file."""
+        temp_media = Media(workspace=screen.workspace, file=filename)
+        relative_path = temp_media.file.field.upload_to(temp_media, filename)
+        return os.path.join(settings.MEDIA_ROOT, relative_path), relative_path
+
+    @staticmethod
+    def _reuse_image(screen, user, prompt, script_context):
+        """
+        Link a copy of a cached image for the same prompt, if there is one.
+
+        Returns:
+            Whether a cached image was linked, with the cache key and prompt
+            key to store on a generated image otherwise
+        """
+        from backend.ai.services.image_service import ImageService
+
+        # Translations keep the original's visuals
+        if ScreenService.reuse_original_image(screen, user):
+            return True, "", ""
+
+        cached, key, prompt_key = ImageService.find_cached_image(
+            prompt, screen.workspace, user, script_context=script_context
+        )
+        if cached is None:
+            return False, key, prompt_key
+
+        params = cached.metadata.get("generation_params", {})
+        ImageService.record_usage(
+            user,
+            params.get("size", "1024x1024"),
+            params.get("quality", "standard"),
+            params.get("style", "vivid"),
+            has_script_context=True,
+            cached_media=cached,
+        )
+        screen.image = media_cache.clone(
+            cached,
+            screen.workspace,
+            f"Image for {screen.name}",
+            user,
+            metadata={"prompt": prompt, "script_context": script_context},
+        )
+        screen.save(update_fields=["image", "updated_at"])
+        return True, key, prompt_key
+
+    @staticmethod
+    def _save_image(
+        screen, user, prompt, relative_path, metadata, script_context, key, prompt_key
+    ) -> None:
+        from backend.ai.services.image_service import ImageService
+
+        media = Media.objects.create(
+            workspace=screen.workspace,
+            name=f"Image for {screen.name}",
+            file_type="image",
+            file=relative_path,
+            file_size=metadata["file_size"],
+            cache_key=key,
+            metadata={
+                "prompt": prompt,
+                "prompt_key": prompt_key,
+                "sha256": metadata["sha256"],
+                "revised_prompt": metadata.get("revised_prompt", ""),
+                "generation_params": {
+                    "size": metadata["size"],
+                    "quality": metadata["quality"],
+                    "style": metadata["style"],
+                },
+                "script_context": script_context,
+            },
+            uploaded_by=user,
+        )
+        ImageService.record_usage(
+            user, metadata["size"], metadata["quality"], metadata["style"], has_script_context=True
+        )
+        screen.image = media
+        screen.save(update_fields=["image", "updated_at"])
+
+    @staticmethod
+    def _reuse_voice(screen, user, text, voice_id, key) -> bool:
+        """Link a copy of cached audio for the same narration, if there is one."""
+        cached = media_cache.find(key, screen.workspace, user)
+        if cached is None:
+            return False
+
+        audio_file, relative_path = media_cache.copy_to(cached, screen.workspace)
+        metadata = {"file_size": audio_file.size, "sha256": audio_file.sha256, "duration": cached.duration}
+        ScriptMediaService._save_voice(
+            screen, user, text, voice_id, relative_path, metadata, key, cached_media=cached
+        )
+        return True
+
+    @staticmethod
+    def _save_voice(
+        screen, user, text, voice_id, relative_path, metadata, key, cached_media=None
+    ) -> None:
+        from backend.ai.services.elevenlabs_service import ElevenLabsService
+
+        media = Media.objects.create(
+            workspace=screen.workspace,
+            name=f"Voice for {screen.name}",
+            file_type="audio",
+            file=relative_path,
+            file_size=metadata["file_size"],
+            duration=metadata["duration"],
+            cache_key=key,
+            metadata={
+                "text": text,
+                "sha256": metadata["sha256"],
+                "screen_id": str(screen.id),
+                "script_id": str(screen.script_id) if screen.script_id else None,
+                "voice_id": voice_id,
+                "model_id": DEFAULT_VOICE_MODEL,
+            },
+            uploaded_by=user,
+        )
+        ElevenLabsService.record_usage(
+            user, text, voice_id, DEFAULT_VOICE_MODEL, cached_media=cached_media
+        )
+        screen.voice = media
+        screen.save(update_fields=["voice", "updated_at"])
+
+    @staticmethod
+    def _queue_preview(preview: Dict[str, Any]) -> None:
+        from celery import signature
+
+        try:
+            signature(preview).apply_async()
+        except Exception as e:
+            logger.error(f"Error queueing preview {preview.get('options', {}).get('task_id')}: {str(e)}")
+
+    @staticmethod
+    def _close_connections() -> None:
+        """Close the database connections opened by the run's sync thread."""
+        from django.db import connections
+
+        connections.close_all()
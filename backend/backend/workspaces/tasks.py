@@ -1,24 +1,35 @@
+import json
 import os
 from django.conf import settings
 from celery import shared_task
+from celery.exceptions import Retry
 import logging
-from moviepy import VideoFileClip, AudioFileClip, ImageClip, concatenate_videoclips
-import numpy as np
 from typing import Dict, Any, Optional, List, Union
 from django.contrib.auth import get_user_model
 import time
 import uuid
+from django.utils import timezone
 
 from backend.workspaces.models import Script, Screen
 from backend.channels.utils import send_progress_update
+from backend.utils.task_results import CANCELLED, DUPLICATE, ERROR, SUCCESS, TaskResult, task_result
 
 User = get_user_model()
 logger = logging.getLogger(__name__)
 
+# Times a media task is rescheduled after a provider rate limit
+RATE_LIMIT_MAX_RETRIES = 10
+# A preview waiting for in-flight media checks again every 30 seconds for up to an hour
+PREVIEW_WAIT_SECONDS = 30
+PREVIEW_WAIT_MAX_RETRIES = 120
+
 
 @shared_task(bind=True)
 def generate_scene_preview(self, scene_id, scene_data, workspace_id):
     """Generate preview video for a single scene"""
+    # The render stack is only loaded in workers, not in the web process
+    from moviepy import VideoFileClip, AudioFileClip, ImageClip
+
     task_id = self.request.id
     
     try:
@@ -163,6 +174,7 @@ def generate_scene_preview(self, scene_id, scene_data, workspace_id):
 @shared_task(bind=True)
 def generate_final_video(self, script):
     """Combine all scene previews into final video"""
+    from moviepy import VideoFileClip, concatenate_videoclips
     from .models import Screen
     
     task_id = self.request.id
@@ -360,20 +372,84 @@ def generate_screens_from_script(script_id: str) -> Dict[str, Any]:
 
 @shared_task(bind=True)
 def generate_screen_media(
-    self, screen_id: str, media_type: str, user_id = None
-) -> Dict[str, Any]:
+    self, screen_id: str, media_type: str, user_id = None, input_hash: Optional[str] = None
+) -> TaskResult:
     """
     Generate media for a screen.
 
+    Image and voice generation hold the in-flight lock of their screen
+    component while they run. A duplicate that still reaches a worker
+    while another task holds the lock returns without calling the provider.
+
     Args:
         screen_id: ID of the screen to generate media for
         media_type: Type of media to generate (image, voice, video)
         user_id: ID of the user requesting the generation
+        input_hash: Hash of the inputs the task was queued for
 
     Returns:
-        A dictionary with the result of the operation
+        A compact result with the screen ID, or for a duplicate the ID of
+        the task generating it
     """
-    task_id = self.request.id
+    from backend.workspaces.services.generation_lock_service import GenerationLockService
+
+    component = {"image": "images", "voice": "voices"}.get(media_type)
+    screen = Screen.objects.filter(id=screen_id).first() if component else None
+    if screen is None:
+        return _generate_screen_media(self, screen_id, media_type, user_id)
+
+    if _is_cancelled(screen, component, self.request.id):
+        logger.info(f"{media_type} for screen {screen_id} was cancelled before it started")
+        return task_result(CANCELLED, screen_id)
+
+    owner, lock_key = GenerationLockService.acquire(screen, component, self.request.id, input_hash)
+    if owner != self.request.id:
+        logger.info(f"{media_type} for screen {screen_id} is already being generated by task {owner}")
+        return task_result(DUPLICATE, owner)
+
+    with GenerationLockService.hold(lock_key, self.request.id):
+        return _generate_screen_media(self, screen_id, media_type, user_id)
+
+
+@shared_task(bind=True)
+def generate_script_media(
+    self,
+    script_id: str,
+    jobs: List[Dict[str, str]],
+    user_id: Optional[str] = None,
+    previews: Optional[Dict[str, Dict[str, Any]]] = None,
+) -> TaskResult:
+    """
+    Generate the images and voices of a script's screens in one async run.
+
+    A single worker slot drives every provider call of the run
+    concurrently, up to ``ASYNC_GENERATION_CONCURRENCY`` at a time. Each
+    screen's status is updated as its media arrives, and its preview is
+    queued as soon as that screen's media is done.
+
+    Args:
+        script_id: ID of the script the screens belong to
+        jobs: Dicts with the ``screen_id``, ``component`` and ``input_hash``
+            of each generation, locked under this task's ID when queued
+        user_id: ID of the user requesting the generation
+        previews: Preview task signatures to queue, by screen ID
+
+    Returns:
+        A compact result with the script ID
+    """
+    from backend.workspaces.services.script_media_service import ScriptMediaService
+
+    try:
+        counts = ScriptMediaService.generate(jobs, user_id, self.request.id, previews)
+    except Exception as e:
+        logger.error(f"Error generating media for script {script_id}: {str(e)}")
+        return task_result(ERROR, script_id)
+    return task_result(ERROR if counts.get("failed") else SUCCESS, script_id)
+
+
+def _generate_screen_media(task, screen_id: str, media_type: str, user_id=None) -> TaskResult:
+    """Generate media for a screen on behalf of ``generate_screen_media``."""
+    task_id = task.request.id
     workspace_id = None
     
     try:
@@ -407,7 +483,10 @@ def generate_screen_media(
             
             # Generate image
             result = screen.generate_image(user_id)
-            
+
+            if result.get("status") == "rate_limited":
+                _retry_rate_limited(task, result, workspace_id, screen_id, component, 'image_generation')
+
             if result.get("status") == "success":
                 # Update status using ScreenService
                 ScreenService.update_screen_status(screen_id, component, "completed")
@@ -424,7 +503,7 @@ def generate_screen_media(
                     entity_id=screen_id
                 )
                 
-                return {"status": "success", "message": "Image generated successfully"}
+                return task_result(SUCCESS, screen_id)
             else:
                 # Update status with error info
                 error_info = {
@@ -443,7 +522,7 @@ def generate_screen_media(
                     entity_id=screen_id
                 )
                 
-                return {"status": "error", "message": result.get("error", "Unknown error")}
+                return task_result(ERROR, screen_id)
                 
         elif media_type == "voice":
             
@@ -474,7 +553,10 @@ def generate_screen_media(
             
             # Generate voice
             result = screen.generate_voice(user_id)
-            
+
+            if result.get("status") == "rate_limited":
+                _retry_rate_limited(task, result, workspace_id, screen_id, component, 'voice_generation')
+
             if result.get("status") == "success":
                 # Update status using ScreenService
                 ScreenService.update_screen_status(screen_id, component, "completed")
@@ -491,7 +573,7 @@ def generate_screen_media(
                     entity_id=screen_id
                 )
                 
-                return {"status": "success", "message": "Voice generated successfully"}
+                return task_result(SUCCESS, screen_id)
             else:
                 # Update status with error info
                 error_info = {
@@ -510,7 +592,7 @@ def generate_screen_media(
                     entity_id=screen_id
                 )
                 
-                return {"status": "error", "message": result.get("error", "Unknown error")}
+                return task_result(ERROR, screen_id)
                 
         elif media_type == "preview":
             send_progress_update(
@@ -552,11 +634,14 @@ def generate_screen_media(
                 entity_id=screen_id
             )
             
-            return {"status": "success", "message": "Preview generated successfully"}
+            return task_result(SUCCESS, screen_id)
             
         else:
-            return {"status": "error", "message": f"Unsupported media type: {media_type}"}
+            logger.error(f"Unsupported media type: {media_type}")
+            return task_result(ERROR, screen_id)
 
+    except Retry:
+        raise
     except Exception as e:
         logger.error(f"Error generating {media_type} for screen {screen_id}: {str(e)}")
         
@@ -588,22 +673,95 @@ def generate_screen_media(
                 entity_id=screen_id
             )
         
-        return {"status": "error", "message": f"Error generating {media_type}: {str(e)}"}
+        return task_result(ERROR, screen_id)
 
 
-@shared_task
-def generate_screen_preview(screen_id: str) -> Dict[str, Any]:
+def _is_cancelled(screen: Screen, component: str, task_id: str) -> bool:
+    """Check whether a task's screen component was cancelled before it ran."""
+    component_data = (screen.status_data or {}).get(component) or {}
+    return component_data.get("status") == "cancelled" and component_data.get("task_id") == task_id
+
+
+def _retry_rate_limited(task, result, workspace_id, screen_id, component, task_type):
+    """
+    Reschedule a media task that hit a provider rate limit.
+
+    The task is retried under its own task ID, so it keeps its place in the
+    screen and script workflows. Returns only once the retry budget is
+    spent, leaving the caller to mark the component as failed.
+    """
+    from config.celery_app import retry_countdown
+    from backend.workspaces.services.screen_service import ScreenService
+
+    if task.request.retries >= RATE_LIMIT_MAX_RETRIES:
+        logger.error(
+            f"{task_type} for screen {screen_id} still rate limited after {task.request.retries} retries"
+        )
+        return
+
+    countdown = retry_countdown(retry_after=float(result.get("retry_after") or 60))
+    # Record when the retry will run so the UI can show it
+    ScreenService.update_screen_status(
+        screen_id,
+        component,
+        "rate_limited",
+        {
+            "error_type": "rate_limit",
+            "message": result.get("error", "Rate limited"),
+            "retry_after": int(countdown),
+            "attempt": task.request.retries + 1,
+        },
+    )
+    send_progress_update(
+        workspace_id=workspace_id,
+        task_id=task.request.id,
+        task_type=task_type,
+        status='rate_limited',
+        progress=0,
+        message=f"Rate limited, retrying in {int(countdown)} seconds",
+        entity_id=screen_id
+    )
+    logger.info(
+        f"Rescheduling {task_type} for screen {screen_id} in {countdown:.1f}s "
+        f"(retry {task.request.retries + 1}/{RATE_LIMIT_MAX_RETRIES})"
+    )
+    raise task.retry(countdown=countdown, max_retries=RATE_LIMIT_MAX_RETRIES)
+
+
+@shared_task(bind=True)
+def generate_screen_preview(
+    self, screen_id: str, wait_for: Optional[List[str]] = None
+) -> TaskResult:
     """
     Generate a preview for a screen.
 
+    When queued as part of a screen workflow, this runs as the body of the
+    chord over the screen's image and voice tasks, so both inputs have been
+    generated by the time it starts. Inputs that were already being
+    generated by another task are passed as ``wait_for``, and the preview
+    is retried until their locks are released.
+
     Args:
         screen_id: ID of the screen to generate a preview for
+        wait_for: Generation lock keys of in-flight media to wait for
 
     Returns:
-        A dictionary with the result of the operation
+        A compact result with the screen ID
     """
+    # Import here to avoid circular imports
+    from backend.workspaces.services.generation_lock_service import GenerationLockService
+    from backend.workspaces.services.screen_service import ScreenService
+
+    if wait_for and any(GenerationLockService.is_held(key) for key in wait_for):
+        if self.request.retries < PREVIEW_WAIT_MAX_RETRIES:
+            raise self.retry(countdown=PREVIEW_WAIT_SECONDS, max_retries=PREVIEW_WAIT_MAX_RETRIES)
+        logger.warning(f"Media for screen {screen_id} still in flight, rendering preview anyway")
+
     try:
         screen = Screen.objects.get(id=screen_id)
+        if _is_cancelled(screen, "preview", self.request.id):
+            logger.info(f"Preview for screen {screen_id} was cancelled before it started")
+            return task_result(CANCELLED, screen_id)
 
         # Log debug information about the screen
         logger.info(
@@ -614,30 +772,29 @@ def generate_screen_preview(screen_id: str) -> Dict[str, Any]:
         if not screen.image or not screen.voice:
             error_msg = f"Missing required media - image: {bool(screen.image)}, voice: {bool(screen.voice)}"
             logger.error(error_msg)
-            return {
-                "status": "error",
-                "message": f"Failed to generate preview: {error_msg}",
-            }
-
-        # Import here to avoid circular imports
-        from backend.workspaces.services.screen_service import ScreenService
+            ScreenService.update_screen_status(
+                screen_id, "preview", "failed", {"message": error_msg, "error_type": "missing_media"}
+            )
+            return task_result(ERROR, screen_id)
 
+        ScreenService.update_screen_status(screen_id, "preview", "processing")
         success = ScreenService.generate_screen_preview(screen)
 
         if success:
             logger.info(f"Successfully generated preview for screen {screen_id}")
-            return {
-                "status": "success",
-                "message": f"Generated preview for screen {screen_id}",
-            }
+            ScreenService.update_screen_status(screen_id, "preview", "completed")
+            return task_result(SUCCESS, screen_id)
         else:
             error_msg = f"Failed to generate preview: {screen.error_message}"
             logger.error(error_msg)
-            return {"status": "error", "message": error_msg}
+            ScreenService.update_screen_status(
+                screen_id, "preview", "failed", {"message": error_msg, "error_type": "generation_error"}
+            )
+            return task_result(ERROR, screen_id)
     except Screen.DoesNotExist:
         error_msg = f"Screen with ID {screen_id} not found"
         logger.error(error_msg)
-        return {"status": "error", "message": error_msg}
+        return task_result(ERROR, screen_id)
     except Exception as e:
         import traceback
 
@@ -645,38 +802,252 @@ def generate_screen_preview(screen_id: str) -> Dict[str, Any]:
         logger.error(
             f"Error generating preview for screen {screen_id}: {error_details}"
         )
-        return {"status": "error", "message": f"Error generating preview: {str(e)}"}
+        ScreenService.update_screen_status(
+            screen_id, "preview", "failed", {"message": str(e), "error_type": "exception"}
+        )
+        return task_result(ERROR, screen_id)
 
 
-@shared_task
-def compile_script_video(script_id: str) -> Dict[str, Any]:
+@shared_task(bind=True, acks_late=True, reject_on_worker_lost=True)
+def compile_script_video(self, script_id: str, user_id: Optional[str] = None) -> TaskResult:
     """
     Compile a video from all screens in a script.
 
+    The task is acknowledged only once it finishes, so a compile interrupted
+    by a worker crash or deploy is redelivered. The redelivered task finds
+    its RenderJob by task ID and resumes from the last completed stage.
+
+    Before rendering, the compile inputs are fingerprinted. If the script's
+    latest output has the same fingerprint it is reused, and if another job
+    with the same fingerprint is rendering this one attaches to it.
+
     Args:
         script_id: ID of the script to compile video for
+        user_id: Optional ID of the user who requested the compile
 
     Returns:
-        A dictionary with the result of the operation
+        A compact result with the script ID, or for a compile attached to
+        another one the ID of the task rendering it
+    """
+    from django.db import transaction
+    from backend.video.models import RenderJob
+    from backend.video.services.compilation_service import (
+        compute_fingerprint,
+        find_matching_job,
+    )
+
+    try:
+        script = Script.objects.get(id=script_id)
+
+        render_job = RenderJob.objects.filter(task_id=self.request.id).first()
+        if render_job is None:
+            render_job = RenderJob.objects.create(
+                script=script, task_id=self.request.id, created_by_id=user_id
+            )
+        elif render_job.status == "completed":
+            return task_result(SUCCESS, script_id)
+        elif render_job.status == "cancelled":
+            logger.info(f"Render job {render_job.id} was cancelled before it started")
+            return task_result(CANCELLED, script_id)
+        elif render_job.is_alive(settings.RENDER_JOB_STALE_SECONDS):
+            # The message was redelivered while another worker is still rendering
+            logger.info(f"Render job {render_job.id} is already running, skipping duplicate delivery")
+            return task_result(DUPLICATE, render_job.task_id)
+        elif render_job.current_stage:
+            logger.info(
+                f"Resuming render job {render_job.id} from stage '{render_job.current_stage}'"
+            )
+
+        if not render_job.current_stage:
+            fingerprint = compute_fingerprint(script)
+
+            # Lock the script row so concurrent compiles of the same script
+            # see each other's fingerprint before either starts rendering
+            with transaction.atomic():
+                Script.objects.select_for_update().filter(id=script_id).first()
+                match = find_matching_job(script, fingerprint, exclude=render_job)
+                if match is None:
+                    # A redelivered request whose job went away renders itself
+                    render_job.duplicate_of = None
+                    render_job.fingerprint = fingerprint or ""
+                    render_job.status = "running"
+                    render_job.heartbeat_at = timezone.now()
+                    render_job.save(
+                        update_fields=["duplicate_of", "fingerprint", "status", "heartbeat_at", "updated_at"]
+                    )
+
+            if match is not None:
+                return _attach_render_job(render_job, match)
+
+        success = script.compile_video(render_job=render_job)
+        if not success:
+            logger.error(f"Failed to compile video for script {script_id}")
+        return task_result(SUCCESS if success else ERROR, script_id)
+    except Script.DoesNotExist:
+        logger.error(f"Script with ID {script_id} not found")
+        return task_result(ERROR, script_id)
+    except Exception as e:
+        logger.error(f"Error compiling video for script {script_id}: {str(e)}")
+        return task_result(ERROR, script_id)
+
+
+def _attach_render_job(render_job, match) -> TaskResult:
+    """Point a duplicate compile at the job that already produces its output."""
+    render_job.duplicate_of = match
+    render_job.fingerprint = match.fingerprint
+    # Attached to an in-flight job, the request stays pending until that job
+    # finishes and passes on its outcome (see RenderJob.resolved_status)
+    render_job.status = "completed" if match.status == "completed" else "pending"
+    render_job.output_file = match.output_file
+    render_job.save(
+        update_fields=["duplicate_of", "fingerprint", "status", "output_file", "updated_at"]
+    )
+
+    if match.status == "completed":
+        Script.objects.filter(id=render_job.script_id).update(output_file=match.output_file)
+        logger.info(f"Reused output of render job {match.id} for render job {render_job.id}")
+        return task_result(SUCCESS, str(render_job.script_id))
+
+    logger.info(f"Attached render job {render_job.id} to in-flight render job {match.id}")
+    return task_result(DUPLICATE, match.task_id)
+
+
+@shared_task(bind=True)
+def translate_script(
+    self, script_id: str, target_language: str, new_script_id: str, user_id: Optional[str] = None
+) -> TaskResult:
     """
+    Translate a script's narration into a new script.
+
+    The translation batches run concurrently, and progress is sent as each
+    one finishes with the new script's ID as the entity ID. The new script
+    is only created once every batch is done, under the ID the caller chose,
+    so a redelivered task doesn't create it twice.
+
+    Args:
+        script_id: ID of the script to translate
+        target_language: ISO code of the language to translate to
+        new_script_id: ID to create the translated script with
+        user_id: ID of the user requesting the translation
+
+    Returns:
+        A compact result with the ID of the translated script
+    """
+    from config.celery_app import retry_countdown
+    from backend.ai.services import rate_limiter
+    from backend.ai.services.translation_service import TranslationService
+
+    workspace_id = None
+
+    def progress(status, value, message):
+        send_progress_update(
+            workspace_id=workspace_id,
+            task_id=self.request.id,
+            task_type='translation',
+            status=status,
+            progress=value,
+            message=message,
+            entity_id=new_script_id
+        )
+
     try:
         script = Script.objects.get(id=script_id)
+        workspace_id = script.workspace_id
+        user = User.objects.filter(id=user_id).first() if user_id else None
 
-        success = script.compile_video()
+        progress('processing', 5, "Translating script")
+        translation_service = TranslationService(api_key=getattr(user, 'openai_api_key', None))
+        translated_content = translation_service.translate_script_narration(
+            script,
+            target_language,
+            progress_callback=lambda done, total: progress(
+                'processing', 5 + int(90 * done / total), f"Translated batch {done} of {total}"
+            ),
+        )
 
-        if success:
-            return {
-                "status": "success",
-                "message": f"Compiled video for script {script_id}",
-            }
-        else:
-            return {
-                "status": "error",
-                "message": f"Failed to compile video for script {script_id}",
+        language_name = translation_service.language_names.get(target_language, target_language)
+        new_script, _ = Script.objects.get_or_create(
+            id=new_script_id,
+            defaults={
+                'workspace_id': workspace_id,
+                'title': f"{script.title} ({language_name})",
+                'topic': script.topic,
+                'content': json.dumps(translated_content.get("scenes", [])),
+                'original_script': script,
+                'language': target_language,
+                'created_by': user,
+                'status': 'draft',
             }
+        )
+
+        progress('completed', 100, "Translation completed")
+        logger.info(f"Translated script {script_id} to {target_language}")
+        return task_result(SUCCESS, str(new_script.id))
+    except rate_limiter.RateLimitExceeded as e:
+        if self.request.retries < RATE_LIMIT_MAX_RETRIES:
+            # Batches that finished are in the translation memory, so the
+            # retry only pays for the rest
+            countdown = retry_countdown(retry_after=e.retry_after)
+            progress('rate_limited', 0, f"Rate limited, retrying in {int(countdown)} seconds")
+            raise self.retry(countdown=countdown, max_retries=RATE_LIMIT_MAX_RETRIES)
+        logger.error(f"Translation of script {script_id} still rate limited after {self.request.retries} retries")
+        progress('failed', 0, "Translation failed: rate limited")
+        return task_result(ERROR, new_script_id)
     except Script.DoesNotExist:
         logger.error(f"Script with ID {script_id} not found")
-        return {"status": "error", "message": f"Script with ID {script_id} not found"}
+        return task_result(ERROR, new_script_id)
     except Exception as e:
-        logger.error(f"Error compiling video for script {script_id}: {str(e)}")
-        return {"status": "error", "message": f"Error compiling video: {str(e)}"}
+        logger.error(f"Error translating script {script_id}: {str(e)}")
+        progress('failed', 0, "Failed to translate script")
+        return task_result(ERROR, new_script_id)
+
+
+@shared_task
+def release_scheduled_job(job_id: str) -> TaskResult:
+    """
+    Free the scheduler slots of a finished job and dispatch queued jobs.
+
+    Linked as both the last step and the error callback of every workflow
+    the scheduler dispatches.
+
+    Args:
+        job_id: ID of the scheduled job
+
+    Returns:
+        A compact result with the job ID
+    """
+    from backend.workspaces.services.scheduler_service import SchedulerService
+
+    try:
+        if not SchedulerService.release(job_id):
+            logger.debug(f"Scheduled job {job_id} was already released")
+        return task_result(SUCCESS, job_id)
+    except Exception as e:
+        logger.error(f"Error releasing scheduled job {job_id}: {str(e)}")
+        return task_result(ERROR, job_id)
+
+
+@shared_task
+def dispatch_scheduled_jobs() -> TaskResult:
+    """
+    Release expired scheduler leases and dispatch queued jobs.
+
+    Runs periodically so slots held by lost jobs are reclaimed even when
+    no other job finishes, and renews the generation locks of jobs that are
+    still waiting.
+
+    Returns:
+        A compact result with the outcome
+    """
+    from backend.workspaces.services.scheduler_service import SchedulerService
+
+    try:
+        expired = SchedulerService.expire_leases()
+        dispatched = SchedulerService.dispatch()
+        SchedulerService.refresh_generation_locks()
+        if expired or dispatched:
+            logger.info(f"Expired {expired} and dispatched {dispatched} scheduled jobs")
+        return task_result(SUCCESS)
+    except Exception as e:
+        logger.error(f"Error dispatching scheduled jobs: {str(e)}")
+        return task_result(ERROR)
@@ -0,0 +1,53 @@
+from factory import Faker
+from factory import LazyAttribute
+from factory import Sequence
+from factory import SubFactory
+from factory.django import DjangoModelFactory
+from factory.django import FileField
+
+from backend.users.tests.factories import UserFactory
+from backend.workspaces.models import Media
+from backend.workspaces.models import Screen
+from backend.workspaces.models import Script
+from backend.workspaces.models import Workspace
+
+
+class WorkspaceFactory(DjangoModelFactory[Workspace]):
+    name = Sequence(lambda n: f"Workspace {n}")
+    owner = SubFactory(UserFactory)
+
+    class Meta:
+        model = Workspace
+
+
+class ScriptFactory(DjangoModelFactory[Script]):
+    workspace = SubFactory(WorkspaceFactory)
+    title = Faker("sentence", nb_words=3)
+    content = "[]"
+    created_by = LazyAttribute(lambda script: script.workspace.owner)
+
+    class Meta:
+        model = Script
+
+
+class ScreenFactory(DjangoModelFactory[Screen]):
+    script = SubFactory(ScriptFactory)
+    workspace = LazyAttribute(lambda screen: screen.script.workspace)
+    name = Sequence(lambda n: f"Scene {n}")
+    scene = Sequence(lambda n: n)
+    scene_data = {"narrator": "A narrated line", "visual": "A visual description"}
+
+    class Meta:
+        model = Screen
+
+
+class MediaFactory(DjangoModelFactory[Media]):
+    workspace = SubFactory(WorkspaceFactory)
+    name = Faker("file_name", extension="mp3")
+    file_type = "audio"
+    file = FileField(data=b"generated media", filename="media.mp3")
+    file_size = len(b"generated media")
+    uploaded_by = LazyAttribute(lambda media: media.workspace.owner)
+
+    class Meta:
+        model = Media
@@ -0,0 +1,131 @@
+import pytest
+from celery.exceptions import Retry
+
+from backend.utils.task_results import DUPLICATE
+from backend.utils.task_results import task_result
+from backend.workspaces import tasks
+from backend.workspaces.services.generation_lock_service import GenerationLockService
+from backend.workspaces.tasks import generate_screen_media
+from backend.workspaces.tests.factories import ScreenFactory
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture(autouse=True)
+def lock_ttls(settings):
+    settings.GENERATION_LOCK_TTL = 60
+    settings.GENERATION_LOCK_QUEUED_TTL = 3600
+
+
+@pytest.fixture
+def screen():
+    return ScreenFactory()
+
+
+def test_second_acquire_returns_the_first_owner(redis, screen):
+    owner, key = GenerationLockService.acquire(screen, "images", "first-task")
+    assert owner == "first-task"
+
+    assert GenerationLockService.acquire(screen, "images", "second-task") == ("first-task", key)
+    # The owner can take its own lock again, e.g. when its task is redelivered
+    assert GenerationLockService.acquire(screen, "images", "first-task") == ("first-task", key)
+    assert redis.ttl(key) == 3600
+
+
+def test_locks_are_per_component_and_inputs(redis, screen):
+    _, image_key = GenerationLockService.acquire(screen, "images", "image-task")
+    _, voice_key = GenerationLockService.acquire(screen, "voices", "voice-task")
+    screen.scene_data = {**screen.scene_data, "visual": "A different picture"}
+
+    owner, new_image_key = GenerationLockService.acquire(screen, "images", "new-image-task")
+
+    assert len({image_key, voice_key, new_image_key}) == 3
+    assert owner == "new-image-task"
+
+
+def test_release_by_another_task_is_a_no_op(redis, screen):
+    _, key = GenerationLockService.acquire(screen, "voices", "first-task")
+
+    assert GenerationLockService.release(key, "second-task") is False
+    assert GenerationLockService.is_held(key)
+
+    assert GenerationLockService.release(key, "first-task") is True
+    assert not GenerationLockService.is_held(key)
+
+
+def test_hold_releases_the_lock_when_the_task_finishes(redis, screen):
+    _, key = GenerationLockService.acquire(screen, "images", "task")
+
+    with GenerationLockService.hold(key, "task"):
+        # Running tasks hold the lock for the shorter TTL, kept alive by the heartbeat
+        assert 0 < redis.ttl(key) <= 60
+
+    assert not GenerationLockService.is_held(key)
+
+
+def test_hold_releases_the_lock_when_the_task_fails(redis, screen):
+    _, key = GenerationLockService.acquire(screen, "images", "task")
+
+    with pytest.raises(ValueError):
+        with GenerationLockService.hold(key, "task"):
+            raise ValueError("Provider error")
+
+    assert not GenerationLockService.is_held(key)
+
+
+def test_hold_keeps_the_lock_while_the_task_waits_to_retry(redis, screen):
+    _, key = GenerationLockService.acquire(screen, "images", "task")
+
+    with pytest.raises(Retry):
+        with GenerationLockService.hold(key, "task"):
+            raise Retry()
+
+    assert redis.get(key) == "task"
+    assert redis.ttl(key) > 60
+
+
+def test_refresh_screens_only_renews_queued_components(redis, screen):
+    _, image_key = GenerationLockService.acquire(screen, "images", "image-task", ttl=5)
+    _, voice_key = GenerationLockService.acquire(screen, "voices", "voice-task", ttl=5)
+    screen.status_data = {
+        "images": {"status": "queued", "task_id": "image-task", "lock_key": image_key},
+        "voices": {"status": "processing", "task_id": "voice-task", "lock_key": voice_key},
+    }
+
+    assert GenerationLockService.refresh_screens([screen]) == 1
+
+    assert redis.ttl(image_key) == 3600
+    assert redis.ttl(voice_key) <= 5
+
+
+def test_refresh_screens_leaves_locks_taken_over_by_another_task(redis, screen):
+    _, key = GenerationLockService.acquire(screen, "images", "new-task", ttl=5)
+    screen.status_data = {"images": {"status": "queued", "task_id": "old-task", "lock_key": key}}
+
+    assert GenerationLockService.refresh_screens([screen]) == 0
+    assert redis.get(key) == "new-task"
+
+
+def test_release_screens_releases_every_component(redis, screen):
+    _, image_key = GenerationLockService.acquire(screen, "images", "image-task")
+    _, voice_key = GenerationLockService.acquire(screen, "voices", "voice-task")
+    screen.status_data = {
+        "images": {"status": "queued", "task_id": "image-task", "lock_key": image_key},
+        "voices": {"status": "processing", "task_id": "voice-task", "lock_key": voice_key},
+    }
+
+    assert GenerationLockService.release_screens([screen]) == 2
+    assert not GenerationLockService.is_held(image_key)
+    assert not GenerationLockService.is_held(voice_key)
+
+
+def test_duplicate_generation_task_returns_the_owner(redis, screen, monkeypatch):
+    GenerationLockService.acquire(screen, "images", "first-task")
+
+    def generate(*args, **kwargs):
+        raise AssertionError("The provider must not be called for a duplicate")
+
+    monkeypatch.setattr(tasks, "_generate_screen_media", generate)
+    result = generate_screen_media.apply(args=[str(screen.id), "image"], task_id="second-task")
+
+    assert result.get() == task_result(DUPLICATE, "first-task")
@@ -0,0 +1,181 @@
+from unittest import mock
+
+import pytest
+from celery import states
+from django.urls import reverse
+
+from backend.utils.task_results import CANCELLED
+from backend.utils.task_results import task_result
+from backend.video.models import RenderJob
+from backend.workspaces import tasks
+from backend.workspaces.models import Screen
+from backend.workspaces.services.generation_lock_service import GenerationLockService
+from backend.workspaces.services.queue_service import QueueService
+from backend.workspaces.services.scheduler_service import SchedulerService
+from backend.workspaces.tasks import generate_screen_media
+from backend.workspaces.tests.factories import ScreenFactory
+from backend.workspaces.tests.factories import ScriptFactory
+from config.celery_app import app
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def result_backend(monkeypatch):
+    """Serve task metas from a dict, counting result-backend reads."""
+    backend = app.backend
+    metas = {}
+    reads = []
+
+    def mget(keys):
+        reads.append(list(keys))
+        return [metas.get(key) for key in keys]
+
+    def get_task_meta(task_id):
+        raise AssertionError("Task states must be read with one MGET")
+
+    def store(task_id, status, result=None):
+        metas[backend.get_key_for_task(task_id)] = backend.encode({"status": status, "result": result})
+
+    monkeypatch.setattr(backend, "mget", mget)
+    monkeypatch.setattr(backend, "get_task_meta", get_task_meta)
+    return store, reads
+
+
+def test_get_task_states_reads_every_task_in_one_mget(result_backend):
+    store, reads = result_backend
+    store("done", states.SUCCESS, {"status": "success", "ref": "screen"})
+    store("failed", states.FAILURE, app.backend.prepare_exception(ValueError("Provider error")))
+
+    task_states = QueueService.get_task_states(["done", "failed", "unknown", "done"])
+
+    assert len(reads) == 1
+    assert task_states == {
+        "done": {"task_status": states.SUCCESS},
+        "failed": {"task_status": states.FAILURE, "error": "Provider error"},
+        "unknown": {"task_status": states.PENDING},
+    }
+
+
+def test_get_queue_status_makes_one_result_backend_read(result_backend, monkeypatch):
+    store, reads = result_backend
+    script = ScriptFactory()
+    for scene in range(20):
+        ScreenFactory(
+            script=script,
+            scene=scene,
+            status_data={
+                "images": {"status": "completed", "task_id": f"image-{scene}"},
+                "voices": {"status": "queued", "task_id": f"voice-{scene}"},
+            },
+        )
+    store("image-0", states.SUCCESS)
+
+    def get_workspace_status(*args, **kwargs):
+        raise AssertionError("The status poll must not read the scheduler")
+
+    monkeypatch.setattr(SchedulerService, "get_workspace_status", get_workspace_status)
+    status = QueueService.get_queue_status(str(script.id))
+
+    assert status["status"] == "success"
+    assert len(reads) == 1
+    assert len(reads[0]) == 40
+    first = status["screens"][0]
+    assert first["components"] == {
+        "images": {"status": "completed", "task_id": "image-0", "task_status": states.SUCCESS},
+        "voices": {"status": "queued", "task_id": "voice-0", "task_status": states.PENDING},
+    }
+    assert "scheduler" not in status
+
+
+def test_scheduler_status_is_served_separately(client, redis, monkeypatch):
+    script = ScriptFactory()
+    workspace = script.workspace
+    other_script = ScriptFactory(workspace=workspace)
+    for script_id in (str(other_script.id), str(script.id)):
+        SchedulerService._enqueue(
+            SchedulerService.build_job({"task": "tests.job"}, workspace, script_id=script_id)
+        )
+    client.force_login(workspace.owner)
+
+    response = client.get(
+        reverse("workspaces:batch_scheduler_status", args=[workspace.id, script.id])
+    )
+
+    assert response.status_code == 200
+    scheduler = response.json()["scheduler"]
+    assert [job["script_id"] for job in scheduler["queued"]] == [str(script.id)]
+    assert scheduler["queued"][0]["workspace_position"] == 2
+
+
+def test_scheduler_status_of_another_workspace_is_not_found(client, redis, user):
+    script = ScriptFactory()
+    client.force_login(user)
+
+    response = client.get(
+        reverse("workspaces:batch_scheduler_status", args=[script.workspace.id, script.id])
+    )
+
+    assert response.status_code == 404
+
+
+@pytest.fixture
+def revoke(monkeypatch):
+    """Record task revocations instead of broadcasting them."""
+    revoke = mock.Mock()
+    monkeypatch.setattr(app.control, "revoke", revoke)
+    return revoke
+
+
+def test_cancel_queued_tasks_stops_every_task_of_the_script(redis, revoke):
+    script = ScriptFactory()
+    queued = ScreenFactory(script=script, scene=0)
+    done = ScreenFactory(script=script, scene=1)
+    _, image_key = GenerationLockService.acquire(queued, "images", "image-0")
+    _, voice_key = GenerationLockService.acquire(queued, "voices", "voice-0")
+    queued.status_data = {
+        "images": {"status": "queued", "task_id": "image-0", "lock_key": image_key},
+        "voices": {"status": "processing", "task_id": "voice-0", "lock_key": voice_key},
+    }
+    queued.save()
+    done.status_data = {"images": {"status": "completed", "task_id": "image-1"}}
+    done.save()
+    pending = RenderJob.objects.create(script=script, task_id="compile-pending")
+    running = RenderJob.objects.create(script=script, task_id="compile-running", status="running")
+    completed = RenderJob.objects.create(script=script, task_id="compile-done", status="completed")
+    for _ in range(2):
+        SchedulerService._enqueue(
+            SchedulerService.build_job({"task": "tests.job"}, script.workspace, script_id=str(script.id))
+        )
+
+    result = QueueService.cancel_queued_tasks(str(script.id))
+
+    assert result["status"] == "success"
+    assert result["cancelled_tasks"] == 6
+    revoke.assert_called_once()
+    task_ids, = revoke.call_args.args
+    assert sorted(task_ids) == ["compile-pending", "compile-running", "image-0", "voice-0"]
+    assert revoke.call_args.kwargs == {"terminate": True}
+    assert SchedulerService.get_workspace_status(script.workspace.id)["queued"] == []
+
+    queued.refresh_from_db()
+    done.refresh_from_db()
+    assert {data["status"] for data in queued.status_data.values()} == {"cancelled"}
+    assert done.status_data["images"]["status"] == "completed"
+    assert not GenerationLockService.is_held(image_key)
+    assert not GenerationLockService.is_held(voice_key)
+    statuses = dict(RenderJob.objects.values_list("id", "status"))
+    assert statuses == {pending.id: "cancelled", running.id: "cancelled", completed.id: "completed"}
+
+
+def test_cancelled_task_exits_before_generating(redis, monkeypatch):
+    screen = ScreenFactory(status_data={"images": {"status": "cancelled", "task_id": "image-task"}})
+
+    def generate(*args, **kwargs):
+        raise AssertionError("A cancelled task must not call the provider")
+
+    monkeypatch.setattr(tasks, "_generate_screen_media", generate)
+    result = generate_screen_media.apply(args=[str(screen.id), "image"], task_id="image-task")
+
+    assert result.get() == task_result(CANCELLED, str(screen.id))
+    assert Screen.objects.get(id=screen.id).status_data["images"]["status"] == "cancelled"
@@ -0,0 +1,175 @@
+import types
+
+import pytest
+from celery import signature
+from celery.canvas import _chain
+
+from backend.users.tests.factories import UserFactory
+from backend.workspaces.services import scheduler_service
+from backend.workspaces.services.scheduler_service import SchedulerService
+from backend.workspaces.tasks import dispatch_scheduled_jobs
+from backend.workspaces.tests.factories import WorkspaceFactory
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture(autouse=True)
+def caps(settings):
+    """Give every user a cap of 2 screens and every workspace a cap of 3."""
+    settings.SUBSCRIPTION_PLANS = {
+        "free": {"features": {"max_concurrent_screens": 2, "max_workspace_concurrent_screens": 3}},
+    }
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Control the time the scheduler sees."""
+    now = [1_000_000.0]
+    monkeypatch.setattr(scheduler_service, "time", types.SimpleNamespace(time=lambda: now[0]))
+    return now
+
+
+@pytest.fixture
+def dispatched(redis, clock, monkeypatch):
+    """Record the name of every job sent to Celery instead of sending it."""
+    sent = []
+    monkeypatch.setattr(
+        _chain, "apply_async", lambda workflow, *args, **kwargs: sent.append(workflow.tasks[0].args[0])
+    )
+    return sent
+
+
+def job(name):
+    return signature("tests.job", args=(name,))
+
+
+def jobs(*names):
+    return [job(name) for name in names]
+
+
+def test_dispatch_honours_the_user_cap(dispatched):
+    workspace = WorkspaceFactory()
+
+    SchedulerService.submit_batch(jobs("a1", "a2", "a3"), workspace)
+
+    assert dispatched == ["a1", "a2"]
+
+
+def test_dispatch_honours_the_workspace_cap(dispatched):
+    workspace = WorkspaceFactory()
+    member = UserFactory()
+
+    SchedulerService.submit_batch(jobs("owner1", "owner2", "owner3"), workspace)
+    SchedulerService.submit_batch(jobs("member1", "member2"), workspace, member)
+
+    # The owner's capped job doesn't hold the member back, but the workspace
+    # is full after one of the member's jobs
+    assert dispatched == ["owner1", "owner2", "member1"]
+
+    status = SchedulerService.get_workspace_status(workspace.id)
+    assert status["running"] == 3
+    assert [job["workspace_position"] for job in status["queued"]] == [1, 2]
+
+
+def test_dispatch_rotates_between_workspaces(dispatched, settings):
+    settings.SUBSCRIPTION_PLANS["free"]["features"]["max_concurrent_screens"] = 3
+    first = WorkspaceFactory()
+    second = WorkspaceFactory()
+    for name in ("first1", "first2", "first3"):
+        SchedulerService._enqueue(SchedulerService.build_job(job(name), first))
+    for name in ("second1", "second2"):
+        SchedulerService._enqueue(SchedulerService.build_job(job(name), second))
+
+    first_status = SchedulerService.get_workspace_status(first.id)
+    second_status = SchedulerService.get_workspace_status(second.id)
+    SchedulerService.dispatch()
+
+    # One job per turn; the ring is served from its tail
+    assert dispatched == ["second1", "first1", "second2", "first2", "first3"]
+    assert first_status["workspaces_waiting"] == 2
+    positions = {
+        job["job_id"]: job["position"]
+        for status in (first_status, second_status)
+        for job in status["queued"]
+    }
+    assert sorted(positions.values()) == [1, 2, 3, 4, 5]
+    assert [job["position"] for job in first_status["queued"]] == [2, 4, 5]
+    assert [job["position"] for job in second_status["queued"]] == [1, 3]
+
+
+def test_release_frees_a_slot_for_the_next_job(dispatched):
+    workspace = WorkspaceFactory()
+    result = SchedulerService.submit_batch(jobs("a1", "a2", "a3"), workspace)
+
+    assert SchedulerService.release(result["job_ids"][0]) is True
+    assert dispatched == ["a1", "a2", "a3"]
+    # Released by both the success and error callbacks
+    assert SchedulerService.release(result["job_ids"][0]) is False
+
+    status = SchedulerService.get_workspace_status(workspace.id)
+    assert status["running"] == 2
+    assert status["queued"] == []
+
+
+def test_follow_up_job_runs_once_after_the_last_job(dispatched):
+    workspace = WorkspaceFactory()
+    result = SchedulerService.submit_batch(jobs("a1", "a2"), workspace, then=job("compile"))
+
+    assert dispatched == ["a1", "a2"]
+    SchedulerService.release(result["job_ids"][0])
+    assert dispatched == ["a1", "a2"]
+
+    SchedulerService.release(result["job_ids"][1])
+    SchedulerService.release(result["job_ids"][1])
+    SchedulerService.release(result["job_ids"][0])
+
+    assert dispatched == ["a1", "a2", "compile"]
+    status = SchedulerService.get_workspace_status(workspace.id)
+    assert status["running"] == 1
+    assert status["queued"] == []
+
+
+def test_follow_up_job_of_an_empty_batch_is_queued_directly(dispatched):
+    workspace = WorkspaceFactory()
+
+    result = SchedulerService.submit_batch([], workspace, then=job("compile"))
+
+    assert result["job_ids"] == []
+    assert result["then_job_id"]
+    assert dispatched == ["compile"]
+
+
+def test_cancel_drops_a_scripts_jobs_and_follow_up(redis, dispatched):
+    workspace = WorkspaceFactory()
+    cancelled = SchedulerService.submit_batch(
+        jobs("a1", "a2", "a3", "a4"), workspace, then=job("compile"), script_id="script-a"
+    )
+    SchedulerService.submit_batch(jobs("b1"), workspace, script_id="script-b")
+    assert dispatched == ["a1", "a2"]
+
+    result = SchedulerService.cancel_script(str(workspace.id), "script-a")
+
+    assert result == {"queued": 2, "running": 2}
+    # The freed slots go to the other script
+    assert dispatched == ["a1", "a2", "b1"]
+    # Late callbacks of the cancelled jobs neither free slots nor queue the compile
+    for job_id in cancelled["job_ids"]:
+        assert SchedulerService.release(job_id) is False
+    assert dispatched == ["a1", "a2", "b1"]
+    assert redis.keys("scheduler:barrier:*") == []
+
+
+def test_expired_leases_are_reclaimed(clock, dispatched, settings):
+    workspace = WorkspaceFactory()
+    result = SchedulerService.submit_batch(jobs("a1", "a2", "a3"), workspace)
+    assert dispatched == ["a1", "a2"]
+
+    clock[0] += settings.SCHEDULER_LEASE_SECONDS - 1
+    dispatch_scheduled_jobs()
+    assert dispatched == ["a1", "a2"]
+
+    clock[0] += 2
+    dispatch_scheduled_jobs()
+
+    assert dispatched == ["a1", "a2", "a3"]
+    assert SchedulerService.release(result["job_ids"][0]) is False
@@ -28,6 +28,7 @@ from backend.workspaces.views import (
     ScreenTranslationView,
     ChannelViewSet,
     BatchGenerationView,
+    BatchSchedulerStatusView,
     MediaListView,
     ScriptTranslationView,
     WorkspaceIdeasView,
@@ -94,6 +95,7 @@ web_urlpatterns = [
     # Batch generation endpoints
     path('<uuid:workspace_id>/scripts/<uuid:script_id>/batch/', BatchGenerationView.as_view(), name='batch_operations'),
     path('<uuid:workspace_id>/scripts/<uuid:script_id>/batch-generate/', BatchGenerationView.as_view(), name='batch_generate'),
+    path('<uuid:workspace_id>/scripts/<uuid:script_id>/batch/scheduler/', BatchSchedulerStatusView.as_view(), name='batch_scheduler_status'),
     
     path('<uuid:workspace_id>/scripts/<uuid:script_id>/update/', ScriptUpdateView.as_view(), name='script_update'),
     path('<uuid:workspace_id>/scripts/<uuid:script_id>/finalize/', ScriptFinalizeView.as_view(), name='script_finalize'),
@@ -53,18 +53,13 @@ import os
 import logging
 # from .tasks import generate_final_video, generate_scene_preview
 from urllib.parse import urlparse
-from backend.ai.services.openai_service import OpenAIService
 from django.http import JsonResponse
 from django.utils import timezone
-from backend.ai.services.image_service import ImageService
-from backend.ai.services.elevenlabs_service import ElevenLabsService
 import json
 from django.http import Http404
 import uuid
 from django.shortcuts import render
 from backend.workspaces.services.screen_service import ScreenService
-from backend.ai.services.translation_service import TranslationService
-from backend.workspaces.tasks import generate_screen_media, generate_final_video, generate_scene_preview, compile_script_video
 logger = logging.getLogger(__name__)
 
 
@@ -374,6 +369,7 @@ class WorkspaceViewSet(viewsets.ModelViewSet):
         
         try:
             # Initialize OpenAI service with user's API key
+            from backend.ai.services.openai_service import OpenAIService
             openai_service = OpenAIService(api_key=api_key)
             
             # Generate script
@@ -477,6 +473,7 @@ class WorkspaceViewSet(viewsets.ModelViewSet):
         
         try:
             # Initialize OpenAI service with user's API key
+            from backend.ai.services.openai_service import OpenAIService
             openai_service = OpenAIService(api_key=api_key)
             
             # Refine script
@@ -583,6 +580,7 @@ class WorkspaceViewSet(viewsets.ModelViewSet):
         
         try:
             # Initialize OpenAI service with user's API key
+            from backend.ai.services.openai_service import OpenAIService
             openai_service = OpenAIService(api_key=api_key)
             
             # Generate scene descriptions
@@ -829,6 +827,7 @@ class ScreenViewSet(viewsets.ModelViewSet):
                 audio_file = os.path.join(settings.MEDIA_ROOT, audio_path)
 
             # Generate preview
+            from backend.workspaces.tasks import generate_scene_preview
             preview_path = generate_scene_preview(
                 scene_id=scene_id,
                 scene_data={
@@ -1354,6 +1353,7 @@ class ImageGenerationView(LoginRequiredMixin, UserWorkspacePermissionMixin, View
                 }, status=400)
             
             # Initialize the image service
+            from backend.ai.services.image_service import ImageService
             image_service = ImageService(api_key=api_key)
             
             # Parse script content
@@ -1471,6 +1471,7 @@ class ImageRegenerationView(LoginRequiredMixin, UserWorkspacePermissionMixin, Vi
                 }, status=400)
             
             # Initialize the image service
+            from backend.ai.services.image_service import ImageService
             image_service = ImageService(api_key=api_key)
             
             # Get script context from the original media
@@ -1644,6 +1645,7 @@ class VoiceGenerationView(LoginRequiredMixin, UserWorkspacePermissionMixin, View
                 }, status=400)
             
             # Initialize the voice service
+            from backend.ai.services.elevenlabs_service import ElevenLabsService
             voice_service = ElevenLabsService(api_key=api_key)
             
             # Parse script content
@@ -1668,9 +1670,10 @@ class VoiceGenerationView(LoginRequiredMixin, UserWorkspacePermissionMixin, View
                 
                 logger.info(f"Generating voice for screen '{screen.name}' with text: {text[:50]}...")
                     
-                # Generate voice
-                audio_bytes, metadata = voice_service.generate_voice(
+                # Generate voice, streaming it straight to a file
+                audio_file, relative_path, metadata = voice_service.generate_voice_file(
                     text=text,
+                    workspace=workspace,
                     voice_id=voice_id,
                     model_id=model_id,
                     user=request.user
@@ -1678,26 +1681,20 @@ class VoiceGenerationView(LoginRequiredMixin, UserWorkspacePermissionMixin, View
                 
                 logger.info(f"Voice file generated successfully for screen '{screen.name}'")
                 
-                # Save the audio file
-                filename = f"{uuid.uuid4()}.mp3"
-                local_path, relative_path = voice_service.save_audio_file(
-                    audio_bytes, workspace, filename
-                )
-                
-                # Get file size
-                file_size = os.path.getsize(local_path)
-                
                 # Create a Media object for the voice
                 media = Media.objects.create(
                     workspace=workspace,
                     name=f"Voice for {screen.name}",
                     file_type='audio',
                     file=relative_path,
-                    file_size=file_size,
+                    file_size=audio_file.size,
+                    duration=metadata['duration'],
+                    cache_key=metadata['cache_key'],
                     metadata={
                         'text': text,
                         'screen_id': str(screen.id),
                         'script_id': str(screen.script.id) if screen.script else None,
+                        'sha256': audio_file.sha256,
                         'generation_params': {
                             'voice_id': voice_id,
                             'model_id': model_id,
@@ -1781,6 +1778,7 @@ class VoiceEditorView(LoginRequiredMixin, UserWorkspacePermissionMixin, DetailVi
         
         # Initialize ElevenLabs service
         api_key = self.request.user.elevenlabs_api_key or settings.ELEVENLABS_API_KEY
+        from backend.ai.services.elevenlabs_service import ElevenLabsService
         voice_service = ElevenLabsService(api_key=api_key)
         
         # Get available voices
@@ -2436,6 +2434,7 @@ class BatchGenerationView(LoginRequiredMixin, UserWorkspacePermissionMixin, View
     def post(self, request, workspace_id, script_id):
         """Handle batch generation form submission."""
         from django.http import JsonResponse
+        from backend.video.services import render_planner
 
         try:
             workspace = get_object_or_404(Workspace, id=workspace_id)
@@ -2448,120 +2447,99 @@ class BatchGenerationView(LoginRequiredMixin, UserWorkspacePermissionMixin, View
             generate_final = request.POST.get("create_final_video") == "true"
 
             # Get screens
-            screens = Screen.objects.filter(script=script)
+            screens = Screen.objects.filter(script=script).select_related("voice", "image")
 
             if not screens.exists():
                 screens, _ = script.generate_screens()
 
+            # Estimate the cost of the batch up front; cheaper batches are
+            # scheduled at a higher priority
+            estimate = render_planner.estimate_render(
+                screens,
+                generate_images=generate_images,
+                generate_voices=generate_voices,
+                generate_previews=generate_previews,
+                create_final_video=generate_final,
+            )
+            priority = estimate["priority"]
+
+            from backend.workspaces.services.queue_service import QueueService
+
             # For progress tracking
             task_data = {}
+            workflows = []
+            user_id = str(request.user.id)
 
-            # Schedule tasks
+            # Build one workflow per screen: image and voice run in parallel
+            # and the preview starts once both have finished
             for screen in screens:
-                # Log initial task for tracking
                 task_data[str(screen.id)] = {
                     "id": str(screen.id),
                     "name": screen.name,
                     "components": {}
                 }
-                
-                if generate_images:
-                    # Initialize status_data if it doesn't exist
-                    if not screen.status_data:
-                        screen.status_data = {}
-                    
-                    # Check status or set to pending if not exists
-                    image_status = screen.status_data.get('images', {}).get('status', 'pending')
-                    
-                    if image_status in ["pending", "failed"]:
-                        # Update status using ScreenService
-                        ScreenService.update_screen_status(str(screen.id), "images", "queued")
-                        
-                        # Schedule task
-                        task = generate_screen_media.delay(
-                            str(screen.id), "image", str(request.user.id)
-                        )
-                        
-                        # Store the task ID for tracking
-                        task_data[str(screen.id)]["components"]["image"] = {
-                            "task_id": task.id,
-                            "status": "queued"
-                        }
-                    
-                if generate_voices:
-                    # Initialize status_data if it doesn't exist
-                    if not screen.status_data:
-                        screen.status_data = {}
-                    
-                    # Check status or set to pending if not exists
-                    voice_status = screen.status_data.get('voices', {}).get('status', 'pending')
-                    
-                    if voice_status in ["pending", "failed", "processing"]:
-                        # Update status using ScreenService
-                        ScreenService.update_screen_status(str(screen.id), "voices", "queued")
-                        
-                        # Schedule task
-                        task = generate_screen_media.delay(
-                            str(screen.id), "voice", str(request.user.id)
-                        )
-                        
-                        # Store the task ID for tracking
-                        task_data[str(screen.id)]["components"]["audio"] = {
-                            "task_id": task.id,
-                            "status": "queued"
-                        }
-                
-                if generate_previews:
-                    # Initialize status_data if it doesn't exist
-                    if not screen.status_data:
-                        screen.status_data = {}
-                    
-                    # Check status or set to pending if not exists
-                    preview_status = screen.status_data.get('preview', {}).get('status', 'pending')
-                    
-                    if preview_status in ["pending", "failed"]:
-                        # Update status using ScreenService
-                        ScreenService.update_screen_status(str(screen.id), "preview", "queued")
-                        
-                        # Schedule task
-                        task = generate_screen_media.delay(
-                            str(screen.id), "preview", str(request.user.id)
-                        )
-                        
-                        # Store the task ID for tracking
-                        task_data[str(screen.id)]["components"]["preview"] = {
-                            "task_id": task.id,
-                            "status": "queued"
-                        }
-            
+
+                status_data = screen.status_data or {}
+                image_status = status_data.get('images', {}).get('status', 'pending')
+                voice_status = status_data.get('voices', {}).get('status', 'pending')
+                preview_status = status_data.get('preview', {}).get('status', 'pending')
+
+                # Components still processing attach to their running task
+                # while it holds its lock, and are restarted once it has died
+                workflow, components = QueueService.build_screen_workflow(
+                    screen,
+                    user_id=user_id,
+                    generate_image=generate_images and image_status in ["pending", "failed", "cancelled", "processing"],
+                    generate_voice=generate_voices and voice_status in ["pending", "failed", "cancelled", "processing"],
+                    generate_preview=generate_previews and preview_status in ["pending", "failed", "cancelled"],
+                    priority=priority,
+                )
+                if workflow is not None:
+                    workflows.append(workflow)
+
+                # Store the task IDs for tracking
+                for component, key in (("images", "image"), ("voices", "audio"), ("preview", "preview")):
+                    if component in components:
+                        task_data[str(screen.id)]["components"][key] = components[component]
+
             # Schedule final video task if needed
+            compile_signature = None
             if generate_final:
                 # Find any screen to use for the final video
                 final_screen = screens.first()
                 if final_screen:
-                    # Initialize status_data if it doesn't exist
-                    if not final_screen.status_data:
-                        final_screen.status_data = {}
-                    
                     # Update status using ScreenService
                     ScreenService.update_screen_status(str(final_screen.id), "video", "queued")
-                    
-                    # Schedule task
-                    task = compile_script_video.delay(str(script.id))
-                    
+
+                    if workflows:
+                        # Compile once every screen workflow has finished
+                        compile_signature, compile_info = QueueService.build_compile_signature(
+                            script, user_id=user_id, priority=priority
+                        )
+                        compile_result = {**compile_info, "deduplicated": False}
+                    else:
+                        # Nothing is regenerated, so identical compiles reuse the existing job
+                        compile_result = QueueService.queue_script_compile(
+                            str(script.id), user_id=user_id, priority=priority
+                        )
+
                     # Store the task ID for tracking
                     task_data[str(final_screen.id)]["components"]["video"] = {
-                        "task_id": task.id,
-                        "status": "queued"
+                        "task_id": compile_result.get("task_id"),
+                        "status": "queued",
+                        "deduplicated": compile_result.get("deduplicated", False)
                     }
-            
+
+            QueueService.run_workflow(script, workflows, compile_signature, user_id)
+
             # Store task data in the session for tracking
             request.session[f"batch_generation_{script_id}"] = task_data
             
             return JsonResponse({
                 "success": True,
                 "message": ("Batch generation tasks have been scheduled."),
-                "task_data": task_data
+                "task_data": task_data,
+                "estimate": estimate
             })
 
         except Exception as e:
@@ -2646,6 +2624,39 @@ class BatchGenerationView(LoginRequiredMixin, UserWorkspacePermissionMixin, View
                 'error': str(e)
             }, status=500)
 
+
+class BatchSchedulerStatusView(LoginRequiredMixin, UserWorkspacePermissionMixin, View):
+    """View for a script's place in the fair-share scheduler queue.
+
+    Kept apart from the batch status poll, which reads only the result
+    backend, so clients can poll queue positions less often.
+    """
+
+    def get(self, request, workspace_id, script_id):
+        """Handle GET request to retrieve the script's queued jobs and positions."""
+        from backend.workspaces.services.scheduler_service import SchedulerService
+
+        workspace = get_object_or_404(
+            Workspace.objects.filter(
+                Q(owner=request.user) | Q(members=request.user)
+            ).distinct(),
+            id=workspace_id
+        )
+        script = get_object_or_404(Script, id=script_id, workspace=workspace)
+
+        result = SchedulerService.get_workspace_status(str(workspace.id), script_id=str(script.id))
+        if result.pop('status') != 'success':
+            return JsonResponse({
+                'success': False,
+                'error': result['message']
+            }, status=500)
+
+        return JsonResponse({
+            'success': True,
+            'scheduler': result
+        })
+
+
 class MediaListView(LoginRequiredMixin, UserWorkspacePermissionMixin, DetailView):
     """View for displaying and managing workspace media files."""
     model = Workspace
@@ -2698,43 +2709,24 @@ class ScriptTranslationView(LoginRequiredMixin, UserWorkspacePermissionMixin, Vi
                     'error': _('Script content is empty.')
                 }, status=400)
             
-            # Initialize translation service with user's API key if available
-            api_key = request.user.openai_api_key if hasattr(request.user, 'openai_api_key') else None
-            translation_service = TranslationService(api_key=api_key)
+            # Translate in the background; the new script is created under
+            # this ID when the translation completes
+            from backend.workspaces.tasks import translate_script
+            new_script_id = str(uuid.uuid4())
+            task = translate_script.apply_async(
+                args=[str(script.id), target_language, new_script_id],
+                kwargs={'user_id': str(request.user.id)}
+            )
             
-            try:
-                # Translate script narration
-                translated_content = translation_service.translate_script_narration(
-                    script,
-                    target_language,
-                    request=request
-                )
-                
-                # Create new script with translated content
-                new_script = Script.objects.create(
-                    workspace_id=workspace_id,
-                    title=f"{script.title} ({translation_service.language_names[target_language]})",
-                    topic=script.topic,
-                    content=json.dumps(translated_content.get("scenes", [])),
-                    original_script=script,
-                    created_by=request.user,
-                    status='draft'
-                )
-                
-                return JsonResponse({
-                    'success': True,
-                    'redirect_url': reverse('workspaces:script_management', kwargs={
-                        'workspace_id': workspace_id,
-                        'script_id': new_script.id
-                    })
+            return JsonResponse({
+                'success': True,
+                'task_id': task.id,
+                'script_id': new_script_id,
+                'redirect_url': reverse('workspaces:script_management', kwargs={
+                    'workspace_id': workspace_id,
+                    'script_id': new_script_id
                 })
-                
-            except Exception as e:
-                logger.error(f"Translation error: {str(e)}")
-                return JsonResponse({
-                    'success': False,
-                    'error': _('Failed to translate script. Please try again.')
-                }, status=500)
+            })
             
         except json.JSONDecodeError:
             return JsonResponse({
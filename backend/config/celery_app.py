@@ -1,8 +1,10 @@
 import os
 
 from celery import Celery
-from celery.signals import setup_logging
+from celery import states
+from celery.signals import setup_logging, task_postrun, worker_init, worker_process_init
 from celery.schedules import crontab
+from kombu import Queue
 from django.conf import settings
 
 # set the default Django settings module for the 'celery' program.
@@ -26,42 +28,116 @@ def config_loggers(*args, **kwargs):
     dictConfig(settings.LOGGING)
 
 
+@worker_init.connect
+def preload_worker(*args, **kwargs):
+    """Load the render stack and provider SDKs before the pool forks."""
+    from backend.utils import worker_warmup
+
+    worker_warmup.configure_connections()
+    worker_warmup.preload()
+
+
+@worker_process_init.connect
+def init_worker_process(*args, **kwargs):
+    """Set up per-process state in each forked pool child."""
+    from backend.utils import worker_warmup
+
+    worker_warmup.init_process()
+
+
 # Load task modules from all registered Django app configs.
 app.autodiscover_tasks()
 
 # Configure Celery beat schedule for recurring tasks
 app.conf.beat_schedule = {
-    'check-pending-videos-every-minute': {
-        'task': 'backend.video.tasks.check_pending_videos',
-        'schedule': crontab(minute='*'),  # Every minute
+    'reconcile-screen-events-every-15-minutes': {
+        'task': 'backend.video.tasks.reconcile_screen_events',
+        'schedule': crontab(minute='*/15'),  # Every 15 minutes
     },
     'clean-old-temp-files-daily': {
         'task': 'backend.utils.tasks.clean_temp_files',
         'schedule': crontab(hour=3, minute=0),  # 3:00 AM every day
     },
+    'dispatch-scheduled-jobs-every-minute': {
+        'task': 'backend.workspaces.tasks.dispatch_scheduled_jobs',
+        'schedule': crontab(minute='*'),  # Every minute
+    },
     'update-usage-stats-hourly': {
         'task': 'backend.subscriptions.tasks.update_usage_stats',
         'schedule': crontab(minute=0, hour='*'),  # Every hour
     },
 }
 
-# Configure task routing
+# Queue topology
+# - interactive: renders a user is waiting on (single-screen previews),
+#   consumed by a small prefork pool that batch work can't fill
+# - bulk: batch previews, compiles and video processing, consumed by the
+#   prefork render pool
+# - io: API-bound generation (images, voices, AI), consumed by a thread pool;
+#   calls without an explicit priority land in the highest priority step,
+#   ahead of batch work sent at the render planner's priority
+# - default/maintenance: light bookkeeping, consumed by the io pool
+INTERACTIVE_QUEUE = 'interactive'
+BULK_QUEUE = 'bulk'
+IO_QUEUE = 'io'
+
+app.conf.task_queues = (
+    Queue(INTERACTIVE_QUEUE),
+    Queue(BULK_QUEUE),
+    Queue(IO_QUEUE),
+    Queue('default'),
+    Queue('maintenance'),
+)
+app.conf.task_default_queue = 'default'
+
+# Configure task routing; batch callers override the queue per call
 app.conf.task_routes = {
-    'backend.video.tasks.*': {'queue': 'video_processing'},
-    'backend.workspaces.tasks.*': {'queue': 'video_processing'},
-    'backend.ai.tasks.*': {'queue': 'ai_generation'},
+    # Scheduler and screen event bookkeeping must not wait behind the jobs they start
+    'backend.workspaces.tasks.release_scheduled_job': {'queue': 'default'},
+    'backend.workspaces.tasks.dispatch_scheduled_jobs': {'queue': 'default'},
+    'backend.video.tasks.consume_screen_events': {'queue': 'default'},
+    'backend.video.tasks.reconcile_screen_events': {'queue': 'default'},
+    'backend.video.tasks.finish_screen_render': {'queue': 'default'},
+    'backend.workspaces.tasks.generate_screen_media': {'queue': IO_QUEUE},
+    'backend.workspaces.tasks.generate_script_media': {'queue': IO_QUEUE},
+    'backend.workspaces.tasks.generate_screens_from_script': {'queue': IO_QUEUE},
+    'backend.workspaces.tasks.translate_script': {'queue': IO_QUEUE},
+    'backend.workspaces.tasks.generate_screen_preview': {'queue': INTERACTIVE_QUEUE},
+    'backend.workspaces.tasks.generate_scene_preview': {'queue': INTERACTIVE_QUEUE},
+    'backend.workspaces.tasks.*': {'queue': BULK_QUEUE},
+    'backend.video.tasks.*': {'queue': BULK_QUEUE},
+    'backend.ai.tasks.*': {'queue': IO_QUEUE},
     'backend.utils.tasks.*': {'queue': 'maintenance'},
     'backend.subscriptions.tasks.*': {'queue': 'default'},
 }
 
-# Configure task default rate limits
-app.conf.task_default_rate_limit = '10/m'  # Default: 10 tasks per minute
+
+@task_postrun.connect
+def expire_task_result(task_id=None, task=None, state=None, **kwargs):
+    """Give a finished task's stored result the expiry of its queue."""
+    if task is None or task.ignore_result or state not in states.READY_STATES:
+        return
+    queue = (task.request.delivery_info or {}).get("routing_key")
+    expires = settings.RESULT_EXPIRES_BY_QUEUE.get(queue)
+    backend = task.backend
+    if expires is None or not hasattr(backend, "expire"):
+        return
+    try:
+        backend.expire(backend.get_key_for_task(task_id), expires)
+    except Exception:
+        # The result keeps the default result_expires
+        pass
+
+
+# No blanket task rate limit: provider calls are throttled per API key by
+# backend.ai.services.rate_limiter, which tracks the real provider quotas
 
 
 
 """Utility functions for Celery task management."""
 import os
 import logging
+import random
 import time
 from datetime import datetime, timedelta
 from functools import wraps
@@ -124,10 +200,39 @@ def cancel_task(task_id: str) -> bool:
     return False
 
 
+def retry_countdown(
+    retry_count: int = 0,
+    backoff_factor: float = 2.0,
+    retry_after: Optional[float] = None,
+    jitter: float = 0.25,
+) -> float:
+    """
+    Compute the countdown of a task retry.
+
+    Uses the delay the provider asked for when there is one, otherwise
+    exponential backoff. A random jitter of up to ``jitter`` times the delay
+    is added so tasks that failed together don't retry together.
+
+    Args:
+        retry_count: Number of retries so far
+        backoff_factor: Factor to multiply the delay by for each retry
+        retry_after: Optional delay requested by the provider, in seconds
+        jitter: Maximum jitter as a fraction of the delay
+
+    Returns:
+        Countdown in seconds
+    """
+    delay = retry_after if retry_after is not None else backoff_factor * (2 ** retry_count)
+    return delay + random.uniform(0, delay * jitter)
+
+
 def retry_with_backoff(max_retries: int = 3, backoff_factor: float = 2.0) -> Callable[[F], F]:
     """
     Decorator for Celery tasks to retry with exponential backoff.
 
+    Exceptions carrying a ``retry_after`` (such as rate limit errors) are
+    retried after that delay instead.
+
     Args:
         max_retries: Maximum number of retries
         backoff_factor: Factor to multiply the delay by for each retry
@@ -145,13 +250,14 @@ def retry_with_backoff(max_retries: int = 3, backoff_factor: float = 2.0) -> Cal
                 return func(*args, **kwargs)
             except Exception as exc:
                 if task_self and retry_count < max_retries:
-                    # Calculate backoff delay: backoff_factor * (2 ^ retry_count)
-                    backoff_delay = backoff_factor * (2 ** retry_count)
+                    backoff_delay = retry_countdown(
+                        retry_count, backoff_factor, getattr(exc, 'retry_after', None)
+                    )
                     logger.warning(
                         f"Task {func.__name__} failed with error: {exc}. "
-                        f"Retrying in {backoff_delay} seconds (retry {retry_count + 1}/{max_retries})."
+                        f"Retrying in {backoff_delay:.1f} seconds (retry {retry_count + 1}/{max_retries})."
                     )
-                    raise task_self.retry(exc=exc, countdown=backoff_delay)
+                    raise task_self.retry(exc=exc, countdown=backoff_delay, max_retries=max_retries)
                 else:
                     # Log the failure and re-raise the exception
                     logger.error(f"Task {func.__name__} failed after {retry_count} retries: {exc}")
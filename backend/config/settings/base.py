@@ -288,12 +288,34 @@ if USE_TZ:
 CELERY_BROKER_URL = REDIS_URL
 # https://docs.celeryq.dev/en/stable/userguide/configuration.html#redis-backend-use-ssl
 CELERY_BROKER_USE_SSL = {"ssl_cert_reqs": ssl.CERT_NONE} if REDIS_SSL else None
+# https://docs.celeryq.dev/en/stable/userguide/routing.html#redis-message-priorities
+# Priorities 0-9 (0 is highest) are set from the render planner's estimate
+CELERY_BROKER_TRANSPORT_OPTIONS = {
+    "priority_steps": list(range(10)),
+    "sep": ":",
+    "queue_order_strategy": "priority",
+    # Long compiles are acknowledged late; keep them from being redelivered
+    # to a second worker while the first is still rendering
+    "visibility_timeout": 2 * 60 * 60,
+}
 # https://docs.celeryq.dev/en/stable/userguide/configuration.html#std:setting-result_backend
 CELERY_RESULT_BACKEND = REDIS_URL
 # https://docs.celeryq.dev/en/stable/userguide/configuration.html#redis-backend-use-ssl
 CELERY_REDIS_BACKEND_USE_SSL = CELERY_BROKER_USE_SSL
 # https://docs.celeryq.dev/en/stable/userguide/configuration.html#result-extended
-CELERY_RESULT_EXTENDED = True
+# Task args and kwargs aren't read back, so results store only state and value
+CELERY_RESULT_EXTENDED = False
+# https://docs.celeryq.dev/en/stable/userguide/configuration.html#result-expires
+CELERY_RESULT_EXPIRES = 24 * 60 * 60
+# Results of tasks are re-expired by the queue they ran on; the status poll
+# only needs them while a batch is running
+RESULT_EXPIRES_BY_QUEUE = {
+    "interactive": 60 * 60,
+    "io": 6 * 60 * 60,
+    "bulk": 24 * 60 * 60,
+    "default": 60 * 60,
+    "maintenance": 60 * 60,
+}
 # https://docs.celeryq.dev/en/stable/userguide/configuration.html#result-backend-always-retry
 # https://github.com/celery/celery/pull/6122
 CELERY_RESULT_BACKEND_ALWAYS_RETRY = True
@@ -308,6 +330,8 @@ CELERY_RESULT_SERIALIZER = "json"
 # https://docs.celeryq.dev/en/stable/userguide/configuration.html#task-time-limit
 # TODO: set to whatever value is adequate in your circumstances
 CELERY_TASK_TIME_LIMIT = 5 * 60
+# Workers keep their database connections open between tasks for this long
+WORKER_CONN_MAX_AGE = env.int("WORKER_CONN_MAX_AGE", default=600)
 # https://docs.celeryq.dev/en/stable/userguide/configuration.html#task-soft-time-limit
 # TODO: set to whatever value is adequate in your circumstances
 CELERY_TASK_SOFT_TIME_LIMIT = 60
@@ -409,6 +433,47 @@ OPENAI_API_KEY = env("OPENAI_API_KEY", default="")
 # ElevenLabs
 ELEVENLABS_API_KEY = env("ELEVENLABS_API_KEY", default="")
 
+# Provider quotas per API key, enforced by backend.ai.services.rate_limiter.
+# rpm is requests per minute; tpm is tokens per minute for OpenAI chat and
+# characters per minute for ElevenLabs (0 for no usage quota)
+AI_RATE_LIMITS = {
+    "openai_chat": {
+        "rpm": env.int("OPENAI_CHAT_RPM", default=500),
+        "tpm": env.int("OPENAI_CHAT_TPM", default=30000),
+    },
+    "openai_images": {
+        "rpm": env.int("OPENAI_IMAGES_RPM", default=5),
+        "tpm": 0,
+    },
+    "elevenlabs": {
+        "rpm": env.int("ELEVENLABS_RPM", default=120),
+        "tpm": env.int("ELEVENLABS_CPM", default=0),
+    },
+}
+# Longest time a caller blocks waiting for a token before it is rescheduled
+AI_RATE_LIMIT_MAX_WAIT = 10
+# Provider clients are shared per process and API key by
+# backend.ai.services.client_registry, for up to AI_CLIENT_CACHE_SIZE keys
+AI_CLIENT_CACHE_SIZE = 32
+AI_CLIENT_TIMEOUT = env.float("AI_CLIENT_TIMEOUT", default=240)
+AI_CLIENT_CONNECT_TIMEOUT = 10
+AI_CLIENT_MAX_RETRIES = 2
+# Connections kept per client, and how long an idle one stays open
+AI_CLIENT_MAX_CONNECTIONS = 20
+AI_CLIENT_KEEPALIVE_SECONDS = 60
+# Generate a script's images and voices in one async task per script instead
+# of one task per screen, with at most ASYNC_GENERATION_CONCURRENCY provider
+# calls in flight
+ASYNC_MEDIA_GENERATION = env.bool("ASYNC_MEDIA_GENERATION", default=False)
+ASYNC_GENERATION_CONCURRENCY = env.int("ASYNC_GENERATION_CONCURRENCY", default=32)
+# Also reuse generated images whose prompts only differ in case, punctuation
+# or spacing (exact prompt matches are always reused)
+IMAGE_CACHE_NEAR_DUPLICATES = env.bool("IMAGE_CACHE_NEAR_DUPLICATES", default=False)
+# Translation batches sent to the LLM at once, and retries of a batch whose
+# response is invalid or missing texts
+TRANSLATION_CONCURRENCY = env.int("TRANSLATION_CONCURRENCY", default=4)
+TRANSLATION_BATCH_RETRIES = 2
+
 # STRIPE
 # ------------------------------------------------------------------------------
 STRIPE_PUBLISHABLE_KEY = env("STRIPE_PUBLISHABLE_KEY", default="")
@@ -446,6 +511,10 @@ SUBSCRIPTION_PLANS = {
             "max_video_duration": 60,  # seconds
             "max_resolution": "720p",
             "social_publishing": False,
+            # Screens (or single jobs such as compiles) the scheduler runs at
+            # once per user and per workspace
+            "max_concurrent_screens": 8,
+            "max_workspace_concurrent_screens": 16,
         },
     },
     "standard": {
@@ -456,6 +525,8 @@ SUBSCRIPTION_PLANS = {
             "max_video_duration": 300,  # seconds
             "max_resolution": "1080p",
             "social_publishing": True,
+            "max_concurrent_screens": 16,
+            "max_workspace_concurrent_screens": 32,
         },
     },
     "premium": {
@@ -466,6 +537,8 @@ SUBSCRIPTION_PLANS = {
             "max_video_duration": 1800,  # seconds
             "max_resolution": "4K",
             "social_publishing": True,
+            "max_concurrent_screens": 32,
+            "max_workspace_concurrent_screens": 64,
         },
     },
 }
@@ -476,6 +549,25 @@ MAX_VIDEO_SIZE_MB = 500  # Maximum video file size in MB
 ALLOWED_VIDEO_FORMATS = ["mp4", "mov", "avi", "webm"]
 ALLOWED_AUDIO_FORMATS = ["mp3", "wav", "ogg", "m4a"]
 ALLOWED_IMAGE_FORMATS = ["jpg", "jpeg", "png", "webp"]
+# Render jobs without a heartbeat for this long are resumed by a redelivered task
+RENDER_JOB_STALE_SECONDS = 10 * 60
+# Fair-share scheduler: jobs are held per workspace in Redis and released to
+# Celery round-robin, within the concurrency caps of the subscription plan
+SCHEDULER_KEY_PREFIX = "scheduler"
+# A dispatched job's slot is freed after this long even if it never reports back
+SCHEDULER_LEASE_SECONDS = 2 * 60 * 60
+# In-flight generation locks: a running task refreshes its lock every third of
+# GENERATION_LOCK_TTL; a queued or retrying task holds it for the queued TTL,
+# renewed every minute by dispatch_scheduled_jobs while its job waits
+GENERATION_LOCK_KEY_PREFIX = "generation"
+GENERATION_LOCK_TTL = 5 * 60
+GENERATION_LOCK_QUEUED_TTL = SCHEDULER_LEASE_SECONDS
+# Screen events: state transitions are written to an outbox table and published
+# to a Redis stream; events and ready screens left behind for longer than
+# SCREEN_EVENT_RECONCILE_SECONDS are picked up by the reconciler
+SCREEN_EVENT_STREAM = "screen_events"
+SCREEN_EVENT_STREAM_MAXLEN = 10000
+SCREEN_EVENT_RECONCILE_SECONDS = 10 * 60
 
 # Set to None for infinite time limits
 CELERY_TASK_SOFT_TIME_LIMIT = None  # No soft time limit (infinite)